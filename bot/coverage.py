@@ -0,0 +1,103 @@
+"""
+Night Leech - Season coverage planner.
+
+Given the parsed results for one season at one quality, picks a small-bytes
+set of torrents that together cover every episode: weighted set cover where
+each torrent costs its size and covers its episode set. Torrents below the
+seeder threshold are left out so the plan only uses healthy swarms.
+
+The episodes seen in single-episode results are not the whole season, so a
+season pack covers them plus REST, a token for "every episode nobody listed
+separately". When a pack exists, a plan without one is never complete. When
+no healthy pack exists, the plan says so (`pack_only`) instead of presenting
+the singles as the season. Packs are always fetched whole.
+
+Greedy by cost per newly covered episode, then a pruning pass drops any
+torrent whose episodes the rest of the plan already covers.
+"""
+
+REST = 'rest'   # episodes of the season only a pack is known to hold
+
+def _size(item) -> int:
+    try:
+        return int(item.get('Size', 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _seeders(item) -> int:
+    try:
+        return int(item.get('Seeders', 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def episode_set(item, season_eps: frozenset) -> frozenset:
+    """Episodes a result covers; packs cover the whole season, REST included"""
+    if item.get('is_pack'):
+        return season_eps | {REST}
+    return frozenset(e for e in item.get('episodes', []) if isinstance(e, int))
+
+def plan_coverage(items: list, min_seeders: int = 1) -> dict:
+    """
+    Cheapest-looking set of `items` covering the season.
+    Returns {'items', 'wanted', 'size', 'episodes', 'missing', 'whole_season',
+    'pack_only'}:
+      items         chosen results
+      wanted        episodes to keep from each (None = keep every file)
+      size          total bytes
+      episodes      covered episode numbers seen in singles
+      missing       listed episodes no healthy torrent has
+      whole_season  a pack is in the plan
+      pack_only     a pack exists but none is healthy, so the rest of the
+                    season is not covered
+    """
+    season_eps = frozenset(e for it in items if not it.get('is_pack')
+                           for e in it.get('episodes', []) if isinstance(e, int))
+    universe = season_eps | {REST} if any(it.get('is_pack') for it in items) else season_eps
+
+    candidates = []
+    for it in items:
+        eps = episode_set(it, season_eps)
+        if eps and _seeders(it) >= min_seeders:
+            candidates.append((it, eps, _size(it)))
+
+    covered, chosen = set(), []
+    while True:
+        best, best_key = None, None
+        for cand in candidates:
+            new = len(cand[1] - covered)
+            if not new:
+                continue
+            key = (cand[2] / new, -_seeders(cand[0]))
+            if best_key is None or key < best_key:
+                best, best_key = cand, key
+        if best is None:
+            break
+        chosen.append(best)
+        covered |= best[1]
+
+    # Drop redundant picks, largest first
+    for cand in sorted(chosen, key=lambda c: c[2], reverse=True):
+        rest = set().union(*(c[1] for c in chosen if c is not cand))
+        if cand[1] <= rest:
+            chosen.remove(cand)
+
+    # Each listed episode is fetched from the first single that has it;
+    # packs keep all their files since their real contents are unknown
+    wanted, assigned = [], set()
+    for cand in chosen:
+        if cand[0].get('is_pack'):
+            wanted.append(None)
+            continue
+        eps = cand[1] - assigned
+        assigned |= eps
+        wanted.append(sorted(eps))
+
+    return {
+        'items':        [c[0] for c in chosen],
+        'wanted':       wanted,
+        'size':         sum(c[2] for c in chosen),
+        'episodes':     sorted(e for e in covered if e != REST),
+        'missing':      sorted(season_eps - covered),
+        'whole_season': REST in covered,
+        'pack_only':    REST in universe and REST not in covered,
+    }
@@ -0,0 +1,75 @@
+"""
+Night Leech - Disk space admission.
+
+Before a torrent is added, its size is compared with the space that is
+really left on the download volume: free bytes minus what incomplete
+torrents will still write (their `amount_left`) minus a safety margin.
+
+Free space comes from qBittorrent's own `free_space_on_disk` in the synced
+server state (falling back to shutil.disk_usage on DOWNLOAD_DIR), and the
+reservation total is kept incrementally from TorrentIndex deltas, so a check
+is a couple of additions rather than a disk or torrent-list scan. Torrents
+just added but not yet seen by the sync hold a provisional reservation.
+"""
+
+import logging
+import shutil
+
+logger = logging.getLogger(__name__)
+
+class DiskSpace:
+    """Free space minus bytes reserved by incomplete torrents"""
+
+    def __init__(self, index, download_dir: str = '', margin: int = 0):
+        self.index = index
+        self.download_dir = download_dir
+        self.margin = margin
+        self._reserved = {}     # hash -> bytes still to be written
+        self._pending = {}      # hash -> provisional size of a torrent not yet synced
+        self.total = 0
+
+    def _set(self, hash_: str, amount: int):
+        self.total += amount - self._reserved.pop(hash_, 0)
+        if amount:
+            self._reserved[hash_] = amount
+
+    def on_change(self, changed: dict, removed: list):
+        """TorrentIndex listener"""
+        for h, fields in changed.items():
+            if 'amount_left' in fields or 'progress' in fields:
+                t = self.index.get(h)
+                left = t.get('amount_left', 0) if t.get('progress', 0) < 1 else 0
+                if not left and t.get('progress', 0) < 1 and h in self._pending:
+                    continue   # still fetching metadata; keep the provisional size
+                self.total -= self._pending.pop(h, 0)
+                self._set(h, left)
+        for h in removed:
+            self.total -= self._pending.pop(h, 0)
+            self._set(h, 0)
+
+    def reserve(self, hash_: str, size: int):
+        """Hold space for a torrent until the sync reports its real amount_left"""
+        if hash_ and hash_ not in self._reserved and size > 0:
+            self.total += size - self._pending.get(hash_, 0)
+            self._pending[hash_] = size
+
+    def free(self) -> int:
+        free = self.index.server_state.get('free_space_on_disk')
+        if free is None and self.download_dir:
+            try:
+                free = shutil.disk_usage(self.download_dir).free
+            except OSError as e:
+                logger.error(f"disk_usage({self.download_dir}) failed: {e}")
+        return free if free is not None else -1
+
+    def available(self, exclude: str = None) -> int:
+        """Bytes a new torrent may use, or -1 if free space is unknown"""
+        free = self.free()
+        if free < 0:
+            return -1
+        own = self._reserved.get(exclude, 0) + self._pending.get(exclude, 0) if exclude else 0
+        return free - (self.total - own) - self.margin
+
+    def fits(self, size: int, exclude: str = None) -> bool:
+        available = self.available(exclude)
+        return available < 0 or size <= available
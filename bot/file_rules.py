@@ -0,0 +1,122 @@
+"""
+Night Leech - Deferred file rules.
+
+Magnets are added with stopCondition=MetadataReceived, so qBittorrent fetches
+the file list and then stops the torrent before any payload is downloaded.
+This registry remembers, per torrent, which episodes to keep, and listens to
+the torrent index (see qb_sync.py): once a pending torrent has its metadata,
+the `handle` callback skips the unwanted files and starts it.
+
+Pending torrents are kept in a small SQLite table, so a torrent still waiting
+for its metadata when the bot stops is handled after the restart: the first
+sync is a full update listing every torrent, and each pending one that is
+already stopped with metadata is picked up from it. A torrent whose metadata
+never arrives stays pending; nothing starts it half-configured.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+METADATA_STATES = ('metaDL', 'forcedMetaDL', 'checkingResumeData', 'moving', 'unknown')
+RETRY_AFTER = 30     # seconds before a failed handle() is tried again
+
+def has_metadata(torrent: dict) -> bool:
+    """Whether qBittorrent already knows the torrent's files"""
+    if 'has_metadata' in torrent:
+        return bool(torrent['has_metadata'])
+    state = torrent.get('state')
+    return bool(state) and state not in METADATA_STATES and torrent.get('total_size', 0) > 0
+
+class PendingFiles:
+    """hash -> (wanted episodes, is_pack) for torrents stopped until their metadata arrives"""
+
+    def __init__(self, path, handle, retry_after: float = RETRY_AFTER):
+        self.path = Path(path)
+        self.handle = handle          # async (hash, wanted_eps set, is_pack) -> True once done
+        self.retry_after = retry_after
+        self._db = None
+        self._pending = None          # hash -> (set of episodes, is_pack)
+        self._busy = set()
+        self._retry_at = {}
+
+    def _conn(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS pending (
+                    hash     TEXT PRIMARY KEY,
+                    episodes TEXT NOT NULL,
+                    is_pack  INTEGER NOT NULL,
+                    added    REAL NOT NULL
+                )
+            """)
+        return self._db
+
+    def _load(self):
+        if self._pending is not None:
+            return
+        self._pending = {}
+        try:
+            for hash_, eps, is_pack in self._conn().execute("SELECT hash, episodes, is_pack FROM pending"):
+                self._pending[hash_] = (set(json.loads(eps)), bool(is_pack))
+        except Exception as e:
+            logger.error(f"Failed to load pending file rules: {e}")
+
+    def __contains__(self, hash_: str) -> bool:
+        self._load()
+        return hash_ in self._pending
+
+    def add(self, hash_: str, wanted_eps, is_pack: bool):
+        """Apply file rules to this torrent once its metadata arrives"""
+        self._load()
+        eps = sorted(wanted_eps or [])
+        self._pending[hash_] = (set(eps), is_pack)
+        try:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?)",
+                       (hash_, json.dumps(eps), int(is_pack), time.time()))
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to save pending file rules: {e}")
+
+    def forget(self, hashes):
+        self._load()
+        hashes = [h for h in hashes if self._pending.pop(h, None) is not None]
+        for h in hashes:
+            self._retry_at.pop(h, None)
+        if not hashes:
+            return
+        try:
+            db = self._conn()
+            db.executemany("DELETE FROM pending WHERE hash = ?", [(h,) for h in hashes])
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to drop pending file rules: {e}")
+
+    async def on_change(self, changed: dict, removed: list, torrents: dict):
+        """TorrentIndex listener: handle every pending torrent that has its metadata"""
+        self._load()
+        # Deleted from qBittorrent, possibly while the bot was down
+        self.forget([h for h in self._pending if h not in torrents])
+        now = time.time()
+        for hash_, (eps, is_pack) in list(self._pending.items()):
+            if hash_ in self._busy or self._retry_at.get(hash_, 0) > now or not has_metadata(torrents.get(hash_, {})):
+                continue
+            self._busy.add(hash_)
+            try:
+                done = await self.handle(hash_, eps, is_pack)
+            except Exception as e:
+                logger.error(f"File rules failed for {hash_}: {e}")
+                done = False
+            finally:
+                self._busy.discard(hash_)
+            if done:
+                self.forget([hash_])
+            else:
+                self._retry_at[hash_] = now + self.retry_after
@@ -5,6 +5,7 @@ Complete rewrite with all bugs fixed and features added.
 """
 
 import asyncio
+import base64
 import logging
 import aiohttp
 import re
@@ -21,9 +22,23 @@ from telegram import (
 )
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, CallbackQueryHandler,
-    MessageHandler, ContextTypes, filters, InlineQueryHandler
+    MessageHandler, ContextTypes, filters, InlineQueryHandler, TypeHandler
 )
 
+from title_index import TitleIndex, normalize_title
+from search_history import SearchHistory
+import relevance
+from session_store import SessionStore
+from result_sets import ResultSetStore
+from webhook import run_webhook
+from coverage import plan_coverage
+from qb_sync import TorrentIndex
+from notifier import CompletionNotifier
+from scheduler import QueueScheduler
+import quotas
+from disk_space import DiskSpace
+from file_rules import PendingFiles
+
 # ─── Config Loading ───────────────────────────────────────────────────────────
 
 def load_config():
@@ -39,7 +54,13 @@ def load_config():
                     config[key.strip()] = val.strip()
     # Environment variables override file
     for key in ['BOT_TOKEN', 'JACKETT_URL', 'JACKETT_API_KEY', 'QBITTORRENT_URL',
-                'QBITTORRENT_USER', 'QBITTORRENT_PASS', 'FILE_SERVER_URL', 'ALLOWED_USERS']:
+                'QBITTORRENT_USER', 'QBITTORRENT_PASS', 'FILE_SERVER_URL', 'ALLOWED_USERS',
+                'TITLE_INDEX_PATH', 'RELEVANCE_THRESHOLD', 'RELEVANCE_WEIGHTS',
+                'WEBHOOK_URL', 'WEBHOOK_LISTEN', 'WEBHOOK_PORT', 'WEBHOOK_PATH', 'WEBHOOK_SECRET',
+                'QBITTORRENT_CATEGORY', 'QBITTORRENT_TAGS', 'PLAN_MIN_SEEDERS', 'FILE_RULES',
+                'NOTIFY_MILESTONE', 'NOTIFY_THROTTLE', 'SCHED_MAX_ACTIVE', 'SCHED_STALL_MINUTES',
+                'USER_MAX_ACTIVE', 'USER_MAX_INFLIGHT_GB', 'USER_WEIGHTS', 'DL_CAPACITY_KBPS',
+                'DOWNLOAD_DIR', 'DISK_MARGIN_GB']:
         if key in os.environ:
             config[key] = os.environ[key]
     return config
@@ -52,9 +73,44 @@ JACKETT_API_KEY   = cfg.get('JACKETT_API_KEY', '')
 QBITTORRENT_URL   = cfg.get('QBITTORRENT_URL', 'http://localhost:8083')
 QB_USER           = cfg.get('QBITTORRENT_USER', 'admin')
 QB_PASS           = cfg.get('QBITTORRENT_PASS', 'adminadmin')
+QB_CATEGORY       = cfg.get('QBITTORRENT_CATEGORY', '')
+QB_TAGS           = cfg.get('QBITTORRENT_TAGS', 'night-leech')
 FILE_SERVER_URL   = cfg.get('FILE_SERVER_URL', 'https://files.nightsub.ir')
 _allowed_raw      = cfg.get('ALLOWED_USERS', '').strip()
 ALLOWED_USERS     = set(int(x) for x in _allowed_raw.split(',') if x.strip().isdigit()) if _allowed_raw else set()
+DATA_DIR          = Path(__file__).parent.parent / "data"
+TITLE_INDEX_PATH  = cfg.get('TITLE_INDEX_PATH', str(DATA_DIR / "titles.db"))
+HISTORY_DB_PATH   = DATA_DIR / "history.db"
+SESSIONS_DB_PATH  = DATA_DIR / "sessions.db"
+NOTIFY_DB_PATH    = DATA_DIR / "notify.db"
+PENDING_DB_PATH   = DATA_DIR / "pending.db"
+SCHEDULER_DB_PATH = DATA_DIR / "scheduler.db"
+RELEVANCE_THRESHOLD = float(cfg.get('RELEVANCE_THRESHOLD', relevance.DEFAULT_THRESHOLD))
+RELEVANCE_WEIGHTS   = relevance.parse_weights(cfg.get('RELEVANCE_WEIGHTS', ''))
+# Webhook mode is used when WEBHOOK_URL (public base URL) is set; polling otherwise
+WEBHOOK_URL       = cfg.get('WEBHOOK_URL', '').strip()
+WEBHOOK_LISTEN    = cfg.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT      = int(cfg.get('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH      = cfg.get('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET    = cfg.get('WEBHOOK_SECRET', '')          # random per run when empty
+PLAN_MIN_SEEDERS  = int(cfg.get('PLAN_MIN_SEEDERS', '3'))   # season planner skips weaker torrents
+# Files kept after metadata arrives (others get priority 0); empty = download everything
+FILE_RULES        = {r.strip() for r in cfg.get('FILE_RULES', 'largest_video,subtitles,episodes').split(',') if r.strip()}
+# Progress pushes every N percent (0 = completion only), at most once per NOTIFY_THROTTLE seconds
+NOTIFY_MILESTONE  = int(cfg.get('NOTIFY_MILESTONE', '0'))
+NOTIFY_THROTTLE   = float(cfg.get('NOTIFY_THROTTLE', '300'))
+# Active download slots managed by the queue scheduler (0 = off, leave qBittorrent's queue alone).
+# When on, it overrides qBittorrent's queueing preferences and restores them on shutdown.
+SCHED_MAX_ACTIVE  = int(cfg.get('SCHED_MAX_ACTIVE', '0'))
+SCHED_STALL_MINUTES = float(cfg.get('SCHED_STALL_MINUTES', '10'))
+# Per-user admission limits (0 = unlimited) and fair-share weights "user_id=weight,..."
+USER_MAX_ACTIVE   = int(cfg.get('USER_MAX_ACTIVE', '10'))
+USER_MAX_INFLIGHT = int(float(cfg.get('USER_MAX_INFLIGHT_GB', '0')) * 1_073_741_824)
+USER_WEIGHTS      = quotas.parse_weights(cfg.get('USER_WEIGHTS', ''))
+DL_CAPACITY       = int(cfg.get('DL_CAPACITY_KBPS', '0')) * 1024   # link speed; 0 = fair share off
+# Download volume (fallback when qBittorrent doesn't report free space) and space always kept free
+DOWNLOAD_DIR      = cfg.get('DOWNLOAD_DIR', '')
+DISK_MARGIN       = int(float(cfg.get('DISK_MARGIN_GB', '1')) * 1_073_741_824)
 
 # Indexers will be read from Jackett config files
 _cached_indexers: list = []
@@ -167,6 +223,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ─── HTTP Client ─────────────────────────────────────────────────────────────
+
+# One pooled client for Jackett, qBittorrent and IMDB calls. Cookies are passed
+# per request, so the jar is disabled.
+_http: aiohttp.ClientSession = None
+
+def http() -> aiohttp.ClientSession:
+    global _http
+    if _http is None or _http.closed:
+        _http = aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar())
+    return _http
+
+async def close_http():
+    if _http is not None and not _http.closed:
+        await _http.close()
+
 # ─── qBittorrent Session ─────────────────────────────────────────────────────
 
 _qb_cookies: dict = {}
@@ -175,19 +247,18 @@ async def qb_login() -> dict:
     """Login to qBittorrent and return cookies"""
     global _qb_cookies
     try:
-        async with aiohttp.ClientSession() as s:
-            async with s.post(
-                f"{QBITTORRENT_URL}/api/v2/auth/login",
-                data={"username": QB_USER, "password": QB_PASS},
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as r:
-                text = await r.text()
-                if text.strip() == "Ok.":
-                    _qb_cookies = {k: v.value for k, v in r.cookies.items()}
-                    logger.info("qBittorrent login successful")
-                    return _qb_cookies
-                else:
-                    logger.error(f"qBittorrent login failed: {text}")
+        async with http().post(
+            f"{QBITTORRENT_URL}/api/v2/auth/login",
+            data={"username": QB_USER, "password": QB_PASS},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as r:
+            text = await r.text()
+            if text.strip() == "Ok.":
+                _qb_cookies = {k: v.value for k, v in r.cookies.items()}
+                logger.info("qBittorrent login successful")
+                return _qb_cookies
+            else:
+                logger.error(f"qBittorrent login failed: {text}")
     except Exception as e:
         logger.error(f"qBittorrent login error: {e}")
     return {}
@@ -198,50 +269,244 @@ async def qb_request(method: str, path: str, **kwargs):
     if not _qb_cookies:
         await qb_login()
     try:
-        async with aiohttp.ClientSession(cookies=_qb_cookies) as s:
-            func = s.post if method == 'POST' else s.get
-            async with func(
-                f"{QBITTORRENT_URL}{path}",
-                timeout=aiohttp.ClientTimeout(total=15),
-                **kwargs
-            ) as r:
-                if r.status == 403:
-                    # Re-login and retry
-                    await qb_login()
-                    async with aiohttp.ClientSession(cookies=_qb_cookies) as s2:
-                        func2 = s2.post if method == 'POST' else s2.get
-                        async with func2(
-                            f"{QBITTORRENT_URL}{path}",
-                            timeout=aiohttp.ClientTimeout(total=15),
-                            **kwargs
-                        ) as r2:
-                            return r2.status, await r2.text() if 'json' not in kwargs.get('headers', {}).get('Accept', '') else await r2.json()
-                if r.status == 200:
-                    ct = r.headers.get('Content-Type', '')
-                    if 'json' in ct:
-                        return r.status, await r.json()
-                    return r.status, await r.text()
-                return r.status, None
+        s = http()
+        func = s.post if method == 'POST' else s.get
+        async with func(
+            f"{QBITTORRENT_URL}{path}",
+            cookies=_qb_cookies,
+            timeout=aiohttp.ClientTimeout(total=15),
+            **kwargs
+        ) as r:
+            if r.status == 403:
+                # Re-login and retry
+                await qb_login()
+                async with func(
+                    f"{QBITTORRENT_URL}{path}",
+                    cookies=_qb_cookies,
+                    timeout=aiohttp.ClientTimeout(total=15),
+                    **kwargs
+                ) as r2:
+                    return r2.status, await r2.text() if 'json' not in kwargs.get('headers', {}).get('Accept', '') else await r2.json()
+            if r.status == 200:
+                ct = r.headers.get('Content-Type', '')
+                if 'json' in ct:
+                    return r.status, await r.json()
+                return r.status, await r.text()
+            return r.status, None
     except Exception as e:
         logger.error(f"qBit request error {path}: {e}")
         return 0, None
 
-async def qbit_add_magnet(magnet: str) -> bool:
-    status, _ = await qb_request('POST', '/api/v2/torrents/add', data={"urls": magnet})
+async def qbit_add_magnets(magnets: list, stop_after_metadata: bool = False, tags: str = None) -> bool:
+    """Add several magnets/.torrent URLs in a single API call"""
+    data = {"urls": "\n".join(magnets)}
+    if QB_CATEGORY:
+        data["category"] = QB_CATEGORY
+    tags = ",".join(x for x in (QB_TAGS, tags) if x)
+    if tags:
+        data["tags"] = tags
+    if stop_after_metadata:
+        data["stopCondition"] = "MetadataReceived"
+    status, _ = await qb_request('POST', '/api/v2/torrents/add', data=data)
     return status == 200
 
-async def qbit_get_torrents() -> list:
-    status, data = await qb_request('GET', '/api/v2/torrents/info')
+async def qbit_add_magnet(magnet: str) -> bool:
+    return await qbit_add_magnets([magnet])
+
+async def qbit_get_torrents(**params) -> list:
+    """torrents/info; params pass through (filter, sort, reverse, limit, offset, hashes...)"""
+    status, data = await qb_request('GET', '/api/v2/torrents/info', params=params)
     return data if isinstance(data, list) else []
 
+_qb_v5 = None
+
+async def qbit_is_v5() -> bool:
+    """qBittorrent 5 (WebAPI 2.11+) renamed pause/resume and the 'paused' filter to stop/start/'stopped'"""
+    global _qb_v5
+    if _qb_v5 is None:
+        status, data = await qb_request('GET', '/api/v2/app/webapiVersion')
+        if status != 200 or data is None:
+            return False
+        try:
+            _qb_v5 = tuple(int(x) for x in str(data).split('.')[:2]) >= (2, 11)
+        except ValueError:
+            _qb_v5 = False
+    return _qb_v5
+
+async def qbit_maindata(rid: int = 0):
+    """Incremental sync snapshot since response id `rid`"""
+    status, data = await qb_request('GET', f'/api/v2/sync/maindata?rid={rid}')
+    return data if status == 200 else None
+
+torrent_index = TorrentIndex(qbit_maindata)
+
 async def qbit_get_files(hash_: str) -> list:
     status, data = await qb_request('GET', f'/api/v2/torrents/files?hash={hash_}')
     return data if isinstance(data, list) else []
 
+async def qbit_file_prio(hash_: str, ids: list, priority: int) -> bool:
+    status, _ = await qb_request('POST', '/api/v2/torrents/filePrio', data={
+        "hash": hash_, "id": "|".join(map(str, ids)), "priority": str(priority)
+    })
+    return status == 200
+
+async def qbit_start(hashes: str) -> bool:
+    """Start/resume torrents ('|'-separated hashes); qBittorrent 5 renamed resume to start"""
+    status, _ = await qb_request('POST', '/api/v2/torrents/start', data={"hashes": hashes})
+    if status == 404:
+        status, _ = await qb_request('POST', '/api/v2/torrents/resume', data={"hashes": hashes})
+    return status == 200
+
+async def qbit_set_download_limit(hashes: list, limit: int):
+    """Per-torrent download limit in bytes/s (0 = unlimited)"""
+    await qb_request('POST', '/api/v2/torrents/setDownloadLimit', data={"hashes": "|".join(hashes), "limit": str(limit)})
+
+async def qbit_get_preferences() -> dict:
+    status, data = await qb_request('GET', '/api/v2/app/preferences')
+    return data if status == 200 and isinstance(data, dict) else {}
+
+async def qbit_set_preferences(prefs: dict) -> bool:
+    status, _ = await qb_request('POST', '/api/v2/app/setPreferences', data={"json": json_module.dumps(prefs)})
+    return status == 200
+
+async def qbit_top_prio(hashes: list):
+    """Move torrents to the top of the queue so the last one ends up first"""
+    # A multi-hash topPrio keeps the torrents' existing relative order, so go one by one
+    for h in hashes:
+        await qb_request('POST', '/api/v2/torrents/topPrio', data={"hashes": h})
+
+async def qbit_bottom_prio(hashes: list):
+    await qb_request('POST', '/api/v2/torrents/bottomPrio', data={"hashes": "|".join(hashes)})
+
+async def qbit_stop(hashes: str) -> bool:
+    """Stop/pause torrents ('|'-separated hashes)"""
+    status, _ = await qb_request('POST', '/api/v2/torrents/stop', data={"hashes": hashes})
+    if status == 404:
+        status, _ = await qb_request('POST', '/api/v2/torrents/pause', data={"hashes": hashes})
+    return status == 200
+
 async def qbit_delete(hash_: str) -> bool:
     status, _ = await qb_request('POST', '/api/v2/torrents/delete', data={"hashes": hash_, "deleteFiles": "true"})
     return status == 200
 
+fair_share = quotas.FairShare(torrent_index, qbit_set_download_limit, USER_MAX_ACTIVE, USER_MAX_INFLIGHT,
+                              USER_WEIGHTS, DL_CAPACITY)
+torrent_index.on_change(fair_share.on_change)
+disk_space = DiskSpace(torrent_index, DOWNLOAD_DIR, DISK_MARGIN)
+torrent_index.on_change(disk_space.on_change)
+scheduler = QueueScheduler(SCHEDULER_DB_PATH, torrent_index, qbit_get_preferences, qbit_set_preferences,
+                           qbit_top_prio, qbit_bottom_prio, SCHED_MAX_ACTIVE, SCHED_STALL_MINUTES * 60)
+
+# ─── File Priorities ─────────────────────────────────────────────────────────
+
+VIDEO_EXTS    = ('.mkv', '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.ts')
+SUBTITLE_EXTS = ('.srt', '.ass', '.ssa', '.sub', '.idx', '.vtt', '.sup')
+
+_btih_re = re.compile(r'xt=urn:btih:([0-9a-fA-F]{40}|[A-Za-z2-7]{32})')
+
+def magnet_hash(magnet: str):
+    """Lowercase hex infohash of a magnet link, or None"""
+    m = _btih_re.search(magnet or '')
+    if not m:
+        return None
+    h = m.group(1)
+    if len(h) == 32:
+        h = base64.b32decode(h.upper()).hex()
+    return h.lower()
+
+def wanted_files(files: list, wanted_eps, is_pack: bool) -> set:
+    """Indexes of the files FILE_RULES keep; season packs come with no `wanted_eps` and keep every episode"""
+    def episode(name):
+        return parse_torrent_title(name.rsplit('/', 1)[-1]).get('episodes') or []
+    def matches(name):
+        return not wanted_eps or 'episodes' not in FILE_RULES or any(e in wanted_eps for e in episode(name))
+
+    indexed = [(f.get('index', i), f.get('name', ''), f.get('size', 0)) for i, f in enumerate(files)]
+    videos = [f for f in indexed if f[1].lower().endswith(VIDEO_EXTS) and 'sample' not in f[1].lower()]
+    keep = set()
+    if is_pack or (wanted_eps and 'episodes' in FILE_RULES):
+        keep = {i for i, name, _ in videos if matches(name)}
+    elif videos and 'largest_video' in FILE_RULES:
+        keep = {max(videos, key=lambda f: f[2])[0]}
+    else:
+        keep = {i for i, _, _ in videos}
+    if not keep and videos:
+        keep = {max(videos, key=lambda f: f[2])[0]}
+    if 'subtitles' in FILE_RULES:
+        keep |= {i for i, name, _ in indexed if name.lower().endswith(SUBTITLE_EXTS) and matches(name)}
+    return keep
+
+async def apply_file_rules(hash_: str, wanted_eps, is_pack: bool) -> bool:
+    """Skip unwanted files of a torrent whose metadata arrived, then start it if it fits on disk"""
+    files = await qbit_get_files(hash_)
+    if not files:
+        return False
+    keep = wanted_files(files, wanted_eps, is_pack) if FILE_RULES else set()
+    skip = [f.get('index', i) for i, f in enumerate(files) if f.get('index', i) not in keep]
+    if keep and skip:
+        await qbit_file_prio(hash_, skip, 0)
+        logger.info(f"Skipped {len(skip)}/{len(files)} files in {hash_}")
+    else:
+        keep = {f.get('index', i) for i, f in enumerate(files)}
+    # Now the real size is known; the result's Size may have been missing or wrong
+    size = sum(f.get('size', 0) for i, f in enumerate(files) if f.get('index', i) in keep)
+    if disk_space.fits(size, exclude=hash_):
+        await qbit_start(hash_)
+        return True
+    logger.warning(f"Not starting {hash_}: {size} bytes do not fit on disk")
+    chat_id = notifier.owner(hash_)
+    if chat_id and _bot:
+        await _bot.send_message(
+            chat_id,
+            f"💾 فضای دیسک کافی نیست؛ دانلود متوقف ماند.\n\n"
+            f"حجم لازم: {fmt_size(size)}\nفضای آزاد: {fmt_size(max(0, disk_space.available(hash_)))}",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📊 جزئیات", callback_data=f"dlt_{hash_}")]])
+        )
+    return True
+
+pending_files = PendingFiles(PENDING_DB_PATH, apply_file_rules)
+torrent_index.on_change(lambda changed, removed: pending_files.on_change(changed, removed, torrent_index.torrents))
+
+async def add_results(items: list, wanted: list = None, chat_id: int = None, user_id: int = None) -> bool:
+    """
+    Add results to qBittorrent. Magnets are added stopped-after-metadata and
+    handed to pending_files, so file rules and the disk check run before any
+    payload is fetched; `wanted` optionally gives the episodes each item should
+    keep. Season packs are always kept whole. `chat_id` is notified on
+    completion; `user_id` is tagged for per-user accounting.
+    """
+    user_tag = f"{quotas.USER_TAG_PREFIX}{user_id}" if user_id else None
+    hooked, plain, watched = [], [], []
+    for i, t in enumerate(items):
+        h = magnet_hash(t.get('Magnet', ''))
+        if h:
+            watched.append(h)
+            eps = wanted[i] if wanted else None
+            if t.get('is_pack'):
+                eps = None
+            elif eps is None:
+                eps = [e for e in t.get('episodes', []) if isinstance(e, int)]
+            hooked.append((h, t, eps))
+        else:
+            plain.append(t['Magnet'])
+
+    ok = True
+    if hooked:
+        ok = await qbit_add_magnets([t['Magnet'] for _, t, _ in hooked], stop_after_metadata=True, tags=user_tag)
+        if ok:
+            for h, t, eps in hooked:
+                torrent_index.note_added(h)
+                pending_files.add(h, eps, t.get('is_pack', False))
+    if plain:
+        ok = await qbit_add_magnets(plain, tags=user_tag) and ok
+    if ok:
+        for h, t, _ in hooked:
+            disk_space.reserve(h, result_size(t))
+    if ok and chat_id:
+        for h in watched:
+            notifier.watch(h, chat_id)
+    return ok
+
 # ─── Utilities ───────────────────────────────────────────────────────────────
 
 def fmt_size(s) -> str:
@@ -253,6 +518,25 @@ def fmt_size(s) -> str:
     except:
         return "?"
 
+# Where the show/movie name ends in a release title: episode/season markers,
+# year, quality or source tags, or the first bracketed group
+_title_end_re = re.compile(
+    r'[Ss]\d+[ ._-]*[Ee]\d+|\b[Ss]\d{1,2}\b|\b[Ss]eason\s*\d+|\s-\s+\d{2,4}\b'
+    r'|\b(?:19|20)\d{2}\b|\b(?:4K|2160p|1080p|720p|480p|540p)\b'
+    r'|\b(?:WEB-?DL|WEB-?Rip|WEB|BluRay|BRRip|BDRip|HDTV|DVDRip|HDRip|x264|x265|HEVC|REPACK|PROPER)\b'
+    r'|[\[(]',
+    re.IGNORECASE
+)
+
+def clean_torrent_title(title: str) -> str:
+    """Show/movie name from a release title: 'Dark.S01E02.1080p' -> 'Dark'"""
+    t = re.sub(r'^\s*(?:\[[^\]]*\]\s*)+', '', title)   # leading [Group] tags
+    for m in _title_end_re.finditer(t):
+        if t[:m.start()].strip(' ._-'):
+            t = t[:m.start()]
+            break
+    return ' '.join(re.sub(r'[._]+', ' ', t).split()).strip(' -') or title
+
 def parse_torrent_title(title: str) -> dict:
     """
     Robust torrent title parser for TV shows and movies.
@@ -261,7 +545,7 @@ def parse_torrent_title(title: str) -> dict:
     result = {
         'season': None, 'episode': None, 'episodes': [],
         'quality': 'Unknown', 'is_tv': False,
-        'is_pack': False, 'clean_title': title
+        'is_pack': False, 'clean_title': clean_torrent_title(title)
     }
 
     # Quality detection
@@ -273,11 +557,12 @@ def parse_torrent_title(title: str) -> dict:
     found_se = False
 
     # Pattern 1: S01E01 or S1E1 (standard)
-    m = re.search(r'[Ss](\d+)[Ee](\d+)', title)
+    m = re.search(r'[Ss](\d+)[Ee](\d+)(?:-[Ee]?(\d{1,3})\b)?', title)
     if m:
         result['season']   = int(m.group(1))
         result['episode']  = int(m.group(2))
-        result['episodes'] = [int(m.group(2))]
+        last = int(m.group(3)) if m.group(3) else result['episode']
+        result['episodes'] = list(range(result['episode'], max(last, result['episode']) + 1))
         result['is_tv']    = True
         found_se = True
 
@@ -345,123 +630,123 @@ async def search_jackett(query: str, filter_idx: str = None, sort_by: str = "new
     all_indexers = await get_indexers()
     indexers = [filter_idx] if filter_idx else [x[0] for x in all_indexers]
 
-    async with aiohttp.ClientSession() as session:
-        for idx_id in indexers:
-            # Try torznab XML first (more reliable for magnet links)
-            try:
-                params = urllib.parse.urlencode({
-                    "apikey": JACKETT_API_KEY,
-                    "t": "search",
-                    "q": query,
-                    "sort": "date",
-                    "order": "desc"
-                })
-                url = f"{JACKETT_URL}/api/v2.0/indexers/{idx_id}/results/torznab/api?{params}"
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as r:
-                    if r.status == 200:
-                        text = await r.text()
-                        if '<item>' in text:
-                            root = ET.fromstring(text)
-                            ns = {'torznab': 'http://torznab.com/schemas/2015/feed'}
-                            for item in root.findall('.//item'):
-                                title_el = item.find('title')
-                                title = title_el.text if title_el is not None else '?'
-
-                                # Magnet: check comments first, then enclosure, then link
-                                magnet = ''
-                                comments_el = item.find('comments')
-                                if comments_el is not None and comments_el.text and comments_el.text.startswith('magnet:'):
-                                    magnet = comments_el.text
-                                else:
-                                    # Try torznab magneturl attribute
-                                    for attr in item.findall('torznab:attr', ns):
-                                        if attr.get('name') == 'magneturl':
-                                            magnet = attr.get('value', '')
-                                            break
-                                    if not magnet:
-                                        # Try enclosure url
-                                        enc = item.find('enclosure')
-                                        if enc is not None:
-                                            url_enc = enc.get('url', '')
-                                            if url_enc.startswith('magnet:'):
-                                                magnet = url_enc
-                                            else:
-                                                # Use jackett download link as fallback (qBittorrent can handle .torrent URLs)
-                                                magnet = url_enc
-                                    if not magnet:
-                                        # Try link element
-                                        link_el = item.find('link')
-                                        if link_el is not None and link_el.text:
-                                            magnet = link_el.text
-
-                                pub_el = item.find('pubDate')
-                                pub = pub_el.text if pub_el is not None else ''
-                                size_el = item.find('size')
-                                size = size_el.text if size_el is not None else '0'
-
-                                # Seeders from torznab attrs
-                                seeders = '0'
+    session = http()
+    for idx_id in indexers:
+        # Try torznab XML first (more reliable for magnet links)
+        try:
+            params = urllib.parse.urlencode({
+                "apikey": JACKETT_API_KEY,
+                "t": "search",
+                "q": query,
+                "sort": "date",
+                "order": "desc"
+            })
+            url = f"{JACKETT_URL}/api/v2.0/indexers/{idx_id}/results/torznab/api?{params}"
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as r:
+                if r.status == 200:
+                    text = await r.text()
+                    if '<item>' in text:
+                        root = ET.fromstring(text)
+                        ns = {'torznab': 'http://torznab.com/schemas/2015/feed'}
+                        for item in root.findall('.//item'):
+                            title_el = item.find('title')
+                            title = title_el.text if title_el is not None else '?'
+
+                            # Magnet: check comments first, then enclosure, then link
+                            magnet = ''
+                            comments_el = item.find('comments')
+                            if comments_el is not None and comments_el.text and comments_el.text.startswith('magnet:'):
+                                magnet = comments_el.text
+                            else:
+                                # Try torznab magneturl attribute
                                 for attr in item.findall('torznab:attr', ns):
-                                    if attr.get('name') == 'seeders':
-                                        seeders = attr.get('value', '0')
+                                    if attr.get('name') == 'magneturl':
+                                        magnet = attr.get('value', '')
                                         break
+                                if not magnet:
+                                    # Try enclosure url
+                                    enc = item.find('enclosure')
+                                    if enc is not None:
+                                        url_enc = enc.get('url', '')
+                                        if url_enc.startswith('magnet:'):
+                                            magnet = url_enc
+                                        else:
+                                            # Use jackett download link as fallback (qBittorrent can handle .torrent URLs)
+                                            magnet = url_enc
+                                if not magnet:
+                                    # Try link element
+                                    link_el = item.find('link')
+                                    if link_el is not None and link_el.text:
+                                        magnet = link_el.text
+
+                            pub_el = item.find('pubDate')
+                            pub = pub_el.text if pub_el is not None else ''
+                            size_el = item.find('size')
+                            size = size_el.text if size_el is not None else '0'
+
+                            # Seeders from torznab attrs
+                            seeders = '0'
+                            for attr in item.findall('torznab:attr', ns):
+                                if attr.get('name') == 'seeders':
+                                    seeders = attr.get('value', '0')
+                                    break
 
-                                parsed = parse_torrent_title(title)
-                                results.append({
-                                    'Title':      title,
-                                    'Magnet':     magnet,
-                                    'Size':       size,
-                                    'Seeders':    seeders,
-                                    'Indexer':    idx_id,
-                                    'PubDate':    pub,
-                                    'ParsedDate': parse_pubdate(pub),
-                                    **parsed
-                                })
-                            logger.info(f"Jackett XML {idx_id}: {len([x for x in results if x['Indexer']==idx_id])} results")
-                            continue
-            except Exception as e:
-                logger.warning(f"Jackett XML {idx_id} failed: {e}, trying JSON...")
-
-            # Fallback: JSON API
-            try:
-                params = urllib.parse.urlencode({
-                    "apikey": JACKETT_API_KEY,
-                    "q": query,
-                    "limit": 50,
-                })
-                url = f"{JACKETT_URL}/api/v2.0/indexers/{idx_id}/results?{params}"
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as r:
-                    if r.status == 200:
-                        data = await r.json()
-                        for item in data.get('Results', []):
-                            title = item.get('Title', '?')
-                            # FIX: correct key is MagnetUri, not Magnet
-                            magnet = item.get('MagnetUri', '') or item.get('Magnet', '')
-                            if not magnet or not magnet.startswith('magnet:'):
-                                # Last resort: check if Guid is a magnet
-                                guid = item.get('Guid', '')
-                                if str(guid).startswith('magnet:'):
-                                    magnet = guid
-                                else:
-                                    # Try Link as fallback
-                                    link = item.get('Link', '')
-                                    if link and link.startswith('http'):
-                                        magnet = link
-                            pub = item.get('PublishDate', item.get('FirstSeen', ''))
                             parsed = parse_torrent_title(title)
                             results.append({
                                 'Title':      title,
                                 'Magnet':     magnet,
-                                'Size':       str(item.get('Size', 0)),
-                                'Seeders':    str(item.get('Seeders', 0)),
+                                'Size':       size,
+                                'Seeders':    seeders,
                                 'Indexer':    idx_id,
                                 'PubDate':    pub,
-                                'ParsedDate': parse_pubdate(pub) if pub else datetime.min,
+                                'ParsedDate': parse_pubdate(pub),
                                 **parsed
                             })
-                        logger.info(f"Jackett JSON {idx_id}: {len(data.get('Results', []))} results")
-            except Exception as e:
-                logger.error(f"Jackett JSON {idx_id}: {e}")
+                        logger.info(f"Jackett XML {idx_id}: {len([x for x in results if x['Indexer']==idx_id])} results")
+                        continue
+        except Exception as e:
+            logger.warning(f"Jackett XML {idx_id} failed: {e}, trying JSON...")
+
+        # Fallback: JSON API
+        try:
+            params = urllib.parse.urlencode({
+                "apikey": JACKETT_API_KEY,
+                "q": query,
+                "limit": 50,
+            })
+            url = f"{JACKETT_URL}/api/v2.0/indexers/{idx_id}/results?{params}"
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as r:
+                if r.status == 200:
+                    data = await r.json()
+                    for item in data.get('Results', []):
+                        title = item.get('Title', '?')
+                        # FIX: correct key is MagnetUri, not Magnet
+                        magnet = item.get('MagnetUri', '') or item.get('Magnet', '')
+                        if not magnet or not magnet.startswith('magnet:'):
+                            # Last resort: check if Guid is a magnet
+                            guid = item.get('Guid', '')
+                            if str(guid).startswith('magnet:'):
+                                magnet = guid
+                            else:
+                                # Try Link as fallback
+                                link = item.get('Link', '')
+                                if link and link.startswith('http'):
+                                    magnet = link
+                        pub = item.get('PublishDate', item.get('FirstSeen', ''))
+                        parsed = parse_torrent_title(title)
+                        results.append({
+                            'Title':      title,
+                            'Magnet':     magnet,
+                            'Size':       str(item.get('Size', 0)),
+                            'Seeders':    str(item.get('Seeders', 0)),
+                            'Indexer':    idx_id,
+                            'PubDate':    pub,
+                            'ParsedDate': parse_pubdate(pub) if pub else datetime.min,
+                            **parsed
+                        })
+                    logger.info(f"Jackett JSON {idx_id}: {len(data.get('Results', []))} results")
+        except Exception as e:
+            logger.error(f"Jackett JSON {idx_id}: {e}")
 
     # Sort results
     if sort_by == "seeders":
@@ -483,33 +768,108 @@ async def search_jackett(query: str, filter_idx: str = None, sort_by: str = "new
 
 # ─── IMDB Suggestion ─────────────────────────────────────────────────────────
 
+# Local index built from IMDb dataset dumps (see bot/title_index.py)
+title_index = TitleIndex(TITLE_INDEX_PATH)
+
 async def get_imdb_suggestions(query: str) -> list:
+    """Title suggestions from the local index, falling back to the remote IMDB API"""
+    q = query.strip()
+    if not q:
+        return []
+    try:
+        local = title_index.suggest(q)
+        if local:
+            return local
+    except Exception as e:
+        logger.warning(f"Local title index lookup failed: {e}")
     try:
-        q = query.strip()
-        if not q:
-            return []
         safe_q = re.sub(r'[^a-zA-Z0-9 ]', '', q).strip()
         if not safe_q:
             safe_q = q
         url = f"https://v2.sg.media-imdb.com/suggestion/{safe_q[0].lower()}/{safe_q.replace(' ', '%20')}.json"
-        async with aiohttp.ClientSession() as s:
-            async with s.get(url, timeout=aiohttp.ClientTimeout(total=10)) as r:
-                if r.status == 200:
-                    d = await r.json(content_type=None)
-                    return [
-                        {
-                            "id":    x.get("id", ""),  # IMDB ID like tt1234567
-                            "title": x.get("l", "?"),
-                            "year":  x.get("y", ""),
-                            "type":  x.get("q", ""),
-                            "poster": x.get("i", {}).get("imageUrl", "") if isinstance(x.get("i"), dict) else ""
-                        }
-                        for x in d.get("d", [])[:10]
-                    ]
+        async with http().get(url, timeout=aiohttp.ClientTimeout(total=10)) as r:
+            if r.status == 200:
+                d = await r.json(content_type=None)
+                return [
+                    {
+                        "id":    x.get("id", ""),  # IMDB ID like tt1234567
+                        "title": x.get("l", "?"),
+                        "year":  x.get("y", ""),
+                        "type":  x.get("q", ""),
+                        "poster": x.get("i", {}).get("imageUrl", "") if isinstance(x.get("i"), dict) else ""
+                    }
+                    for x in d.get("d", [])[:10]
+                ]
     except Exception as e:
         logger.error(f"IMDB suggestion error: {e}")
     return []
 
+# Queries our own users searched before, for instant inline completions
+search_history = SearchHistory(HISTORY_DB_PATH)
+
+# ─── Result Sessions ─────────────────────────────────────────────────────────
+#
+# Every results message owns its own session, stored in ctx.user_data["sessions"]
+# under a short token derived from the message id. Buttons carry the token as
+# "<token>:<action>", so older result messages keep working after the user
+# searches again. A session holds only a handle to a shared result set plus its
+# own view state; derived lists (seasons, episodes, flat list) are indices into
+# the shared results.
+
+MAX_SESSIONS_PER_USER = 5
+result_sets = ResultSetStore()
+_B36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+def _base36(n: int) -> str:
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = _B36[r] + out
+        if not n:
+            return out
+
+def new_session(ctx, message_id: int, rs) -> dict:
+    """Create the session for a results message, evicting the least recently used"""
+    user_sessions = ctx.user_data.setdefault("sessions", {})
+    token = _base36(message_id)
+    drop_session(ctx, token)
+    result_sets.acquire(rs.handle)
+    sess = user_sessions[token] = {"token": token, "rs": rs.handle}
+    while len(user_sessions) > MAX_SESSIONS_PER_USER:
+        drop_session(ctx, next(iter(user_sessions)))
+    return sess
+
+def get_session(ctx, token: str):
+    """Look up a session and mark it most recently used"""
+    user_sessions = ctx.user_data.get("sessions", {})
+    sess = user_sessions.pop(token, None)
+    if sess is not None:
+        user_sessions[token] = sess
+    return sess
+
+def drop_session(ctx, token: str):
+    sess = ctx.user_data.get("sessions", {}).pop(token, None)
+    if sess:
+        result_sets.release(sess.get("rs"))
+
+def session_results(sess: dict) -> tuple:
+    """The shared (read-only) results behind a session"""
+    rs = result_sets.get(sess.get("rs"))
+    return rs.results if rs else ()
+
+def item_refs(sess: dict, items) -> list:
+    """Indices of result items in the session's shared result set"""
+    rs = result_sets.get(sess.get("rs"))
+    return [rs.positions[id(x)] for x in items] if rs else []
+
+def item_deref(sess: dict, refs) -> list:
+    results = session_results(sess)
+    return [results[i] for i in refs if i < len(results)]
+
+def cb(sess: dict, action: str) -> str:
+    """callback_data for a button bound to a result session"""
+    return f"{sess['token']}:{action}" if sess else action
+
 # ─── UI Helpers ──────────────────────────────────────────────────────────────
 
 def main_menu() -> InlineKeyboardMarkup:
@@ -518,41 +878,52 @@ def main_menu() -> InlineKeyboardMarkup:
         [InlineKeyboardButton("⚙️ Status",    callback_data="status")],
     ])
 
-def sort_buttons(current: str) -> list:
+def sort_buttons(current: str, sess: dict) -> list:
     """Sort buttons with active indicator"""
     top_label = "✅ 👤 Top Seeders" if current == "seeders" else "👤 Top Seeders"
     new_label = "✅ 🆕 Newest"       if current == "newest"  else "🆕 Newest"
     return [[
-        InlineKeyboardButton(top_label, callback_data="sort_seeders"),
-        InlineKeyboardButton(new_label, callback_data="sort_newest"),
+        InlineKeyboardButton(top_label, callback_data=cb(sess, "sort_seeders")),
+        InlineKeyboardButton(new_label, callback_data=cb(sess, "sort_newest")),
     ]]
 
-async def indexer_buttons(current: str) -> list:
+async def indexer_buttons(current: str, sess: dict) -> list:
     """Indexer filter buttons"""
     kb = []
     row = []
     indexers = await get_indexers()
     for idx_id, display in indexers:
         prefix = "✅ " if current == idx_id else ""
-        row.append(InlineKeyboardButton(f"{prefix}{display}", callback_data=f"idx_{idx_id}"))
+        row.append(InlineKeyboardButton(f"{prefix}{display}", callback_data=cb(sess, f"idx_{idx_id}")))
         if len(row) == 2:
             kb.append(row)
             row = []
     if row:
         kb.append(row)
     if current:
-        kb.append([InlineKeyboardButton("🔄 All Indexers", callback_data="idx_all")])
+        kb.append([InlineKeyboardButton("🔄 All Indexers", callback_data=cb(sess, "idx_all"))])
     return kb
 
-def paginate_buttons(page: int, total: int, prefix: str = "p") -> list:
+def paginate_buttons(page: int, total: int, prefix: str = "p", sess: dict = None) -> list:
     nav = []
     if page > 0:
-        nav.append(InlineKeyboardButton("◀️", callback_data=f"{prefix}_{page-1}"))
+        nav.append(InlineKeyboardButton("◀️", callback_data=cb(sess, f"{prefix}_{page-1}")))
     nav.append(InlineKeyboardButton(f"{page+1}/{total}", callback_data="noop"))
     if page < total - 1:
-        nav.append(InlineKeyboardButton("▶️", callback_data=f"{prefix}_{page+1}"))
+        nav.append(InlineKeyboardButton("▶️", callback_data=cb(sess, f"{prefix}_{page+1}")))
     return [nav] if nav else []
 
+def batch_buttons(sess: dict, start: int, shown: int) -> list:
+    """Download-selected / download-this-page actions; `start`/`shown` locate the current page"""
+    row = []
+    n_selected = len(sess.get("selected", []))
+    if n_selected:
+        row.append(InlineKeyboardButton(f"📥 دانلود انتخاب‌شده‌ها ({n_selected})", callback_data=cb(sess, "dl_sel")))
+    if shown > 1:
+        row.append(InlineKeyboardButton(f"📥 دانلود همین صفحه ({shown})",
+                                        callback_data=cb(sess, f"dl_page_{start}_{start + shown}")))
+    return [row] if row else []
+
 # ─── Authorization ────────────────────────────────────────────────────────────
 
 def is_authorized(update: Update) -> bool:
@@ -566,18 +937,18 @@ async def unauthorized_reply(update: Update):
 
 # ─── Results Display ──────────────────────────────────────────────────────────
 
-async def show_results(update: Update, ctx: ContextTypes.DEFAULT_TYPE, msg):
+async def show_results(update: Update, sess: dict, msg):
     """
     Main result display function.
     - TV shows: Season → Quality → Episode navigation
     - Movies: flat paginated list with sort/filter
     """
-    items    = ctx.user_data.get("results", [])
-    title    = ctx.user_data.get("search_title", "")
-    sort     = ctx.user_data.get("sort", "newest")
-    filter_  = ctx.user_data.get("filter_indexer")
-    nav_mode = ctx.user_data.get("nav_mode", "auto")  # auto/tv/movie/season/quality
-    page     = ctx.user_data.get("page", 0)
+    items    = session_results(sess)
+    title    = sess.get("search_title", "")
+    sort     = sess.get("sort", "newest")
+    filter_  = sess.get("filter_indexer")
+    nav_mode = sess.get("nav_mode", "auto")  # auto/tv/movie/season/quality
+    page     = sess.get("page", 0)
 
     if not items:
         try:
@@ -595,21 +966,21 @@ async def show_results(update: Update, ctx: ContextTypes.DEFAULT_TYPE, msg):
             # If there are TV items, go to TV mode (season selection)
             # User can always switch to "all results" if needed
             nav_mode = "tv"
-            ctx.user_data["nav_mode"] = "tv"
+            sess["nav_mode"] = "tv"
         else:
             nav_mode = "movie"
-            ctx.user_data["nav_mode"] = "movie"
+            sess["nav_mode"] = "movie"
 
     if nav_mode == "tv":
-        await show_season_list(update, ctx, msg, tv_items, title)
+        await show_season_list(update, sess, msg, tv_items, title)
     elif nav_mode == "season":
-        await show_quality_list(update, ctx, msg)
+        await show_quality_list(update, sess, msg)
     elif nav_mode == "quality":
-        await show_episode_list(update, ctx, msg)
+        await show_episode_list(update, sess, msg)
     else:
-        await show_movie_list(update, ctx, msg, items if not movie_items else movie_items, title, sort, filter_, page)
+        await show_movie_list(update, sess, msg, items if not movie_items else movie_items, title, sort, filter_, page)
 
-async def show_season_list(update, ctx, msg, tv_items: list, title: str):
+async def show_season_list(update, sess, msg, tv_items: list, title: str):
     """Show seasons selection"""
     seasons = defaultdict(set)
     season_items = defaultdict(list)
@@ -629,8 +1000,8 @@ async def show_season_list(update, ctx, msg, tv_items: list, title: str):
             seasons[s_key].add('pack')
         season_items[s_key].append(item)
 
-    ctx.user_data["season_items"] = dict(season_items)
-    ctx.user_data["seasons_info"] = {k: list(v) for k, v in seasons.items()}
+    sess["season_items"] = {k: item_refs(sess, v) for k, v in season_items.items()}
+    sess["seasons_info"] = {k: list(v) for k, v in seasons.items()}
 
     sorted_seasons = sorted(seasons.keys(), key=lambda x: int(x) if x.isdigit() else 0, reverse=True)
 
@@ -652,28 +1023,28 @@ async def show_season_list(update, ctx, msg, tv_items: list, title: str):
                 count_text = f"📝 {len(eps_set)} قسمت"
         torrent_count = len(season_items[s])
         text += f"📚 فصل {s} — {count_text} ({torrent_count} فایل)\n"
-        kb.append([InlineKeyboardButton(f"📚 فصل {s} ({count_text})", callback_data=f"season_{s}")])
+        kb.append([InlineKeyboardButton(f"📚 فصل {s} ({count_text})", callback_data=cb(sess, f"season_{s}"))])
 
     if not sorted_seasons:
         # No season info found, fall back to movie list
-        ctx.user_data["nav_mode"] = "movie"
-        await show_movie_list(update, ctx, msg, tv_items, title, ctx.user_data.get("sort","newest"), ctx.user_data.get("filter_indexer"), 0)
+        sess["nav_mode"] = "movie"
+        await show_movie_list(update, sess, msg, tv_items, title, sess.get("sort","newest"), sess.get("filter_indexer"), 0)
         return
 
-    kb.append([InlineKeyboardButton("📋 نمایش همه نتایج", callback_data="all_raw")])
-    kb.append([InlineKeyboardButton("◀️ برگشت", callback_data="back")])
+    kb.append([InlineKeyboardButton("📋 نمایش همه نتایج", callback_data=cb(sess, "all_raw"))])
+    kb.append([InlineKeyboardButton("◀️ برگشت", callback_data=cb(sess, "back"))])
 
     try:
         await msg.edit_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
     except:
         await msg.reply_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
 
-async def show_quality_list(update, ctx, msg):
+async def show_quality_list(update, sess, msg):
     """Show quality options for selected season"""
-    season       = ctx.user_data.get("current_season", "")
-    season_items = ctx.user_data.get("season_items", {})
-    episodes     = season_items.get(season, [])
-    title        = ctx.user_data.get("search_title", "")
+    season       = sess.get("current_season", "")
+    season_items = sess.get("season_items", {})
+    episodes     = item_deref(sess, season_items.get(season, []))
+    title        = sess.get("search_title", "")
 
     if not episodes:
         await msg.edit_text("❌ هیچ قسمتی پیدا نشد.", reply_markup=main_menu())
@@ -687,7 +1058,7 @@ async def show_quality_list(update, ctx, msg):
     quality_order = {'4K': 0, '2160P': 0, '1080P': 1, '720P': 2, '480P': 3, 'UNKNOWN': 99}
     sorted_q = sorted(qualities.keys(), key=lambda x: quality_order.get(x.upper(), 50))
 
-    ctx.user_data["quality_items"] = dict(qualities)
+    sess["quality_items"] = {k: item_refs(sess, v) for k, v in qualities.items()}
 
     kb = []
     text = f"📺 *{escape_md(title)}* — فصل {season}\n\n*انتخاب کیفیت:*\n\n"
@@ -703,23 +1074,23 @@ async def show_quality_list(update, ctx, msg):
         else:
             ep_text = f"{count} فایل"
         text += f"🎬 {q} — {ep_text}\n"
-        kb.append([InlineKeyboardButton(f"🎬 {q} ({ep_text})", callback_data=f"quality_{q}")])
+        kb.append([InlineKeyboardButton(f"🎬 {q} ({ep_text})", callback_data=cb(sess, f"quality_{q}"))])
 
-    kb.append([InlineKeyboardButton("◀️ برگشت به فصل‌ها", callback_data="back_seasons")])
+    kb.append([InlineKeyboardButton("◀️ برگشت به فصل‌ها", callback_data=cb(sess, "back_seasons"))])
 
     try:
         await msg.edit_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
     except:
         await msg.reply_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
 
-async def show_episode_list(update, ctx, msg):
+async def show_episode_list(update, sess, msg):
     """Show episodes for selected quality"""
-    quality      = ctx.user_data.get("current_quality", "")
-    quality_items= ctx.user_data.get("quality_items", {})
-    episodes     = quality_items.get(quality, [])
-    title        = ctx.user_data.get("search_title", "")
-    season       = ctx.user_data.get("current_season", "")
-    page         = ctx.user_data.get("ep_page", 0)
+    quality      = sess.get("current_quality", "")
+    quality_items= sess.get("quality_items", {})
+    episodes     = item_deref(sess, quality_items.get(quality, []))
+    title        = sess.get("search_title", "")
+    season       = sess.get("current_season", "")
+    page         = sess.get("ep_page", 0)
 
     if not episodes:
         await msg.edit_text("❌ هیچ قسمتی پیدا نشد.", reply_markup=main_menu())
@@ -744,7 +1115,7 @@ async def show_episode_list(update, ctx, msg):
 
     sorted_episodes = packs + eps
 
-    ctx.user_data["episode_list"] = sorted_episodes
+    sess["episode_list"] = item_refs(sess, sorted_episodes)
 
     total = max(1, (len(sorted_episodes) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
     start = page * ITEMS_PER_PAGE
@@ -753,7 +1124,9 @@ async def show_episode_list(update, ctx, msg):
     text = f"📺 *{escape_md(title)}* — S{season} — {quality}\n\n"
 
     all_indexers = await get_indexers()
-    
+    selected = set(sess.get("selected", []))
+    refs = sess["episode_list"]
+
     for i, ep in enumerate(sorted_episodes[start:start + ITEMS_PER_PAGE]):
         ep_num  = ep.get('episode')
         size    = fmt_size(ep.get('Size', '0'))
@@ -766,26 +1139,30 @@ async def show_episode_list(update, ctx, msg):
         display_title = full_title[:75] + "..." if len(full_title) > 78 else full_title
         
         # First row: Full title (download action)
-        title_btn = InlineKeyboardButton(display_title, callback_data=f"dl_ep_{start+i}")
+        title_btn = InlineKeyboardButton(display_title, callback_data=cb(sess, f"dl_ep_{start+i}"))
         
-        # Second row: Info (no action - just display)
+        # Second row: Info, tap to (un)select for batch download
         ep_label = f"🗂 Pack" if is_pack else (f"E{ep_num:02d}" if ep_num else "🎬")
         idx_emoji = get_indexer_emoji(indexer, all_indexers)
-        info_text = f"{ep_label} | 📦 {size} | 👤{seeders} | {idx_emoji} {indexer[:12]}"
-        info_btn = InlineKeyboardButton(info_text, callback_data="noop")
+        mark = "☑️" if refs[start + i] in selected else "⬜"
+        info_text = f"{mark} {ep_label} | 📦 {size} | 👤{seeders} | {idx_emoji} {indexer[:12]}"
+        info_btn = InlineKeyboardButton(info_text, callback_data=cb(sess, f"sel_{refs[start + i]}"))
         
         kb.append([title_btn])
         kb.append([info_btn])
 
-    kb.extend(paginate_buttons(page, total, "ep"))
-    kb.append([InlineKeyboardButton("◀️ برگشت به کیفیت", callback_data="back_quality")])
+    kb.extend(paginate_buttons(page, total, "ep", sess))
+    kb.extend(batch_buttons(sess, start, len(sorted_episodes[start:start + ITEMS_PER_PAGE])))
+    if packs or len(eps) > 1:
+        kb.append([InlineKeyboardButton("🧮 کم‌حجم‌ترین ترکیب برای کل فصل", callback_data=cb(sess, "plan"))])
+    kb.append([InlineKeyboardButton("◀️ برگشت به کیفیت", callback_data=cb(sess, "back_quality"))])
 
     try:
         await msg.edit_text(text or "📝 قسمت‌ها:", parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
     except:
         await msg.reply_text(text or "📝 قسمت‌ها:", parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
 
-async def show_movie_list(update, ctx, msg, items: list, title: str, sort: str, filter_: str, page: int):
+async def show_movie_list(update, sess, msg, items: list, title: str, sort: str, filter_: str, page: int):
     """Show flat paginated movie/general results"""
     # Always apply requested two-stage ordering:
     # 1) newest -> oldest
@@ -809,6 +1186,8 @@ async def show_movie_list(update, ctx, msg, items: list, title: str, sort: str,
 
     kb = []
     all_indexers = await get_indexers()
+    refs = item_refs(sess, sorted_items)
+    selected = set(sess.get("selected", []))
     for i, t in enumerate(sorted_items[start:start + ITEMS_PER_PAGE]):
         idx_em  = get_indexer_emoji(t.get('Indexer', ''), all_indexers)
         size    = fmt_size(t.get('Size', '0'))
@@ -835,19 +1214,26 @@ async def show_movie_list(update, ctx, msg, items: list, title: str, sort: str,
         caption += f"{num}. {idx_em}{q_str}{se_info} | {size} | 👤{seeders}\n"
         caption += f"   `{name[:60]}`\n\n"
 
-        kb.append([InlineKeyboardButton(
-            f"📥 #{num} {idx_em} {q_str} {size} 👤{seeders}",
-            callback_data=f"dl_movie_{start+i}"
-        )])
-
-    kb.extend(paginate_buttons(page, total_pages))
-    kb.extend(sort_buttons(sort))
-    kb.extend(await indexer_buttons(filter_))
-    kb.append([InlineKeyboardButton("◀️ برگشت", callback_data="back")])
+        kb.append([
+            InlineKeyboardButton(
+                "☑️" if refs[start + i] in selected else "⬜",
+                callback_data=cb(sess, f"sel_{refs[start + i]}")
+            ),
+            InlineKeyboardButton(
+                f"📥 #{num} {idx_em} {q_str} {size} 👤{seeders}",
+                callback_data=cb(sess, f"dl_movie_{start+i}")
+            ),
+        ])
+
+    kb.extend(paginate_buttons(page, total_pages, "p", sess))
+    kb.extend(batch_buttons(sess, start, len(sorted_items[start:start + ITEMS_PER_PAGE])))
+    kb.extend(sort_buttons(sort, sess))
+    kb.extend(await indexer_buttons(filter_, sess))
+    kb.append([InlineKeyboardButton("◀️ برگشت", callback_data=cb(sess, "back"))])
 
     # Store sorted flat list for download callbacks
-    ctx.user_data["flat_list"] = sorted_items
-    ctx.user_data["page"] = page
+    sess["flat_list"] = refs
+    sess["page"] = page
 
     try:
         await msg.edit_text(caption, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
@@ -858,6 +1244,50 @@ async def show_movie_list(update, ctx, msg, items: list, title: str, sort: str,
         except Exception as e2:
             logger.error(f"show_movie_list reply error: {e2}")
 
+async def show_current_list(update, sess, msg):
+    """Re-render the episode or flat list the session is currently showing"""
+    if sess.get("nav_mode") == "quality":
+        await show_episode_list(update, sess, msg)
+    else:
+        items = item_deref(sess, sess["flat_list"]) if "flat_list" in sess else session_results(sess)
+        await show_movie_list(update, sess, msg, items, sess.get("search_title", ""), sess.get("sort", "newest"),
+                              sess.get("filter_indexer"), sess.get("page", 0))
+
+async def show_season_plan(update, sess, msg):
+    """Offer the smallest set of torrents covering the season at the current quality"""
+    quality  = sess.get("current_quality", "")
+    episodes = item_deref(sess, sess.get("quality_items", {}).get(quality, []))
+    plan     = plan_coverage(episodes, PLAN_MIN_SEEDERS)
+    back     = [InlineKeyboardButton("◀️ برگشت به قسمت‌ها", callback_data=cb(sess, "relist"))]
+
+    if not plan['items']:
+        await msg.edit_text(f"❌ هیچ تورنتی با حداقل {PLAN_MIN_SEEDERS} سیدر پیدا نشد.",
+                            reply_markup=InlineKeyboardMarkup([back]))
+        return
+
+    sess["plan"] = item_refs(sess, plan['items'])
+    sess["plan_eps"] = plan['wanted']
+    everything = sum(int(e.get('Size', 0) or 0) for e in episodes)
+    text = (f"🧮 *{escape_md(sess.get('search_title', ''))}* — S{sess.get('current_season', '')} — {quality}\n\n"
+            f"{len(plan['items'])} تورنت، مجموع *{fmt_size(plan['size'])}* (از {fmt_size(everything)})\n")
+    if plan['whole_season']:
+        text += "قسمت‌ها: کل فصل (پک)\n"
+    elif plan['episodes']:
+        text += f"قسمت‌ها: {plan['episodes'][0]}-{plan['episodes'][-1]}\n"
+    if plan['missing']:
+        text += f"⚠️ بدون تورنت سالم: {', '.join(map(str, plan['missing']))}\n"
+    if plan['pack_only']:
+        text += "⚠️ بقیه قسمت‌های فصل فقط در پک هست و هیچ پکی سیدر کافی ندارد.\n"
+    text += "\n" + "\n".join(
+        f"• `{t.get('Title', '?')[:50]}` — {fmt_size(t.get('Size', '0'))} 👤{t.get('Seeders', '0')}"
+        for t in plan['items'][:15]
+    )
+    kb = [
+        [InlineKeyboardButton(f"📥 دانلود همه ({fmt_size(plan['size'])})", callback_data=cb(sess, "dl_plan"))],
+        back,
+    ]
+    await msg.edit_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
+
 def escape_md(text: str) -> str:
     """Escape special Markdown characters"""
     for ch in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
@@ -927,36 +1357,29 @@ async def _do_search(update: Update, ctx: ContextTypes.DEFAULT_TYPE, query: str)
         if search_query != clean_query:
             logger.info(f"Searching without year: '{search_query}' (original: '{clean_query}')")
     
-    ctx.user_data.clear()
     msg = await update.message.reply_text(f"🔍 در حال جستجو: *{clean_query}*...", parse_mode='Markdown')
 
-    try:
-        results = await search_jackett(search_query, sort_by=ctx.user_data.get("sort", "newest"))
-    except Exception as e:
-        logger.error(f"Search error: {e}")
-        results = []
-    
-    # Filter by IMDB ID if available (check if any result has matching IMDB)
-    if imdb_id and results:
-        # Try to find results that might match this IMDB entry
-        # Since Jackett doesn't always return IMDB, we filter by title similarity
-        original_results = results
-        filtered = []
-        for r in results:
-            title_lower = r.get('Title', '').lower()
-            # Check if main keywords from query are in the title
-            query_words = set(clean_query.lower().replace('(', '').replace(')', '').split())
-            title_words = set(title_lower.split())
-            # Require at least 2 matching words or exact title match
-            matches = len(query_words & title_words)
-            if matches >= 2 or clean_query.lower() in title_lower:
-                filtered.append(r)
-        
-        if filtered:
-            results = filtered
-            logger.info(f"Filtered {len(original_results)} results to {len(filtered)} by IMDB/title match")
+    async def load_results():
+        try:
+            results = await search_jackett(search_query, sort_by="newest")
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            return []
+
+        # Filter by IMDB ID if available: Jackett rarely returns IMDB ids, so keep
+        # results whose parsed title is relevant to the IMDB title we searched for
+        if imdb_id and results:
+            filtered = relevance.filter_results(clean_query, results, RELEVANCE_THRESHOLD, RELEVANCE_WEIGHTS)
+            if filtered:
+                logger.info(f"Filtered {len(results)} results to {len(filtered)} by title relevance")
+                results = filtered
+        return results
 
-    if not results:
+    # Identical searches by other users share one result set (and one Jackett query)
+    fingerprint = f"{normalize_title(clean_query)}|{imdb_id or ''}"
+    rs = await result_sets.search(fingerprint, load_results)
+
+    if not rs:
         await msg.edit_text(
             f"❌ نتیجه‌ای برای *{clean_query}* پیدا نشد.\n\nممکن است:\n• ایندکسر آنلاین نباشد\n• نام را به انگلیسی تایپ کنید",
             parse_mode='Markdown',
@@ -964,15 +1387,17 @@ async def _do_search(update: Update, ctx: ContextTypes.DEFAULT_TYPE, query: str)
         )
         return
 
-    ctx.user_data.update({
-        "results":       results,
+    search_history.record(update.effective_user.id, clean_query, imdb_id)
+
+    sess = new_session(ctx, msg.message_id, rs)
+    sess.update({
         "search_title":  clean_query,
         "page":          0,
         "sort":          "newest",
         "filter_indexer": None,
         "nav_mode":      "auto",
     })
-    await show_results(update, ctx, msg)
+    await show_results(update, sess, msg)
 
 # ─── Inline Query ─────────────────────────────────────────────────────────────
 
@@ -981,14 +1406,30 @@ async def inline_query_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if not query or len(query) < 2:
         return
 
-    suggestions = await get_imdb_suggestions(query)
-    if not suggestions:
-        return
-
     articles = []
+    seen = set()
+
+    # Our own most-searched titles first; they never leave the process
+    for i, item in enumerate(search_history.complete(update.inline_query.from_user.id, query, limit=5)):
+        seen.add(normalize_title(item['title']))
+        search_text = f"/search {item['title']}"
+        if item['imdb_id']:
+            search_text += f" |imdb:{item['imdb_id']}"
+        articles.append(InlineQueryResultArticle(
+            id=f"h{i}",
+            title=f"🕘 {item['title']}",
+            description=f"{item['count']} جستجو — لمس کنید تا جستجو شود",
+            input_message_content=InputTextMessageContent(
+                message_text=search_text
+            )
+        ))
+
+    suggestions = await get_imdb_suggestions(query)
     for i, item in enumerate(suggestions):
         year_str = f" ({item['year']})" if item['year'] else ""
         type_emoji = "📺" if item['type'] in ('TV series', 'TV mini-series') else "🎬"
+        if normalize_title(item['title']) in seen or normalize_title(f"{item['title']}{year_str}") in seen:
+            continue
         imdb_id = item.get('id', '')
         # Store IMDB ID in the callback data for better search
         search_text = f"/search {item['title']}{year_str}"
@@ -1003,6 +1444,8 @@ async def inline_query_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 message_text=search_text
             )
         ))
+    if not articles:
+        return
     await update.inline_query.answer(articles, cache_time=300, is_personal=True)
 
 # ─── Callback Handler ─────────────────────────────────────────────────────────
@@ -1016,9 +1459,24 @@ async def callback_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await query.answer("⛔ دسترسی ندارید", show_alert=True)
         return
 
+    # Result buttons are "<session token>:<action>"; the rest are global
+    token, sep, action = data.partition(':')
+    sess = None
+    if sep:
+        sess = get_session(ctx, token)
+        data = action
+    is_global = data in ("back", "noop", "downloads", "status") or data.startswith(("dlt_", "del_", "dls_", "dsel_", "dbulk_"))
+    if not is_global and (sess is None or not result_sets.get(sess.get("rs"))):
+        await query.edit_message_text(
+            "⌛ این نتایج منقضی شده‌اند. لطفاً دوباره جستجو کنید.",
+            reply_markup=main_menu()
+        )
+        return
+
     # ── Navigation ──────────────────────────────────────────────
     if data == "back":
-        ctx.user_data.clear()
+        if sess:
+            drop_session(ctx, sess["token"])
         await query.edit_message_text(
             "🌙 *Night Leech Bot* 🦞\n\n🔍 برای جستجو: `/search نام فیلم`",
             parse_mode='Markdown', reply_markup=main_menu()
@@ -1028,51 +1486,51 @@ async def callback_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         pass  # pagination label button
 
     elif data == "back_seasons":
-        ctx.user_data["nav_mode"] = "tv"
-        ctx.user_data["page"] = 0
-        items = ctx.user_data.get("results", [])
-        title = ctx.user_data.get("search_title", "")
+        sess["nav_mode"] = "tv"
+        sess["page"] = 0
+        items = session_results(sess)
+        title = sess.get("search_title", "")
         tv_items = [x for x in items if x.get('is_tv')]
-        await show_season_list(update, ctx, query.message, tv_items, title)
+        await show_season_list(update, sess, query.message, tv_items, title)
 
     elif data == "back_quality":
-        ctx.user_data["nav_mode"] = "season"
-        ctx.user_data["page"] = 0
-        await show_quality_list(update, ctx, query.message)
+        sess["nav_mode"] = "season"
+        sess["page"] = 0
+        await show_quality_list(update, sess, query.message)
 
     elif data == "all_raw":
-        ctx.user_data["nav_mode"] = "movie"
-        ctx.user_data["page"] = 0
-        items = ctx.user_data.get("results", [])
-        title = ctx.user_data.get("search_title", "")
-        sort  = ctx.user_data.get("sort", "newest")
-        await show_movie_list(update, ctx, query.message, items, title, sort, None, 0)
+        sess["nav_mode"] = "movie"
+        sess["page"] = 0
+        items = session_results(sess)
+        title = sess.get("search_title", "")
+        sort  = sess.get("sort", "newest")
+        await show_movie_list(update, sess, query.message, items, title, sort, None, 0)
 
     # ── Season Select ────────────────────────────────────────────
     elif data.startswith("season_"):
         season = data[7:]
-        ctx.user_data["current_season"] = season
-        ctx.user_data["nav_mode"] = "season"
-        ctx.user_data["page"] = 0
-        await show_quality_list(update, ctx, query.message)
+        sess["current_season"] = season
+        sess["nav_mode"] = "season"
+        sess["page"] = 0
+        await show_quality_list(update, sess, query.message)
 
     # ── Quality Select ───────────────────────────────────────────
     elif data.startswith("quality_"):
         quality = data[8:]
-        ctx.user_data["current_quality"] = quality
-        ctx.user_data["nav_mode"] = "quality"
-        ctx.user_data["ep_page"] = 0
-        await show_episode_list(update, ctx, query.message)
+        sess["current_quality"] = quality
+        sess["nav_mode"] = "quality"
+        sess["ep_page"] = 0
+        await show_episode_list(update, sess, query.message)
 
     # ── Episode pagination ────────────────────────────────────────
     elif data.startswith("ep_"):
-        ctx.user_data["ep_page"] = int(data[3:])
-        await show_episode_list(update, ctx, query.message)
+        sess["ep_page"] = int(data[3:])
+        await show_episode_list(update, sess, query.message)
 
     # ── Download Episode ─────────────────────────────────────────
     elif data.startswith("dl_ep_"):
         idx = int(data[6:])
-        episodes = ctx.user_data.get("episode_list", [])
+        episodes = item_deref(sess, sess.get("episode_list", []))
         if idx < len(episodes):
             t = episodes[idx]
             magnet = t.get("Magnet", "")
@@ -1083,7 +1541,7 @@ async def callback_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     # ── Download Movie ────────────────────────────────────────────
     elif data.startswith("dl_movie_"):
         idx = int(data[9:])
-        flat = ctx.user_data.get("flat_list", [])
+        flat = item_deref(sess, sess.get("flat_list", []))
         if idx < len(flat):
             t = flat[idx]
             magnet = t.get("Magnet", "")
@@ -1091,47 +1549,95 @@ async def callback_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         else:
             await query.edit_message_text("❌ آیتم پیدا نشد.", reply_markup=main_menu())
 
+    # ── Batch select / download ──────────────────────────────────
+    elif data.startswith("sel_"):
+        ref = int(data[4:])
+        selected = sess.setdefault("selected", [])
+        if ref in selected:
+            selected.remove(ref)
+        else:
+            selected.append(ref)
+        await show_current_list(update, sess, query.message)
+
+    elif data == "relist":
+        await show_current_list(update, sess, query.message)
+
+    elif data == "plan":
+        await show_season_plan(update, sess, query.message)
+
+    elif data == "dl_plan":
+        await _add_torrents(query, sess, item_deref(sess, sess.get("plan", [])), sess.get("plan_eps"))
+
+    elif data == "dl_sel" or data.startswith("dl_page_"):
+        if data == "dl_sel":
+            refs = sess.get("selected", [])
+        else:
+            # Only the page the button was shown on
+            start, end = (int(x) for x in data[8:].split("_"))
+            refs = sess.get("episode_list" if sess.get("nav_mode") == "quality" else "flat_list", [])[start:end]
+        await _add_torrents(query, sess, item_deref(sess, refs))
+
     # ── Sort ──────────────────────────────────────────────────────
     elif data.startswith("sort_"):
         sort = data[5:]  # 'seeders' or 'newest'
-        ctx.user_data["sort"] = sort
-        ctx.user_data["page"] = 0
-        # Re-sort existing results
-        items = ctx.user_data.get("results", [])
+        sess["sort"] = sort
+        sess["page"] = 0
+        # Re-sort a copy; the shared results are read-only
+        items = list(session_results(sess))
         if sort == "seeders":
             items.sort(key=lambda x: int(x.get('Seeders', 0)), reverse=True)
         else:
             items.sort(key=lambda x: x.get('ParsedDate', datetime.min), reverse=True)
-        ctx.user_data["results"] = items
-        ctx.user_data["nav_mode"] = "movie"
-        title = ctx.user_data.get("search_title", "")
-        await show_movie_list(update, ctx, query.message, items, title, sort, ctx.user_data.get("filter_indexer"), 0)
+        sess["nav_mode"] = "movie"
+        title = sess.get("search_title", "")
+        await show_movie_list(update, sess, query.message, items, title, sort, sess.get("filter_indexer"), 0)
 
     # ── Indexer Filter ────────────────────────────────────────────
     elif data.startswith("idx_"):
         filter_idx = None if data == "idx_all" else data[4:]
-        ctx.user_data["filter_indexer"] = filter_idx
-        ctx.user_data["page"] = 0
-        title = ctx.user_data.get("search_title", "")
-        sort  = ctx.user_data.get("sort", "newest")
+        sess["filter_indexer"] = filter_idx
+        sess["page"] = 0
+        title = sess.get("search_title", "")
+        sort  = sess.get("sort", "newest")
         # Re-filter from all results
-        all_results = ctx.user_data.get("results", [])
+        all_results = session_results(sess)
         filtered = [x for x in all_results if x.get('Indexer') == filter_idx] if filter_idx else all_results
-        ctx.user_data["nav_mode"] = "movie"
-        await show_movie_list(update, ctx, query.message, filtered, title, sort, filter_idx, 0)
+        sess["nav_mode"] = "movie"
+        await show_movie_list(update, sess, query.message, filtered, title, sort, filter_idx, 0)
 
     # ── Pagination ────────────────────────────────────────────────
     elif data.startswith("p_"):
-        ctx.user_data["page"] = int(data[2:])
-        items = ctx.user_data.get("flat_list", ctx.user_data.get("results", []))
-        title = ctx.user_data.get("search_title", "")
-        sort  = ctx.user_data.get("sort", "newest")
-        filter_ = ctx.user_data.get("filter_indexer")
-        await show_movie_list(update, ctx, query.message, items, title, sort, filter_, ctx.user_data["page"])
+        sess["page"] = int(data[2:])
+        items = item_deref(sess, sess["flat_list"]) if "flat_list" in sess else session_results(sess)
+        title = sess.get("search_title", "")
+        sort  = sess.get("sort", "newest")
+        filter_ = sess.get("filter_indexer")
+        await show_movie_list(update, sess, query.message, items, title, sort, filter_, sess["page"])
 
     # ── Downloads List ────────────────────────────────────────────
     elif data == "downloads":
-        await show_downloads(query)
+        await show_downloads(query, downloads_view(ctx))
+
+    elif data.startswith("dls_"):
+        # dls_<filter>_<sort>_<page>
+        view = downloads_view(ctx)
+        view["filter"], rest = data[4:].split("_", 1)
+        view["sort"], page = rest.rsplit("_", 1)
+        view["page"] = int(page)
+        await show_downloads(query, view)
+
+    elif data.startswith("dsel_"):
+        view = downloads_view(ctx)
+        h = data[5:]
+        if h in view["selected"]:
+            view["selected"].remove(h)
+        else:
+            view["selected"].append(h)
+        await show_downloads(query, view)
+
+    elif data.startswith("dbulk_"):
+        view = downloads_view(ctx)
+        await bulk_action(query, view, data[6:])
 
     # ── Download Detail ───────────────────────────────────────────
     elif data.startswith("dlt_"):
@@ -1151,27 +1657,70 @@ async def callback_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     elif data == "status":
         await show_status(query)
 
+def result_size(t: dict) -> int:
+    try:
+        return int(t.get('Size', 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def quota_message(user_id: int) -> str:
+    u = fair_share.usage(user_id)
+    text = f"⛔ سهمیه شما پر است.\n\n⬇️ دانلود فعال: {u['active']}"
+    if USER_MAX_ACTIVE:
+        text += f" / {USER_MAX_ACTIVE}"
+    text += f"\n📦 باقی‌مانده: {fmt_size(u['inflight'])}"
+    if USER_MAX_INFLIGHT:
+        text += f" / {fmt_size(USER_MAX_INFLIGHT)}"
+    return text + "\n\nلطفاً صبر کنید تا دانلودهای قبلی تمام شوند."
+
+def disk_message(size: int) -> str:
+    return (f"💾 فضای دیسک کافی نیست.\n\n"
+            f"حجم لازم: {fmt_size(size)}\n"
+            f"فضای قابل استفاده: {fmt_size(max(0, disk_space.available()))}\n"
+            f"(فضای آزاد منهای دانلودهای نیمه‌تمام)")
+
+def is_addable_link(magnet: str) -> bool:
+    """True for a magnet link or a .torrent URL qBittorrent can fetch"""
+    is_magnet = magnet.startswith('magnet:')
+    is_torrent_url = magnet.startswith('http') and ('.torrent' in magnet or '/dl/' in magnet or 'jackett' in magnet)
+    return bool(magnet) and (is_magnet or is_torrent_url)
+
 async def _add_torrent(query, torrent_info: dict, magnet: str):
     """Add a torrent magnet or .torrent URL to qBittorrent"""
     title   = torrent_info.get('Title', '?')
     size    = fmt_size(torrent_info.get('Size', '0'))
     seeders = torrent_info.get('Seeders', '0')
 
-    # Check if it's a magnet link or a .torrent URL
-    is_magnet = magnet.startswith('magnet:')
-    is_torrent_url = magnet.startswith('http') and ('.torrent' in magnet or '/dl/' in magnet or 'jackett' in magnet)
-    
-    if not magnet or (not is_magnet and not is_torrent_url):
+    if not is_addable_link(magnet):
         await query.edit_message_text(
             f"❌ مگنت لینک پیدا نشد!\n\n`{title[:60]}`\n\nاین نتیجه لینک مگنت معتبر ندارد.",
             parse_mode='Markdown', reply_markup=main_menu()
         )
         return
 
-    success = await qbit_add_magnet(magnet)
+    hash_ = magnet_hash(magnet)
+    if hash_ and hash_ in torrent_index:
+        await query.edit_message_text(
+            f"ℹ️ *این تورنت قبلاً اضافه شده است.*\n\n🎬 `{title[:60]}`",
+            parse_mode='Markdown', reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("📊 مشاهده وضعیت", callback_data=f"dlt_{hash_}")],
+                [InlineKeyboardButton("◀️ برگشت", callback_data="back")],
+            ])
+        )
+        return
+
+    user_id = query.from_user.id
+    if not fair_share.admit(user_id, [result_size(torrent_info)]):
+        await query.edit_message_text(quota_message(user_id), reply_markup=main_menu())
+        return
+    if not disk_space.fits(result_size(torrent_info)):
+        await query.edit_message_text(disk_message(result_size(torrent_info)), reply_markup=main_menu())
+        return
+
+    success = await add_results([torrent_info], chat_id=query.message.chat_id, user_id=user_id)
     if success:
         await query.edit_message_text(
-            f"✅ *اضافه شد!*\n\n🎬 `{title[:60]}`\n📦 {size} | 👤 {seeders} seeders",
+            f"✅ *اضافه شد!*\n\n🎬 `{title[:60]}`\n📦 {size} | 👤 {seeders} seeders\n\n🔔 پایان دانلود را خبر می‌دهم.",
             parse_mode='Markdown', reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("📥 مشاهده دانلودها", callback_data="downloads")],
                 [InlineKeyboardButton("◀️ برگشت", callback_data="back")],
@@ -1183,15 +1732,107 @@ async def _add_torrent(query, torrent_info: dict, magnet: str):
             reply_markup=main_menu()
         )
 
-async def show_downloads(msg):
-    """Show active downloads list"""
-    torrents = await qbit_get_torrents()
-    if not torrents:
-        await msg.edit_message_text("📥 دانلودی وجود ندارد.", reply_markup=main_menu())
+async def _add_torrents(query, sess: dict, items: list, wanted: list = None):
+    """Add several results in one qBittorrent call and report once"""
+    wanted = wanted or [None] * len(items)
+    pairs, seen, duplicates = [], set(), 0
+    for t, w in zip(items, wanted):
+        if not is_addable_link(t.get('Magnet', '')):
+            continue
+        hash_ = magnet_hash(t['Magnet'])
+        if hash_ and (hash_ in torrent_index or hash_ in seen):
+            duplicates += 1
+            continue
+        seen.add(hash_)
+        pairs.append((t, w))
+    user_id = query.from_user.id
+    admitted = fair_share.admit(user_id, [result_size(t) for t, _ in pairs])
+    over_quota = len(pairs) - admitted
+    if pairs and not admitted:
+        await query.edit_message_text(quota_message(user_id), reply_markup=main_menu())
+        return
+    pairs = pairs[:admitted]
+    fitting, needed = [], 0
+    for t, w in pairs:
+        if disk_space.fits(needed + result_size(t)):
+            needed += result_size(t)
+            fitting.append((t, w))
+    no_space = len(pairs) - len(fitting)
+    if pairs and not fitting:
+        await query.edit_message_text(disk_message(min(result_size(t) for t, _ in pairs)), reply_markup=main_menu())
+        return
+    pairs = fitting
+    valid = [t for t, _ in pairs]
+    skipped = len(items) - len(valid) - duplicates - over_quota - no_space
+    if not valid and duplicates:
+        await query.edit_message_text(
+            "ℹ️ همه موارد انتخاب‌شده قبلاً اضافه شده‌اند.", reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("📥 مشاهده دانلودها", callback_data="downloads")],
+                [InlineKeyboardButton("◀️ برگشت به نتایج", callback_data=cb(sess, "relist"))],
+            ])
+        )
+        return
+    if not valid:
+        await query.edit_message_text("❌ هیچ لینک مگنت معتبری در موارد انتخاب‌شده نیست.", reply_markup=main_menu())
+        return
+
+    if not await add_results(valid, [w for _, w in pairs], query.message.chat_id, user_id):
+        await query.edit_message_text(
+            "❌ خطا در اضافه کردن تورنت‌ها.\nممکن است qBittorrent آنلاین نباشد.",
+            reply_markup=main_menu()
+        )
         return
 
-    kb = []
-    for t in torrents[:15]:
+    sess["selected"] = []
+    total = sum(int(t.get('Size', 0) or 0) for t in valid)
+    text = f"✅ *{len(valid)} تورنت اضافه شد!*\n📦 مجموع {fmt_size(total)}\n🔔 پایان هر دانلود را خبر می‌دهم.\n\n"
+    text += "\n".join(f"• `{t.get('Title', '?')[:50]}`" for t in valid[:15])
+    if len(valid) > 15:
+        text += f"\n… و {len(valid) - 15} مورد دیگر"
+    if skipped:
+        text += f"\n\n⚠️ {skipped} مورد بدون لینک معتبر رد شد."
+    if duplicates:
+        text += f"\nℹ️ {duplicates} مورد قبلاً اضافه شده بود."
+    if over_quota:
+        text += f"\n⛔ {over_quota} مورد به دلیل پر بودن سهمیه شما اضافه نشد."
+    if no_space:
+        text += f"\n💾 {no_space} مورد به دلیل کمبود فضای دیسک اضافه نشد."
+    await query.edit_message_text(
+        text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📥 مشاهده دانلودها", callback_data="downloads")],
+            [InlineKeyboardButton("◀️ برگشت به نتایج", callback_data=cb(sess, "relist"))],
+        ])
+    )
+
+DOWNLOADS_PER_PAGE = 10
+DOWNLOAD_FILTERS = [("all", "همه"), ("downloading", "⬇️"), ("completed", "✅"), ("paused", "⏸️"), ("stalled", "💤")]
+DOWNLOAD_SORTS   = [("added_on", "🕒 جدید"), ("progress", "📊 پیشرفت"), ("dlspeed", "⚡ سرعت"), ("size", "📦 حجم")]
+
+def downloads_view(ctx) -> dict:
+    """Per-user filter/sort/page/selection of the downloads list"""
+    return ctx.user_data.setdefault("downloads_view", {"filter": "all", "sort": "added_on", "page": 0, "selected": []})
+
+async def show_downloads(msg, view: dict):
+    """Show one page of downloads, filtered and sorted by qBittorrent"""
+    filter_, sort, page = view["filter"], view["sort"], view["page"]
+    qb_filter = "stopped" if filter_ == "paused" and await qbit_is_v5() else filter_
+    # One extra row tells whether a next page exists
+    torrents = await qbit_get_torrents(
+        filter=qb_filter, sort=sort, reverse="true" if sort != "name" else "false",
+        limit=DOWNLOADS_PER_PAGE + 1, offset=page * DOWNLOADS_PER_PAGE
+    )
+    has_next = len(torrents) > DOWNLOADS_PER_PAGE
+    torrents = torrents[:DOWNLOADS_PER_PAGE]
+    selected = view["selected"]
+
+    def dls(f=filter_, s=sort, p=page):
+        return f"dls_{f}_{s}_{p}"
+
+    kb = [[InlineKeyboardButton(("• " if f == filter_ else "") + label, callback_data=dls(f=f, p=0))
+           for f, label in DOWNLOAD_FILTERS]]
+    kb.append([InlineKeyboardButton(("• " if s == sort else "") + label, callback_data=dls(s=s, p=0))
+               for s, label in DOWNLOAD_SORTS])
+    for t in torrents:
         name     = t.get('name', '?')[:28]
         progress = t.get('progress', 0) * 100
         bar      = "█" * int(progress / 10) + "░" * (10 - int(progress / 10))
@@ -1200,29 +1841,87 @@ async def show_downloads(msg):
             emoji = "⬇️"
         elif state == 'uploading':
             emoji = "⬆️"
-        elif state == 'pausedDL':
+        elif state in ('pausedDL', 'stoppedDL'):
             emoji = "⏸️"
         else:
             emoji = "✅"
-        kb.append([InlineKeyboardButton(
-            f"{emoji} {name} {progress:.0f}%",
-            callback_data=f"dlt_{t.get('hash','')}"
-        )])
+        h = t.get('hash', '')
+        kb.append([
+            InlineKeyboardButton("☑️" if h in selected else "⬜", callback_data=f"dsel_{h}"),
+            InlineKeyboardButton(f"{emoji} {name} {progress:.0f}%", callback_data=f"dlt_{h}"),
+        ])
 
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀️", callback_data=dls(p=page - 1)))
+    if page > 0 or has_next:
+        nav.append(InlineKeyboardButton(f"{page + 1}", callback_data="noop"))
+    if has_next:
+        nav.append(InlineKeyboardButton("▶️", callback_data=dls(p=page + 1)))
+    if nav:
+        kb.append(nav)
+    if selected:
+        n = len(selected)
+        kb.append([
+            InlineKeyboardButton(f"⏸️ توقف ({n})", callback_data="dbulk_pause"),
+            InlineKeyboardButton(f"▶️ ادامه ({n})", callback_data="dbulk_resume"),
+            InlineKeyboardButton(f"🗑️ حذف ({n})", callback_data="dbulk_delete"),
+        ])
     kb.extend([
-        [InlineKeyboardButton("🔄 رفرش", callback_data="downloads")],
+        [InlineKeyboardButton("🔄 رفرش", callback_data=dls())],
         [InlineKeyboardButton("◀️ برگشت", callback_data="back")]
     ])
-    await msg.edit_message_text(
-        f"📥 *دانلودها* ({len(torrents)}):",
-        parse_mode='Markdown',
-        reply_markup=InlineKeyboardMarkup(kb)
-    )
+    text = "📥 *دانلودها*" if torrents else "📥 دانلودی در این فهرست وجود ندارد."
+    await msg.edit_message_text(text, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(kb))
+
+async def bulk_action(query, view: dict, action: str):
+    """Pause/resume/delete every selected torrent in one API call"""
+    hashes = "|".join(view["selected"])
+    if not hashes:
+        await show_downloads(query, view)
+        return
+    if action == "delete":
+        await query.edit_message_text(
+            f"🗑️ {len(view['selected'])} تورنت همراه با فایل‌ها حذف شود؟",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("✅ بله، حذف", callback_data="dbulk_delete_yes"),
+                InlineKeyboardButton("❌ انصراف", callback_data="downloads"),
+            ]])
+        )
+        return
+    if action == "pause":
+        ok = await qbit_stop(hashes)
+    elif action == "resume":
+        ok = await qbit_start(hashes)
+    elif action == "delete_yes":
+        ok = await qbit_delete(hashes)
+    else:
+        # Stale or unknown button: never fall through to a destructive action
+        await show_downloads(query, view)
+        return
+    if not ok:
+        await query.edit_message_text("❌ خطا در اجرای دستور.\nممکن است qBittorrent آنلاین نباشد.", reply_markup=main_menu())
+        return
+    view["selected"] = []
+    await show_downloads(query, view)
+
+async def torrent_file_link(hash_: str, name: str) -> str:
+    """File-server URL of a finished torrent's main (largest video) file"""
+    files = await qbit_get_files(hash_)
+    if not files:
+        return ""
+    video_exts = {'.mkv', '.mp4', '.avi', '.mov', '.wmv'}
+    video_files = [f for f in files if any(f.get('name','').lower().endswith(ext) for ext in video_exts)]
+    target_file = max(video_files, key=lambda f: f.get('size', 0)) if video_files else files[0]
+    return f"{FILE_SERVER_URL}/{target_file.get('name', name)}"
 
 async def show_torrent_detail(msg, hash_: str):
     """Show details for a specific torrent"""
-    torrents = await qbit_get_torrents()
-    t = next((x for x in torrents if x.get('hash') == hash_), None)
+    if time.time() - torrent_index.synced_at < 10:
+        t = torrent_index.get(hash_)
+    else:
+        torrents = await qbit_get_torrents()
+        t = next((x for x in torrents if x.get('hash') == hash_), None)
     if not t:
         await msg.edit_message_text("❌ تورنت پیدا نشد.", reply_markup=main_menu())
         return
@@ -1246,14 +1945,9 @@ async def show_torrent_detail(msg, hash_: str):
 
     # FIX: Only show download link when fully complete (100%)
     if progress >= 99.9:
-        files = await qbit_get_files(hash_)
-        if files:
-            # Get the largest file (usually the video)
-            video_exts = {'.mkv', '.mp4', '.avi', '.mov', '.wmv'}
-            video_files = [f for f in files if any(f.get('name','').lower().endswith(ext) for ext in video_exts)]
-            target_file = max(video_files, key=lambda f: f.get('size', 0)) if video_files else files[0]
-            fn = target_file.get('name', name)
-            info += f"\n\n🔗 [دانلود فایل]({FILE_SERVER_URL}/{fn})"
+        link = await torrent_file_link(hash_, name)
+        if link:
+            info += f"\n\n🔗 [دانلود فایل]({link})"
 
     kb = [
         [InlineKeyboardButton("🗑️ حذف", callback_data=f"del_{hash_}")],
@@ -1272,7 +1966,8 @@ async def show_status(msg):
 
     all_indexers = await get_indexers()
     indexer_names = ', '.join(x[0] for x in all_indexers) if all_indexers else "در حال بارگذاری..."
-    
+    mine = fair_share.usage(msg.from_user.id)
+
     text = (
         f"⚙️ *وضعیت ربات*\n\n"
         f"✅ ربات: آنلاین\n"
@@ -1281,6 +1976,7 @@ async def show_status(msg):
         f"⬆️ سیدینگ: {seeding}\n"
         f"💾 حجم کل: {fmt_size(total_size)}\n"
         f"📦 دانلود شده: {fmt_size(dl_total)}\n\n"
+        f"👤 شما: {mine['active']} فعال | {fmt_size(mine['inflight'])} باقی‌مانده | {fmt_size(mine['stored'])} ذخیره\n\n"
         f"🔍 ایندکسرها: {indexer_names}"
     )
     await msg.edit_message_text(text, parse_mode='Markdown', reply_markup=main_menu())
@@ -1301,6 +1997,70 @@ async def message_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             reply_markup=main_menu()
         )
 
+# ─── Notifications ───────────────────────────────────────────────────────────
+
+_bot = None   # set in post_init
+
+async def push_torrent_update(chat_id: int, hash_: str, t: dict, milestone):
+    """Tell the user who added a torrent that it finished (or passed a milestone)"""
+    name = t.get('name', '?')
+    if milestone is None:
+        text = f"✅ *دانلود تمام شد!*\n\n🎬 `{name[:60]}`"
+        link = await torrent_file_link(hash_, name)
+        if link:
+            text += f"\n\n🔗 [دانلود فایل]({link})"
+    else:
+        text = f"⏳ `{name[:60]}`\n📊 {milestone}%"
+    await _bot.send_message(
+        chat_id, text, parse_mode='Markdown',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📊 جزئیات", callback_data=f"dlt_{hash_}")]])
+    )
+
+notifier = CompletionNotifier(NOTIFY_DB_PATH, push_torrent_update, NOTIFY_MILESTONE, NOTIFY_THROTTLE)
+torrent_index.on_change(lambda changed, removed: notifier.on_change(changed, removed, torrent_index.torrents))
+
+# ─── Session Persistence ──────────────────────────────────────────────────────
+
+session_store = SessionStore(SESSIONS_DB_PATH, result_sets)
+
+async def restore_session(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    """Runs before all handlers: lazily reload this user's state after a restart"""
+    user = update.effective_user
+    if user is not None:
+        await session_store.restore(user.id, ctx.user_data)
+
+async def remember_session(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    """Runs after all handlers: queue this user's state for the next batched write"""
+    user = update.effective_user
+    if user is not None:
+        session_store.mark_dirty(user.id, ctx.user_data)
+
+_background = []   # loops started in post_init, cancelled in post_shutdown
+
+async def post_init(app):
+    global _bot
+    _bot = app.bot
+    _background.append(app.create_task(session_store.run()))
+    _background.append(app.create_task(search_history.run()))
+    _background.append(app.create_task(torrent_index.run()))
+    if SCHED_MAX_ACTIVE:
+        _background.append(app.create_task(scheduler.run()))
+    else:
+        # Settings left overridden by an earlier run that did not shut down cleanly
+        _background.append(app.create_task(scheduler.restore()))
+    if DL_CAPACITY:
+        _background.append(app.create_task(fair_share.run()))
+
+async def post_shutdown(app):
+    for task in _background:
+        task.cancel()
+    await asyncio.gather(*_background, return_exceptions=True)
+    _background.clear()
+    await scheduler.restore()
+    await session_store.flush()
+    await search_history.flush()
+    await close_http()
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
@@ -1308,16 +2068,21 @@ def main():
         logger.error("BOT_TOKEN is not set! Edit config.env")
         return
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
+    app.add_handler(TypeHandler(Update, restore_session), group=-1)
     app.add_handler(CommandHandler("start",  start_command))
     app.add_handler(CommandHandler("search", search_command))
     app.add_handler(CommandHandler("imdb",   imdb_command))
     app.add_handler(CallbackQueryHandler(callback_handler))
     app.add_handler(InlineQueryHandler(inline_query_handler))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
+    app.add_handler(TypeHandler(Update, remember_session), group=1)
 
     logger.info("🌙 Night Leech Bot started!")
-    app.run_polling(drop_pending_updates=True)
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(app, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET))
+    else:
+        app.run_polling(drop_pending_updates=True)
 
 if __name__ == "__main__":
     main()
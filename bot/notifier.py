@@ -0,0 +1,118 @@
+"""
+Night Leech - Completion notifications.
+
+Remembers which chat added each torrent and listens to the torrent index
+(see qb_sync.py) for progress changes. When a watched torrent reaches 100%
+the chat gets one push message and the torrent is forgotten; optionally a
+throttled message is also sent at every `milestone` percent.
+
+Owners are kept in a small SQLite table so pending notifications survive a
+restart; torrents that finished while the bot was down are reported on the
+first sync. A removal only drops an owner once the torrent has been seen in
+a delta (or after OWNER_GRACE seconds), so a torrent that qBittorrent has
+not listed yet keeps its owner.
+"""
+
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+OWNER_GRACE = 600    # seconds a never-seen torrent keeps its owner through removals
+
+class CompletionNotifier:
+    """hash -> chat registry driven by TorrentIndex deltas"""
+
+    def __init__(self, path, notify, milestone: int = 0, throttle: float = 300):
+        self.path = Path(path)
+        self.notify = notify          # async (chat_id, hash, torrent, milestone or None)
+        self.milestone = milestone    # percent step for progress pushes, 0 = off
+        self.throttle = throttle      # min seconds between progress pushes per torrent
+        self._db = None
+        self._owners = None           # hash -> [chat_id, last milestone, last push time, watched at, seen]
+
+    def _conn(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS owners (
+                    hash    TEXT PRIMARY KEY,
+                    chat_id INTEGER NOT NULL,
+                    added   REAL NOT NULL
+                )
+            """)
+        return self._db
+
+    def _load(self):
+        if self._owners is not None:
+            return
+        self._owners = {}
+        try:
+            for hash_, chat_id, added in self._conn().execute("SELECT hash, chat_id, added FROM owners"):
+                self._owners[hash_] = [chat_id, 0, 0.0, added, False]
+        except Exception as e:
+            logger.error(f"Failed to load notification owners: {e}")
+
+    def watch(self, hash_: str, chat_id: int):
+        """Notify `chat_id` when this torrent completes"""
+        self._load()
+        now = time.time()
+        self._owners[hash_] = [chat_id, 0, 0.0, now, False]
+        try:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO owners VALUES (?, ?, ?)", (hash_, chat_id, now))
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to save notification owner: {e}")
+
+    def owner(self, hash_: str):
+        self._load()
+        entry = self._owners.get(hash_)
+        return entry[0] if entry else None
+
+    def forget(self, hashes):
+        self._load()
+        hashes = [h for h in hashes if self._owners.pop(h, None)]
+        if not hashes:
+            return
+        try:
+            db = self._conn()
+            db.executemany("DELETE FROM owners WHERE hash = ?", [(h,) for h in hashes])
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to drop notification owners: {e}")
+
+    async def on_change(self, changed: dict, removed: list, torrents: dict):
+        """TorrentIndex listener: push completions and milestones for watched torrents"""
+        self._load()
+        done = []
+        now = time.time()
+        for hash_, fields in changed.items():
+            entry = self._owners.get(hash_)
+            if entry is None:
+                continue
+            entry[4] = True
+            if 'progress' not in fields:
+                continue
+            torrent = torrents.get(hash_, fields)
+            progress = fields['progress'] * 100
+            if progress >= 100:
+                done.append(hash_)
+                await self._send(entry[0], hash_, torrent, None)
+            elif self.milestone:
+                step = int(progress // self.milestone) * self.milestone
+                if step > entry[1] and now - entry[2] >= self.throttle:
+                    entry[1], entry[2] = step, now
+                    await self._send(entry[0], hash_, torrent, step)
+        gone = [h for h in removed
+                if h in self._owners and (self._owners[h][4] or now - self._owners[h][3] > OWNER_GRACE)]
+        self.forget(done + gone)
+
+    async def _send(self, chat_id, hash_, torrent, milestone):
+        try:
+            await self.notify(chat_id, hash_, torrent, milestone)
+        except Exception as e:
+            logger.error(f"Notification to {chat_id} failed: {e}")
@@ -0,0 +1,109 @@
+"""
+Night Leech - qBittorrent torrent index.
+
+Mirrors qBittorrent's torrent list in memory using the incremental
+/api/v2/sync/maindata endpoint: each poll sends the last response id (rid)
+and only gets back torrents whose fields changed, plus removed hashes. The
+bot answers "is this already added?" and similar questions from this map
+instead of fetching the full list every time.
+
+Listeners registered with `on_change` get the per-poll delta, so other
+features can react to state changes without polling on their own. Only
+torrents qBittorrent has listed before are ever reported removed: the
+placeholder for a torrent the bot just added survives a full update that
+does not list it yet, and is dropped (and reported) only if qBittorrent
+still has not listed it after PLACEHOLDER_TTL seconds.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_TTL = 600
+
+class TorrentIndex:
+    """hash -> torrent fields, kept current from sync/maindata deltas"""
+
+    def __init__(self, fetch, interval: float = 2.0):
+        self.fetch = fetch            # async (rid) -> maindata dict or None
+        self.interval = interval
+        self.torrents = {}
+        self.server_state = {}
+        self.rid = 0
+        self.synced_at = 0.0
+        self._listeners = []
+        self._placeholders = {}       # hash -> time added, until qBittorrent lists it
+
+    def __contains__(self, hash_: str) -> bool:
+        return hash_ in self.torrents
+
+    def __len__(self):
+        return len(self.torrents)
+
+    def get(self, hash_: str):
+        return self.torrents.get(hash_)
+
+    def on_change(self, listener):
+        """Call `listener(changed, removed)` after every poll that changed something"""
+        self._listeners.append(listener)
+
+    def note_added(self, hash_: str):
+        """Placeholder entry for a torrent we just added, until a poll fills it in"""
+        if hash_ not in self.torrents:
+            self.torrents[hash_] = {'hash': hash_}
+            self._placeholders[hash_] = time.time()
+
+    def apply(self, data: dict):
+        """Merge one maindata response; returns (changed, removed)"""
+        changed, listed = {}, data.get('torrents', {})
+        now = time.time()
+        expired = [h for h, added in self._placeholders.items() if h not in listed and now - added > PLACEHOLDER_TTL]
+        for h in expired:
+            del self._placeholders[h]
+        if data.get('full_update'):
+            removed = [h for h in self.torrents if h not in listed and h not in self._placeholders]
+            self.torrents = {h: self.torrents[h] for h in self._placeholders if h not in listed}
+            self.server_state = {}
+        else:
+            removed = [h for h in dict.fromkeys(data.get('torrents_removed', []) + expired) if h in self.torrents]
+            for h in removed:
+                del self.torrents[h]
+                self._placeholders.pop(h, None)
+        for h, fields in listed.items():
+            self._placeholders.pop(h, None)
+            entry = self.torrents.setdefault(h, {'hash': h})
+            entry.update(fields)
+            changed[h] = fields
+        self.server_state.update(data.get('server_state', {}))
+        self.rid = data.get('rid', self.rid)
+        self.synced_at = now
+        return changed, removed
+
+    async def refresh(self) -> bool:
+        data = await self.fetch(self.rid)
+        if not isinstance(data, dict):
+            # Start over with a full update next time
+            self.rid = 0
+            return False
+        changed, removed = self.apply(data)
+        if changed or removed:
+            for listener in self._listeners:
+                try:
+                    result = listener(changed, removed)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"Torrent index listener failed: {e}")
+        return True
+
+    async def run(self):
+        """Background sync loop"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Torrent sync failed: {e}")
+                self.rid = 0
+            await asyncio.sleep(self.interval)
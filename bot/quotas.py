@@ -0,0 +1,174 @@
+"""
+Night Leech - Per-user accounting and fair share.
+
+Every torrent the bot adds carries a `user:<telegram id>` tag. From the
+TorrentIndex deltas (qb_sync.py) this module keeps, per user, the number of
+active torrents, bytes still to download and bytes stored, updating only the
+torrents that changed.
+
+On top of that:
+  - admission: `admit()` tells how many more torrents a user may add
+    without going over the active-torrent or bytes-in-flight limits;
+  - fair share (only when the link capacity is configured): while the link
+    is saturated and at least two users are downloading, bandwidth is split
+    between users by weight, then each user's share between their torrents,
+    both max-min (whoever needs less than an even split gives the rest
+    back), and applied as per-torrent download limits. Otherwise all limits
+    are lifted.
+
+Torrents without a user tag are accounted to user 0.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+USER_TAG_PREFIX = 'user:'
+SATURATION      = 0.9     # fraction of capacity that counts as a saturated link
+LIMIT_SLACK     = 0.1     # don't re-send limits that moved less than this
+
+def parse_weights(raw: str) -> dict:
+    """Parse '123=2,456=0.5' into {user_id: weight}"""
+    weights = {}
+    for part in (raw or '').split(','):
+        uid, _, w = part.partition('=')
+        try:
+            weights[int(uid)] = float(w)
+        except ValueError:
+            continue
+    return weights
+
+def max_min(demand: dict, capacity: float, weights: dict = None) -> dict:
+    """Weighted max-min split of `capacity` over `demand` (key -> bytes/s)"""
+    weights = weights or {}
+    shares, left, keys = {}, capacity, set(demand)
+    while keys and left > 0:
+        total_w = sum(weights.get(k, 1.0) for k in keys)
+        fair = {k: left * weights.get(k, 1.0) / total_w for k in keys}
+        satisfied = {k for k in keys if demand[k] <= fair[k]}
+        if not satisfied:
+            shares.update(fair)
+            return shares
+        for k in satisfied:
+            shares[k] = demand[k]
+            left -= demand[k]
+        keys -= satisfied
+    for k in keys:
+        shares[k] = 0
+    return shares
+
+def torrent_user(t: dict) -> int:
+    for tag in (t.get('tags') or '').split(','):
+        tag = tag.strip()
+        if tag.startswith(USER_TAG_PREFIX) and tag[len(USER_TAG_PREFIX):].isdigit():
+            return int(tag[len(USER_TAG_PREFIX):])
+    return 0
+
+def is_active(t: dict) -> bool:
+    return t.get('progress', 0) < 1 and not str(t.get('state', '')).startswith(('paused', 'stopped'))
+
+class FairShare:
+    """Incremental per-user usage plus weighted bandwidth sharing"""
+
+    def __init__(self, index, set_limit, max_active: int = 0, max_inflight: int = 0,
+                 weights: dict = None, capacity: int = 0):
+        self.index = index
+        self.set_limit = set_limit        # async (hashes list, bytes/s or 0 for unlimited)
+        self.max_active = max_active      # per-user active torrents, 0 = unlimited
+        self.max_inflight = max_inflight  # per-user bytes left to download, 0 = unlimited
+        self.weights = weights or {}
+        self.capacity = capacity          # link bytes/s; 0 = fair share off
+        self._contrib = {}                # hash -> (user, active, inflight, stored)
+        self._usage = {}                  # user -> [active, inflight, stored]
+        self._limits = {}                 # hash -> limit last sent
+
+    # ── Accounting ───────────────────────────────────────────────
+
+    def _account(self, hash_: str, t):
+        old = self._contrib.pop(hash_, None)
+        if old:
+            usage = self._usage[old[0]]
+            for i in range(3):
+                usage[i] -= old[i + 1]
+        if t is None:
+            self._limits.pop(hash_, None)
+            return
+        active = is_active(t)
+        new = (torrent_user(t), int(active), t.get('amount_left', 0) if active else 0, t.get('completed', 0))
+        self._contrib[hash_] = new
+        usage = self._usage.setdefault(new[0], [0, 0, 0])
+        for i in range(3):
+            usage[i] += new[i + 1]
+
+    def on_change(self, changed: dict, removed: list):
+        """TorrentIndex listener"""
+        for h in changed:
+            self._account(h, self.index.get(h))
+        for h in removed:
+            self._account(h, None)
+
+    def usage(self, user_id: int) -> dict:
+        active, inflight, stored = self._usage.get(user_id, (0, 0, 0))
+        return {'active': active, 'inflight': inflight, 'stored': stored}
+
+    def admit(self, user_id: int, sizes: list) -> int:
+        """How many of the torrents (in order, by size) the user may add now"""
+        active, inflight, _ = self._usage.get(user_id, (0, 0, 0))
+        admitted = 0
+        for size in sizes:
+            if self.max_active and active + 1 > self.max_active:
+                break
+            if self.max_inflight and inflight + size > self.max_inflight:
+                break
+            active += 1
+            inflight += size
+            admitted += 1
+        return admitted
+
+    # ── Bandwidth ────────────────────────────────────────────────
+
+    def shares(self, demand: dict, capacity: float) -> dict:
+        """Weighted max-min split of `capacity` over users' current demand (bytes/s)"""
+        return max_min(demand, capacity, self.weights)
+
+    async def tick(self):
+        """Recompute per-torrent download limits"""
+        speed = self.index.server_state.get('dl_info_speed', 0)
+        active = [t for t in self.index.torrents.values() if is_active(t)]
+        by_user = {}
+        for t in active:
+            by_user.setdefault(torrent_user(t), []).append(t)
+        competing = sum(1 for ts in by_user.values() if any(t.get('dlspeed', 0) for t in ts))
+
+        targets = {}
+        if self.capacity and competing >= 2 and speed >= SATURATION * self.capacity:
+            # A torrent's demand is what it pulls now, with headroom to grow
+            wants = {t['hash']: t.get('dlspeed', 0) * 1.2 + 1 for t in active}
+            demand = {u: sum(wants[t['hash']] for t in ts) for u, ts in by_user.items()}
+            for u, share in self.shares(demand, self.capacity).items():
+                split = max_min({t['hash']: wants[t['hash']] for t in by_user[u]}, share)
+                for h, limit in split.items():
+                    targets[h] = max(1024, int(limit))
+        else:
+            targets = {t['hash']: 0 for t in active if self._limits.get(t['hash'])}
+
+        groups = {}
+        for h, limit in targets.items():
+            old = self._limits.get(h, 0)
+            if limit == old or (limit and old and abs(limit - old) < LIMIT_SLACK * old):
+                continue
+            groups.setdefault(limit, []).append(h)
+        for limit, hashes in groups.items():
+            await self.set_limit(hashes, limit)
+            for h in hashes:
+                self._limits[h] = limit
+
+    async def run(self, interval: float = 30):
+        """Background fair-share loop"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Fair share tick failed: {e}")
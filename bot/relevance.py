@@ -0,0 +1,85 @@
+"""
+Night Leech - Result relevance scoring.
+
+Scores search results against the query by comparing the query with each
+result's parsed clean title: token overlap (Dice) plus character trigram
+similarity, with a small bonus when the release year matches. The query is
+normalized once and every result is scored in one pass.
+
+tests/test_relevance.py measures precision/recall on a labelled corpus.
+"""
+
+import re
+import unicodedata
+
+DEFAULT_WEIGHTS   = {'token': 0.6, 'ngram': 0.4, 'year': 0.1}
+DEFAULT_THRESHOLD = 0.65
+
+_year_re      = re.compile(r'\b(19\d{2}|20\d{2})\b')
+_separator_re = re.compile(r'[\s._\-+]+')
+_punct_re     = re.compile(r"[^\w\s]|_")
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents, turn dots/underscores/dashes into spaces and drop punctuation"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = text.replace('&', ' and ').replace("'", '')
+    text = _punct_re.sub(' ', _separator_re.sub(' ', text))
+    return ' '.join(text.split())
+
+def split_year(text: str):
+    """Return (text without year, year or None)"""
+    # Last year-like token that is not the whole title ("1917", "2012" stay tokens)
+    m = next((m for m in reversed(list(_year_re.finditer(text))) if text[:m.start()].strip()), None)
+    if not m:
+        return text, None
+    return (text[:m.start()] + text[m.end():]).strip(), m.group(1)
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class QueryProfile:
+    """Query normalized once; reused for scoring every result"""
+
+    def __init__(self, query: str):
+        text, self.year = split_year(normalize(query))
+        self.text    = text
+        self.tokens  = set(text.split())
+        self.grams   = trigrams(text)
+
+def score_title(profile: QueryProfile, title: str, weights: dict = None) -> float:
+    """Similarity in [0, ~1.1] between the query and one clean title"""
+    w = weights or DEFAULT_WEIGHTS
+    norm, year = split_year(normalize(title))
+    tokens = set(norm.split())
+    if not tokens or not profile.tokens:
+        return 0.0
+    token_sim = 2 * len(profile.tokens & tokens) / (len(profile.tokens) + len(tokens))
+    grams = trigrams(norm)
+    ngram_sim = 2 * len(profile.grams & grams) / (len(profile.grams) + len(grams))
+    score = w.get('token', 0) * token_sim + w.get('ngram', 0) * ngram_sim
+    if profile.year and year == profile.year:
+        score += w.get('year', 0)
+    return score
+
+def score_results(query: str, results: list, weights: dict = None) -> list:
+    """Score every result's clean title against the query; returns scores in result order"""
+    profile = QueryProfile(query)
+    return [score_title(profile, r.get('clean_title') or r.get('Title', ''), weights) for r in results]
+
+def filter_results(query: str, results: list, threshold: float = DEFAULT_THRESHOLD, weights: dict = None) -> list:
+    """Results scoring at least `threshold`, in their original order"""
+    scores = score_results(query, results, weights)
+    return [r for r, s in zip(results, scores) if s >= threshold]
+
+def parse_weights(raw: str) -> dict:
+    """Parse 'token=0.6,ngram=0.4,year=0.1' into a weights dict"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (raw or '').split(','):
+        key, _, val = part.partition('=')
+        try:
+            weights[key.strip()] = float(val)
+        except ValueError:
+            continue
+    return weights
@@ -0,0 +1,106 @@
+"""
+Night Leech - Shared result sets.
+
+Search results are interned here once per search fingerprint and shared by
+every user session that shows them. Sessions hold only a handle plus their
+own view state (sort, filter, page, selected season/quality and index lists
+into the shared results), so memory grows with the number of distinct
+searches rather than the number of users. Identical searches issued while a
+fresh set exists, or while one is still being fetched, reuse it instead of
+querying Jackett again.
+
+Result sets are treated as read-only once interned.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SHARE_TTL = 120   # seconds a result set may answer identical new searches
+
+class ResultSet:
+    __slots__ = ('handle', 'fingerprint', 'results', 'positions', 'created', 'refs', 'persisted')
+
+    def __init__(self, handle: str, fingerprint: str, results, created: float = None, persisted: bool = False):
+        self.handle      = handle
+        self.fingerprint = fingerprint
+        self.results     = tuple(results)
+        self.positions   = {id(item): i for i, item in enumerate(self.results)}
+        self.created     = created or time.time()
+        self.refs        = 0
+        self.persisted   = persisted
+
+class ResultSetStore:
+    """Reference-counted result sets keyed by handle, indexed by fingerprint"""
+
+    def __init__(self):
+        self._sets = {}          # handle -> ResultSet
+        self._latest = {}        # fingerprint -> handle of the newest set
+        self._inflight = {}      # fingerprint -> Future of a running search
+
+    def __len__(self):
+        return len(self._sets)
+
+    def get(self, handle: str):
+        return self._sets.get(handle)
+
+    def fresh(self, fingerprint: str):
+        """Newest set for this fingerprint if it is recent enough to share"""
+        rs = self._sets.get(self._latest.get(fingerprint))
+        if rs and time.time() - rs.created < SHARE_TTL:
+            return rs
+        return None
+
+    async def search(self, fingerprint: str, loader):
+        """Shared set for the fingerprint (None if no results); `loader()` runs only if none is fresh or in flight"""
+        rs = self.fresh(fingerprint)
+        if rs:
+            logger.info(f"Reusing shared results for '{fingerprint}' ({len(rs.results)} items)")
+            return rs
+        pending = self._inflight.get(fingerprint)
+        if pending:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[fingerprint] = future
+        try:
+            results = await loader()
+            rs = self.add(fingerprint, results) if results else None
+            future.set_result(rs)
+            return rs
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()   # waiters re-raise; don't warn about it here
+            raise
+        finally:
+            del self._inflight[fingerprint]
+
+    def add(self, fingerprint: str, results, handle: str = None, created: float = None,
+            persisted: bool = False) -> ResultSet:
+        if handle is None:
+            handle = hashlib.blake2b(f"{fingerprint}|{time.time()}".encode(), digest_size=6).hexdigest()
+        rs = ResultSet(handle, fingerprint, results, created, persisted)
+        self._sets[handle] = rs
+        if not persisted:
+            # Sets restored from disk are never offered to new searches
+            self._latest[fingerprint] = handle
+        return rs
+
+    def acquire(self, handle: str):
+        rs = self._sets.get(handle)
+        if rs:
+            rs.refs += 1
+        return rs
+
+    def release(self, handle: str):
+        rs = self._sets.get(handle)
+        if not rs:
+            return
+        rs.refs -= 1
+        if rs.refs <= 0:
+            del self._sets[handle]
+            if self._latest.get(rs.fingerprint) == handle:
+                del self._latest[rs.fingerprint]
@@ -0,0 +1,181 @@
+"""
+Night Leech - Download queue scheduler.
+
+Turns on qBittorrent's queue with a cap on active downloads and decides
+which torrents hold the active slots. Each incomplete torrent gets an
+expected download rate - its observed speed (smoothed) while active, or an
+estimate from swarm seeders and availability while queued - and torrents are
+ordered by expected time to finish (bytes left / rate), so the ones that
+will complete soonest run first. Slots only change hands when a queued
+torrent is clearly better than the one it would replace, to avoid churn.
+
+Active torrents that make no progress for `stall_after` seconds are moved to
+the bottom of the queue and kept out of the active set for a while.
+
+Reads torrent state from the shared TorrentIndex (qb_sync.py); the only
+qBittorrent calls it makes are preference, topPrio and bottomPrio updates.
+The queueing preferences it overrides are first saved to a small SQLite
+table and put back by `restore()` on shutdown. They stay on disk until a
+restore succeeds, so after a crash the next run restores the real originals
+instead of mistaking its own overrides for them.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PER_SEED_RATE = 64 * 1024     # bytes/s assumed per seeder before a torrent has run
+EMA_ALPHA     = 0.3
+HYSTERESIS    = 1.5           # a newcomer must finish this many times sooner to take a slot
+
+ACTIVE_STATES  = ('downloading', 'stalledDL', 'metaDL')
+QUEUED_STATES  = ('queuedDL',)
+QUEUE_PREFS    = ('queueing_enabled', 'max_active_downloads')
+
+class QueueScheduler:
+    """Keeps the `max_active` fastest-to-finish torrents in qBittorrent's active slots"""
+
+    def __init__(self, path, index, get_prefs, set_prefs, top_prio, bottom_prio, max_active: int = 3,
+                 stall_after: float = 600):
+        self.path = Path(path)
+        self.index = index
+        self.get_prefs = get_prefs          # async () -> dict
+        self.set_prefs = set_prefs          # async (dict) -> bool
+        self.top_prio = top_prio            # async (list of hashes), best last
+        self.bottom_prio = bottom_prio      # async (list of hashes)
+        self.max_active = max_active
+        self.stall_after = stall_after
+        self._speed = {}                    # hash -> smoothed dlspeed
+        self._progress = {}                 # hash -> (completed bytes, time it last grew)
+        self._stalled = {}                  # hash -> time it may be scheduled again
+        self._saved_prefs = None            # qBittorrent's own queue settings, once overridden
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS saved_prefs (
+                    id    INTEGER PRIMARY KEY CHECK (id = 1),
+                    prefs TEXT NOT NULL,
+                    saved REAL NOT NULL
+                )
+            """)
+        return self._db
+
+    def _load_saved(self):
+        """Settings saved by this or an earlier run that were not restored yet"""
+        if self._saved_prefs is None:
+            row = self._conn().execute("SELECT prefs FROM saved_prefs WHERE id = 1").fetchone()
+            if row:
+                self._saved_prefs = json.loads(row[0])
+        return self._saved_prefs
+
+    def _save(self, prefs: dict):
+        db = self._conn()
+        with db:
+            db.execute("INSERT OR REPLACE INTO saved_prefs VALUES (1, ?, ?)", (json.dumps(prefs), time.time()))
+        self._saved_prefs = prefs
+
+    def expected_rate(self, t: dict) -> float:
+        h = t['hash']
+        if t.get('state') in ACTIVE_STATES and h in self._speed:
+            return self._speed[h]
+        seeds = t.get('num_complete') or t.get('num_seeds') or 0
+        rate = PER_SEED_RATE * min(max(seeds, 0), 50)
+        availability = t.get('availability', -1)
+        if 0 <= availability < 1:
+            # No complete copy in the swarm; it may never finish
+            rate *= availability * 0.1
+        return rate
+
+    def finish_time(self, t: dict) -> float:
+        rate = self.expected_rate(t)
+        return t.get('amount_left', 0) / rate if rate > 0 else float('inf')
+
+    def _observe(self, t: dict, now: float):
+        h = t['hash']
+        if t.get('state') in ACTIVE_STATES:
+            speed = t.get('dlspeed', 0)
+            self._speed[h] = EMA_ALPHA * speed + (1 - EMA_ALPHA) * self._speed.get(h, speed)
+        completed = t.get('completed', 0)
+        last = self._progress.get(h)
+        if last is None or completed > last[0] or t.get('state') not in ACTIVE_STATES:
+            self._progress[h] = (completed, now)
+        elif now - last[1] > self.stall_after:
+            self._stalled[h] = now + 3 * self.stall_after
+            self._progress[h] = (completed, now)
+            logger.info(f"Torrent {h} stalled; demoting")
+            return True
+        return False
+
+    async def tick(self):
+        """Re-rank incomplete torrents and move queue slots if worthwhile"""
+        if not self.max_active or not self.index.synced_at:
+            return
+        if self._load_saved() is None:
+            prefs = await self.get_prefs()
+            if not all(k in prefs for k in QUEUE_PREFS):
+                return      # don't override what we could not save
+            self._save({k: prefs[k] for k in QUEUE_PREFS})
+            await self.set_prefs({'queueing_enabled': True, 'max_active_downloads': self.max_active})
+
+        now = time.time()
+        queue = [t for t in self.index.torrents.values()
+                 if t.get('progress', 0) < 1 and t.get('state') in ACTIVE_STATES + QUEUED_STATES]
+        live = {t['hash'] for t in queue}
+        for table in (self._speed, self._progress, self._stalled):
+            for h in [h for h in table if h not in live]:
+                del table[h]
+
+        newly_stalled = [t['hash'] for t in queue if self._observe(t, now)]
+        if newly_stalled:
+            await self.bottom_prio(newly_stalled)
+
+        eligible = [t for t in queue if self._stalled.get(t['hash'], 0) <= now]
+        incumbents = [t for t in eligible if t.get('state') in ACTIVE_STATES]
+        waiting = sorted((t for t in eligible if t.get('state') in QUEUED_STATES), key=self.finish_time)
+        incumbents.sort(key=self.finish_time, reverse=True)   # worst first
+
+        promote = []
+        free = max(0, self.max_active - len(incumbents))
+        promote.extend(waiting[:free])
+        for newcomer in waiting[free:]:
+            if not incumbents or self.finish_time(newcomer) * HYSTERESIS >= self.finish_time(incumbents[0]):
+                break
+            incumbents.pop(0)
+            promote.append(newcomer)
+
+        if promote:
+            keep = sorted(incumbents + promote, key=self.finish_time, reverse=True)
+            await self.top_prio([t['hash'] for t in keep])
+            logger.info(f"Scheduler promoted {len(promote)} torrent(s)")
+
+    async def restore(self):
+        """Put back the queue preferences qBittorrent had before the scheduler took over"""
+        try:
+            saved = self._load_saved()
+            if saved is None or not await self.set_prefs(saved):
+                return
+            db = self._conn()
+            with db:
+                db.execute("DELETE FROM saved_prefs WHERE id = 1")
+            self._saved_prefs = None
+            logger.info(f"Restored qBittorrent queue settings {saved}")
+        except Exception as e:
+            logger.error(f"Failed to restore qBittorrent queue settings: {e}")
+
+    async def run(self, interval: float = 30):
+        """Background scheduling loop"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}")
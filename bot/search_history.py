@@ -0,0 +1,180 @@
+"""
+Night Leech - Search history autocomplete.
+
+Keeps each user's normalized search queries, as they typed them, with hit
+counts and last-use time in a small SQLite file, mirrored in memory as a
+sorted key array per user so inline completions are answered with a bisect
+and never leave the process.
+
+A user keeps at most `max_per_user` queries; the least recently used one is
+dropped when a new one would go over. Searches only update memory and mark
+the entry dirty; a background loop writes all changes in one transaction in
+a worker thread, like the session store does.
+
+History from before it was kept per user is attributed to user 0 and used as
+a fallback for completions.
+"""
+
+import asyncio
+import bisect
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from title_index import normalize_title, title_keys
+
+logger = logging.getLogger(__name__)
+
+HALF_LIFE_DAYS = 14   # a search loses half its weight every two weeks
+MAX_PER_USER   = 200
+SHARED_USER    = 0    # history recorded before it was kept per user
+
+class SearchHistory:
+    """Persistent per-user query history with ranked prefix completion"""
+
+    def __init__(self, path, max_per_user: int = MAX_PER_USER, flush_interval: float = 5.0):
+        self.path = Path(path)
+        self.max_per_user = max_per_user
+        self.flush_interval = flush_interval
+        self._db = None
+        self._lock = threading.Lock()   # one connection, used from worker threads
+        self._entries = {}   # user_id -> {norm: [display, count, last_used, imdb_id]}
+        self._keys = {}      # user_id -> sorted (key, norm) pairs
+        self._dirty = set()  # (user_id, norm) changed or dropped since the last flush
+        self._loaded = False
+
+    def _conn(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(history)")]
+            if columns and 'user_id' not in columns:
+                self._db.execute("ALTER TABLE history RENAME TO history_shared")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    user_id   INTEGER NOT NULL,
+                    norm      TEXT NOT NULL,
+                    display   TEXT NOT NULL,
+                    count     INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    imdb_id   TEXT,
+                    PRIMARY KEY (user_id, norm)
+                )
+            """)
+            if self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'history_shared'").fetchone():
+                with self._db:
+                    self._db.execute(f"INSERT OR IGNORE INTO history SELECT {SHARED_USER}, * FROM history_shared")
+                    self._db.execute("DROP TABLE history_shared")
+        return self._db
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with self._lock:
+                rows = self._conn().execute("SELECT * FROM history").fetchall()
+            for user_id, norm, display, count, last_used, imdb_id in rows:
+                self._entries.setdefault(user_id, {})[norm] = [display, count, last_used, imdb_id]
+                keys = self._keys.setdefault(user_id, [])
+                for key in title_keys(norm):
+                    keys.append((key, norm))
+            for keys in self._keys.values():
+                keys.sort()
+            logger.info(f"Loaded {len(rows)} search history entries")
+        except Exception as e:
+            logger.error(f"Failed to load search history: {e}")
+
+    def _drop(self, user_id: int, norm: str):
+        del self._entries[user_id][norm]
+        keys = self._keys[user_id]
+        for key in title_keys(norm):
+            i = bisect.bisect_left(keys, (key, norm))
+            if i < len(keys) and keys[i] == (key, norm):
+                del keys[i]
+        self._dirty.add((user_id, norm))
+
+    def record(self, user_id: int, query: str, imdb_id: str = None):
+        """Count one search for this query by this user"""
+        self._load()
+        norm = normalize_title(query)
+        if not norm:
+            return
+        now = time.time()
+        entries = self._entries.setdefault(user_id, {})
+        entry = entries.get(norm)
+        if entry:
+            entry[0] = query
+            entry[1] += 1
+            entry[2] = now
+            entry[3] = imdb_id or entry[3]
+        else:
+            entries[norm] = [query, 1, now, imdb_id]
+            keys = self._keys.setdefault(user_id, [])
+            for key in title_keys(norm):
+                bisect.insort(keys, (key, norm))
+            while self.max_per_user and len(entries) > self.max_per_user:
+                self._drop(user_id, min(entries, key=lambda n: entries[n][2]))
+        self._dirty.add((user_id, norm))
+
+    async def flush(self):
+        """Write every changed or dropped entry in one transaction, off the event loop"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for user_id, norm in dirty:
+            entry = self._entries.get(user_id, {}).get(norm)
+            if entry:
+                upserts.append((user_id, norm, *entry))
+            else:
+                deletes.append((user_id, norm))
+        try:
+            await asyncio.to_thread(self._write, upserts, deletes)
+        except Exception as e:
+            logger.error(f"Failed to save search history: {e}")
+            self._dirty |= dirty
+
+    def _write(self, upserts: list, deletes: list):
+        with self._lock, self._conn() as db:
+            db.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?)", upserts)
+            db.executemany("DELETE FROM history WHERE user_id = ? AND norm = ?", deletes)
+
+    async def run(self):
+        """Background flush loop"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _matches(self, user_id: int, norm: str, now: float) -> dict:
+        keys = self._keys.get(user_id, [])
+        lo = bisect.bisect_left(keys, (norm,))
+        hi = bisect.bisect_left(keys, (norm + '\uffff',))
+        scored = {}
+        for _, n in keys[lo:hi]:
+            if n not in scored:
+                display, count, last_used, _ = self._entries[user_id][n]
+                age_days = (now - last_used) / 86400
+                scored[n] = count * 0.5 ** (age_days / HALF_LIFE_DAYS)
+        return scored
+
+    def complete(self, user_id: int, prefix: str, limit: int = 5) -> list:
+        """The user's most used recent queries matching the prefix, as {'title', 'imdb_id', 'count'} dicts"""
+        self._load()
+        norm = normalize_title(prefix)
+        if not norm:
+            return []
+        now = time.time()
+        found, seen = [], set()
+        for uid in dict.fromkeys((user_id, SHARED_USER)):
+            scored = self._matches(uid, norm, now)
+            for n in sorted(scored, key=scored.get, reverse=True):
+                if n not in seen:
+                    seen.add(n)
+                    found.append((uid, n))
+        return [
+            {'title': self._entries[uid][n][0], 'imdb_id': self._entries[uid][n][3], 'count': self._entries[uid][n][1]}
+            for uid, n in found[:limit]
+        ]
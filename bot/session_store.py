@@ -0,0 +1,217 @@
+"""
+Night Leech - Durable user session store.
+
+Persists each user's navigation state (ctx.user_data) to SQLite so a restart
+or crash does not break open result messages. Writes are batched: handlers
+only mark a user dirty and a background loop flushes all dirty users in one
+transaction. Nothing is read at startup; a user's state is restored the first
+time they interact after a restart. All database work runs in worker threads,
+one at a time under a lock, never on the event loop.
+
+Only plain JSON values (str keys, lists, numbers, strings, None) and datetimes
+in result sets are stored; anything else raises instead of coming back in a
+different shape after a restart.
+
+Sessions only reference shared result sets by handle (see result_sets.py).
+Each result set is written once, in columnar zlib-compressed JSON, to its own
+table and reloaded the first time a restored session needs it.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_KEY = 'sessions'      # per-message result sessions in user_data
+SESSION_TTL  = 7 * 86400       # forget sessions and result sets idle for a week
+
+_EPOCH = datetime(1970, 1, 1)
+
+# ─── Serialization ───────────────────────────────────────────────────────────
+
+def _encode_value(v):
+    if isinstance(v, datetime):
+        return {'$dt': 0 if v == datetime.min else int((v - _EPOCH).total_seconds())}
+    return v
+
+def _decode_value(v):
+    if isinstance(v, dict) and '$dt' in v:
+        return _EPOCH + timedelta(seconds=v['$dt']) if v['$dt'] else datetime.min
+    return v
+
+def _check_plain(obj, where='$'):
+    """Raise TypeError for anything JSON would not give back unchanged"""
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if not isinstance(k, str):
+                raise TypeError(f"{where}: key {k!r} is not a string")
+            _check_plain(v, f"{where}.{k}")
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            _check_plain(v, f"{where}[{i}]")
+    elif obj is not None and not isinstance(obj, (str, int, float)):
+        raise TypeError(f"{where}: {type(obj).__name__} cannot be stored")
+
+def _compress(obj) -> bytes:
+    _check_plain(obj)
+    return zlib.compress(json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode())
+
+def _decompress(blob: bytes):
+    return json.loads(zlib.decompress(blob))
+
+def pack_results(items) -> bytes:
+    """Columnar form of a list of result dicts: {'cols': [...], 'rows': [[...], ...]}"""
+    cols = sorted({k for item in items for k in item})
+    return _compress({
+        'cols': cols,
+        'rows': [[_encode_value(item.get(c)) for c in cols] for item in items],
+    })
+
+def unpack_results(blob: bytes) -> list:
+    packed = _decompress(blob)
+    cols = packed.get('cols', [])
+    return [{c: _decode_value(v) for c, v in zip(cols, row)} for row in packed.get('rows', [])]
+
+def pack_user_data(user_data: dict) -> bytes:
+    """user_data holds only plain values; JSON keeps the LRU order of the sessions dict"""
+    return _compress(user_data)
+
+def unpack_user_data(blob: bytes) -> dict:
+    return _decompress(blob)
+
+# ─── Store ───────────────────────────────────────────────────────────────────
+
+class SessionStore:
+    """SQLite (WAL) store of per-user state with lazy restore and batched writes"""
+
+    def __init__(self, path, result_sets, flush_interval: float = 5.0):
+        self.path = Path(path)
+        self.result_sets = result_sets
+        self.flush_interval = flush_interval
+        self._db = None
+        self._lock = threading.Lock()   # one connection, used from worker threads
+        self._dirty = {}       # user_id -> user_data (live reference)
+        self._checked = set()  # users already restored (or found absent) this run
+
+    def _conn(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute("PRAGMA synchronous = NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id INTEGER PRIMARY KEY,
+                    data    BLOB NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS result_sets (
+                    handle      TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    created     REAL NOT NULL,
+                    data        BLOB NOT NULL,
+                    updated     REAL NOT NULL
+                );
+            """)
+        return self._db
+
+    def _read_session(self, user_id: int):
+        with self._lock:
+            row = self._conn().execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return unpack_user_data(row[0]) if row else None
+
+    def _read_result_sets(self, handles: list) -> dict:
+        """handle -> (fingerprint, created, results) for the handles found"""
+        with self._lock:
+            db = self._conn()
+            rows = [db.execute("SELECT handle, fingerprint, created, data FROM result_sets WHERE handle = ?",
+                               (h,)).fetchone() for h in handles]
+        return {r[0]: (r[1], r[2], unpack_results(r[3])) for r in rows if r}
+
+    async def restore(self, user_id: int, user_data: dict):
+        """Fill an empty user_data from disk, once per user per process"""
+        if user_id in self._checked:
+            return
+        self._checked.add(user_id)
+        if user_data:
+            return
+        try:
+            stored = await asyncio.to_thread(self._read_session, user_id)
+            if stored is None:
+                return
+            sessions = stored.get(SESSIONS_KEY, {}).values()
+            missing = list(dict.fromkeys(h for h in (sess.get('rs') for sess in sessions)
+                                         if h and not self.result_sets.get(h)))
+            found = await asyncio.to_thread(self._read_result_sets, missing) if missing else {}
+            user_data.update(stored)
+            for handle, (fingerprint, created, results) in found.items():
+                if not self.result_sets.get(handle):
+                    self.result_sets.add(fingerprint, results, handle, created, persisted=True)
+            for sess in sessions:
+                self.result_sets.acquire(sess.get('rs'))
+            logger.info(f"Restored session for user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to restore session for {user_id}: {e}")
+
+    def mark_dirty(self, user_id: int, user_data: dict):
+        self._checked.add(user_id)
+        self._dirty[user_id] = user_data
+
+    async def flush(self):
+        """Write all dirty sessions, and result sets they newly reference, in one transaction"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        now = time.time()
+        upserts, deletes, new_sets, touched = [], [], [], set()
+        for user_id, user_data in dirty.items():
+            if not user_data:
+                deletes.append((user_id,))
+                continue
+            try:
+                row = (user_id, pack_user_data(user_data), now)
+                refs = {}
+                for sess in user_data.get(SESSIONS_KEY, {}).values():
+                    rs = self.result_sets.get(sess.get('rs'))
+                    if rs is not None and rs.handle not in touched:
+                        refs[rs.handle] = rs
+                packed = [(rs, (rs.handle, rs.fingerprint, rs.created, pack_results(rs.results), now))
+                          for rs in refs.values() if not rs.persisted]
+            except Exception as e:
+                logger.error(f"Failed to serialize session for {user_id}: {e}")
+                continue
+            upserts.append(row)
+            touched.update(refs)
+            new_sets.extend(packed)
+        try:
+            await asyncio.to_thread(self._write, upserts, deletes, [row for _, row in new_sets], touched, now)
+        except Exception as e:
+            logger.error(f"Session flush failed: {e}")
+            # Retry on the next flush, unless the session changed again meanwhile
+            for user_id, user_data in dirty.items():
+                self._dirty.setdefault(user_id, user_data)
+            return
+        for rs, _ in new_sets:
+            rs.persisted = True
+
+    def _write(self, upserts: list, deletes: list, new_sets: list, touched: set, now: float):
+        with self._lock, self._conn() as db:
+            db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", upserts)
+            db.executemany("DELETE FROM sessions WHERE user_id = ?", deletes)
+            db.executemany("INSERT OR REPLACE INTO result_sets VALUES (?, ?, ?, ?, ?)", new_sets)
+            db.executemany("UPDATE result_sets SET updated = ? WHERE handle = ?", [(now, h) for h in touched])
+            db.execute("DELETE FROM sessions WHERE updated < ?", (now - SESSION_TTL,))
+            db.execute("DELETE FROM result_sets WHERE updated < ?", (now - SESSION_TTL,))
+
+    async def run(self):
+        """Background flush loop"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
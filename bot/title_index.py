@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Night Leech - Local IMDb title index.
+
+Builds a compact SQLite index from IMDb's public dataset dumps
+(https://datasets.imdbws.com/) and answers title prefix lookups from it,
+so inline suggestions do not need the remote suggestion endpoint.
+
+Build:
+    python3 bot/title_index.py title.basics.tsv.gz title.akas.tsv.gz \\
+        --ratings title.ratings.tsv.gz --out data/titles.db
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Title types worth suggesting, mapped to the labels the IMDb suggestion API
+# uses in its "q" field (the inline handler keys off these).
+TITLE_KINDS = {
+    'movie':        'feature',
+    'tvSeries':     'TV series',
+    'tvMiniSeries': 'TV mini-series',
+    'tvMovie':      'TV movie',
+    'tvSpecial':    'TV special',
+    'video':        'video',
+}
+
+TOP_K          = 10   # suggestions stored per hot prefix
+TOP_PREFIX_LEN = 5    # prefixes up to this length are precomputed
+STOPWORDS      = {'the', 'a', 'an', 'of', 'and', 'la', 'le', 'el', 'der', 'die', 'das'}
+
+# ─── Normalization ───────────────────────────────────────────────────────────
+
+_non_alnum = re.compile(r'[^0-9a-z\u0600-\u06ff]+')
+
+def normalize_title(text: str) -> str:
+    """Lowercase, strip accents and collapse everything but letters/digits to single spaces"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return _non_alnum.sub(' ', text).strip()
+
+def title_keys(norm: str, word_starts: bool = True) -> set:
+    """Index keys for a normalized title: the full title plus each non-stopword suffix"""
+    if not norm:
+        return set()
+    keys = {norm}
+    if word_starts:
+        words = norm.split(' ')
+        for i in range(1, len(words)):
+            if words[i] not in STOPWORDS:
+                keys.add(' '.join(words[i:]))
+    return keys
+
+# ─── Builder ─────────────────────────────────────────────────────────────────
+
+def _read_tsv(path: str):
+    """Yield rows of an IMDb TSV dump (plain or gzipped), header skipped"""
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='\n') as f:
+        next(f, None)
+        for line in f:
+            yield line.rstrip('\n').split('\t')
+
+def _null(v: str):
+    return None if v == '\\N' else v
+
+def build_index(basics_path: str, akas_path: str = None, ratings_path: str = None,
+                out_path: str = 'titles.db', min_votes: int = 0) -> int:
+    """Build the index database from the dumps; returns number of titles indexed"""
+    started = time.time()
+
+    votes = {}
+    if ratings_path:
+        for row in _read_tsv(ratings_path):
+            if len(row) >= 3 and row[2].isdigit():
+                votes[row[0]] = int(row[2])
+        logger.info(f"Loaded {len(votes)} ratings")
+
+    tmp_path = f"{out_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE titles (
+            id     INTEGER PRIMARY KEY,
+            tconst TEXT NOT NULL,
+            title  TEXT NOT NULL,
+            year   TEXT,
+            kind   TEXT,
+            votes  INTEGER NOT NULL
+        );
+        CREATE TABLE keys (
+            key      TEXT NOT NULL,
+            title_id INTEGER NOT NULL,
+            PRIMARY KEY (key, title_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE top (
+            prefix TEXT PRIMARY KEY,
+            ids    TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """)
+
+    ids = {}            # tconst -> title id
+    keys = defaultdict(set)  # title id -> keys
+    for row in _read_tsv(basics_path):
+        if len(row) < 6 or row[1] not in TITLE_KINDS or row[4] == '1':
+            continue
+        tconst = row[0]
+        v = votes.get(tconst, 0)
+        if ratings_path and v < min_votes:
+            continue
+        tid = len(ids) + 1
+        ids[tconst] = tid
+        db.execute(
+            "INSERT INTO titles VALUES (?, ?, ?, ?, ?, ?)",
+            (tid, tconst, row[2], _null(row[5]) or '', TITLE_KINDS[row[1]], v)
+        )
+        keys[tid].update(title_keys(normalize_title(row[2])))
+        if row[3] != row[2]:
+            keys[tid].update(title_keys(normalize_title(row[3])))
+    logger.info(f"Indexed {len(ids)} titles from basics")
+
+    if akas_path:
+        for row in _read_tsv(akas_path):
+            tid = ids.get(row[0]) if row else None
+            if tid is None or len(row) < 3:
+                continue
+            norm = normalize_title(row[2])
+            if norm:
+                keys[tid].add(norm)
+
+    # Rank order: most voted first, newest first on ties
+    ranked = [r[0] for r in db.execute("SELECT id FROM titles ORDER BY votes DESC, year DESC")]
+
+    top = defaultdict(list)
+    for tid in ranked:
+        seen = set()
+        for key in keys[tid]:
+            db.execute("INSERT OR IGNORE INTO keys VALUES (?, ?)", (key, tid))
+            for n in range(1, min(len(key), TOP_PREFIX_LEN) + 1):
+                prefix = key[:n]
+                if prefix in seen:
+                    continue
+                seen.add(prefix)
+                lst = top[prefix]
+                if len(lst) < TOP_K:
+                    lst.append(tid)
+
+    # Only prefixes with a full page of hits are stored; shorter ranges are cheap to scan
+    db.executemany(
+        "INSERT INTO top VALUES (?, ?)",
+        ((p, ','.join(map(str, lst))) for p, lst in top.items() if len(lst) >= TOP_K)
+    )
+    db.commit()
+    db.execute("VACUUM")
+    db.close()
+    os.replace(tmp_path, out_path)
+    logger.info(f"Title index written to {out_path} in {time.time() - started:.0f}s")
+    return len(ids)
+
+# ─── Lookup ──────────────────────────────────────────────────────────────────
+
+class TitleIndex:
+    """Read-only prefix lookups against a built title index"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._db = None
+
+    def available(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _conn(self):
+        if self._db is None:
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._db.execute("PRAGMA mmap_size = 268435456")
+        return self._db
+
+    def suggest(self, query: str, limit: int = TOP_K) -> list:
+        """Return suggestions shaped like get_imdb_suggestions results, best first"""
+        norm = normalize_title(query)
+        if not norm or not self.available():
+            return []
+        db = self._conn()
+
+        ids = None
+        if len(norm) <= TOP_PREFIX_LEN:
+            row = db.execute("SELECT ids FROM top WHERE prefix = ?", (norm,)).fetchone()
+            if row:
+                ids = [int(x) for x in row[0].split(',')][:limit]
+
+        if ids is not None:
+            rows = db.execute(
+                f"SELECT id, tconst, title, year, kind FROM titles WHERE id IN ({','.join('?' * len(ids))})",
+                ids
+            ).fetchall()
+            order = {tid: i for i, tid in enumerate(ids)}
+            rows.sort(key=lambda r: order[r[0]])
+        else:
+            # Range scan over the key prefix; '\uffff' sorts after every indexed character
+            rows = db.execute("""
+                SELECT t.id, t.tconst, t.title, t.year, t.kind
+                FROM titles t
+                WHERE t.id IN (SELECT title_id FROM keys WHERE key >= ? AND key < ?)
+                ORDER BY t.votes DESC, t.year DESC
+                LIMIT ?
+            """, (norm, norm + '\uffff', limit)).fetchall()
+
+        return [
+            {"id": tconst, "title": title, "year": year, "type": kind, "poster": ""}
+            for _, tconst, title, year, kind in rows
+        ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local IMDb title index")
+    parser.add_argument('basics', help="title.basics.tsv(.gz)")
+    parser.add_argument('akas', nargs='?', help="title.akas.tsv(.gz)")
+    parser.add_argument('--ratings', help="title.ratings.tsv(.gz), used for popularity ranking")
+    parser.add_argument('--min-votes', type=int, default=0, help="skip titles with fewer votes (needs --ratings)")
+    parser.add_argument('--out', default=str(Path(__file__).parent.parent / "data" / "titles.db"))
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    build_index(args.basics, args.akas, args.ratings, args.out, args.min_votes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Night Leech - Webhook delivery.
+
+Serves Telegram updates over an aiohttp endpoint instead of long polling.
+Requests must carry the X-Telegram-Bot-Api-Secret-Token header set when the
+webhook was registered; valid updates go straight into the Application's
+update queue. A secret is mandatory: without WEBHOOK_SECRET a random one is
+generated per run and handed to Telegram in set_webhook.
+
+The HTTP side (`build_webhook_app` / `start_webhook_server`) needs no network
+and is tested offline; only `register_webhook` talks to Telegram.
+
+For local end-to-end checks without Telegram, this file doubles as a fake
+sender that posts a synthetic update to a running bot:
+    python3 bot/webhook.py http://127.0.0.1:8443/telegram SECRET "/search Dark"
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import secrets
+import signal
+import time
+
+import aiohttp
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+def build_webhook_app(application, path: str, secret: str) -> web.Application:
+    """aiohttp app that feeds POSTed updates into `application.update_queue`"""
+    if not secret:
+        raise ValueError("webhook secret is required")
+
+    async def receive(request):
+        if not secrets.compare_digest(request.headers.get(SECRET_HEADER, ''), secret):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except Exception:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+        update = Update.de_json(data, application.bot)
+        if update is None:
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, receive)
+    return app
+
+async def start_webhook_server(application, listen: str, port: int, path: str, secret: str) -> web.AppRunner:
+    """Serve the webhook endpoint; returns the runner to clean up"""
+    runner = web.AppRunner(build_webhook_app(application, path, secret))
+    await runner.setup()
+    await web.TCPSite(runner, listen, port).start()
+    return runner
+
+async def register_webhook(bot, public_url: str, path: str, secret: str):
+    """Point Telegram at the endpoint"""
+    await bot.set_webhook(
+        url=f"{public_url.rstrip('/')}{path}",
+        secret_token=secret,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True,
+    )
+
+async def run_webhook(application, public_url: str, listen: str, port: int, path: str, secret: str):
+    """Run the bot until SIGINT/SIGTERM with updates delivered by webhook"""
+    if not secret:
+        secret = secrets.token_urlsafe(32)
+        logger.info("WEBHOOK_SECRET not set; using a random secret for this run")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    await application.initialize()
+    runner = None
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        runner = await start_webhook_server(application, listen, port, path, secret)
+        await register_webhook(application.bot, public_url, path, secret)
+        logger.info(f"Webhook listening on {listen}:{port}{path}")
+        await stop.wait()
+    finally:
+        # Undo only what got started; a failed startup still shuts down cleanly
+        if runner:
+            await runner.cleanup()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+# ─── Fake sender ─────────────────────────────────────────────────────────────
+
+_update_ids = itertools.count(int(time.time()))
+
+def fake_message_update(text: str, user_id: int = 1, chat_id: int = None) -> dict:
+    """Minimal Telegram Update JSON for a private text message"""
+    user = {"id": user_id, "is_bot": False, "first_name": "Test"}
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith('/') else []
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_update_ids) % 1_000_000,
+            "date": int(time.time()),
+            "chat": {"id": chat_id or user_id, "type": "private", "first_name": "Test"},
+            "from": user,
+            "text": text,
+            "entities": entities,
+        },
+    }
+
+async def send_fake_update(url: str, secret: str, update: dict) -> int:
+    """POST an update the way Telegram does; returns the HTTP status"""
+    async with aiohttp.ClientSession() as s:
+        async with s.post(url, data=json.dumps(update), headers={
+            'Content-Type': 'application/json',
+            SECRET_HEADER: secret,
+        }) as r:
+            return r.status
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 4:
+        print("usage: webhook.py URL SECRET TEXT [USER_ID]")
+        sys.exit(1)
+    user_id = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+    status = asyncio.run(send_fake_update(sys.argv[1], sys.argv[2], fake_message_update(sys.argv[3], user_id)))
+    print(f"HTTP {status}")
@@ -0,0 +1,44 @@
+"""Season coverage planner."""
+
+from coverage import plan_coverage
+
+GB = 1_073_741_824
+
+def single(ep, size=GB, seeders=10):
+    return {'Title': f'Show.S01E{ep:02d}', 'episodes': [ep], 'Size': size, 'Seeders': seeders}
+
+def pack(size, seeders=10):
+    return {'Title': 'Show.S01.Complete', 'is_pack': True, 'Size': size, 'Seeders': seeders}
+
+SINGLES = [single(e) for e in (1, 2, 3)]
+
+def test_expensive_pack_still_covers_unlisted_episodes():
+    # An 8-episode pack plus singles for E01-E03: the singles are not the season
+    full = pack(8 * GB)
+    plan = plan_coverage(SINGLES + [full], min_seeders=1)
+    assert plan['items'] == [full]
+    assert plan['wanted'] == [None]
+    assert plan['whole_season'] and not plan['pack_only']
+    assert plan['missing'] == []
+
+def test_cheap_pack_is_fetched_whole():
+    full = pack(2 * GB)
+    plan = plan_coverage(SINGLES + [full], min_seeders=1)
+    assert plan['items'] == [full]
+    assert plan['wanted'] == [None]
+
+def test_unhealthy_pack_reported_not_dropped():
+    plan = plan_coverage(SINGLES + [pack(8 * GB, seeders=0)], min_seeders=3)
+    assert [t['Title'] for t in plan['items']] == ['Show.S01E01', 'Show.S01E02', 'Show.S01E03']
+    assert plan['pack_only'] and not plan['whole_season']
+    assert plan['episodes'] == [1, 2, 3]
+
+def test_singles_only_season():
+    plan = plan_coverage(SINGLES + [single(2, size=GB // 2)], min_seeders=1)
+    assert sorted(e for w in plan['wanted'] for e in w) == [1, 2, 3]
+    assert plan['size'] == 2 * GB + GB // 2
+    assert not plan['pack_only'] and not plan['whole_season']
+
+def test_missing_episode_listed():
+    plan = plan_coverage(SINGLES[:2] + [single(3, seeders=0)], min_seeders=3)
+    assert plan['missing'] == [3]
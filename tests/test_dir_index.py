@@ -0,0 +1,25 @@
+"""Listing cache change notifications."""
+
+import asyncio
+import os
+
+from dir_index import DirCache
+
+def test_listeners_hear_fresh_and_changed_listings(tmp_path):
+    (tmp_path / 'a.mkv').write_bytes(b'x')
+    heard = []
+    cache = DirCache()
+    cache.on_change(lambda path, entries: heard.append(sorted(e.name for e in entries)))
+
+    async def main():
+        await cache.listing(str(tmp_path))
+        cache._listings[str(tmp_path)].read_at = 0     # skip the RECHECK window
+        await cache.listing(str(tmp_path))
+        (tmp_path / 'b.mkv').write_bytes(b'y')
+        st = os.stat(tmp_path)
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        cache._listings[str(tmp_path)].read_at = 0
+        await cache.listing(str(tmp_path))
+
+    asyncio.run(main())
+    assert heard == [['a.mkv'], ['a.mkv', 'b.mkv']]
@@ -0,0 +1,69 @@
+"""Deferred file rules driven by torrent index deltas."""
+
+import asyncio
+
+from file_rules import PendingFiles, has_metadata
+from qb_sync import TorrentIndex
+
+H = 'a' * 40
+
+def make(tmp_path, results=None):
+    calls = []
+    async def handle(hash_, eps, is_pack):
+        calls.append((hash_, eps, is_pack))
+        return results.pop(0) if results else True
+    pending = PendingFiles(tmp_path / 'pending.db', handle, retry_after=0)
+    return pending, calls
+
+def sync(pending, index, data):
+    changed, removed = index.apply(data)
+    asyncio.run(pending.on_change(changed, removed, index.torrents))
+
+def test_metadata_detection():
+    assert not has_metadata({'hash': H})
+    assert not has_metadata({'state': 'metaDL', 'total_size': 0})
+    assert has_metadata({'state': 'stoppedDL', 'total_size': 10})
+    assert not has_metadata({'has_metadata': False, 'state': 'stoppedDL', 'total_size': 10})
+
+def test_handled_once_metadata_arrives(tmp_path):
+    pending, calls = make(tmp_path)
+    index = TorrentIndex(None)
+    index.note_added(H)
+    pending.add(H, [1, 2], False)
+    sync(pending, index, {'rid': 1, 'full_update': True, 'torrents': {H: {'state': 'metaDL', 'total_size': 0}}})
+    assert calls == []
+    sync(pending, index, {'rid': 2, 'torrents': {H: {'state': 'stoppedDL', 'total_size': 10}}})
+    assert calls == [(H, {1, 2}, False)]
+    assert H not in pending
+
+def test_no_metadata_never_handled(tmp_path):
+    pending, calls = make(tmp_path)
+    index = TorrentIndex(None)
+    pending.add(H, None, True)
+    for rid in range(1, 4):
+        sync(pending, index, {'rid': rid, 'full_update': rid == 1, 'torrents': {H: {'state': 'metaDL'}}})
+    assert calls == [] and H in pending
+
+def test_pending_survives_restart(tmp_path):
+    pending, _ = make(tmp_path)
+    pending.add(H, [3], False)
+    # New process: the first sync is a full update where the torrent already stopped with metadata
+    pending, calls = make(tmp_path)
+    sync(pending, TorrentIndex(None), {'rid': 1, 'full_update': True,
+                                       'torrents': {H: {'state': 'stoppedDL', 'total_size': 10}}})
+    assert calls == [(H, {3}, False)]
+
+def test_failed_handle_retried(tmp_path):
+    pending, calls = make(tmp_path, results=[False, True])
+    index = TorrentIndex(None)
+    pending.add(H, None, False)
+    sync(pending, index, {'rid': 1, 'full_update': True, 'torrents': {H: {'state': 'stoppedDL', 'total_size': 10}}})
+    assert H in pending
+    sync(pending, index, {'rid': 2, 'torrents': {'b' * 40: {'progress': 0.5}}})
+    assert len(calls) == 2 and H not in pending
+
+def test_deleted_torrent_forgotten(tmp_path):
+    pending, calls = make(tmp_path)
+    pending.add(H, None, False)
+    sync(pending, TorrentIndex(None), {'rid': 1, 'full_update': True, 'torrents': {'b' * 40: {}}})
+    assert calls == [] and H not in pending
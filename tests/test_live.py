@@ -0,0 +1,46 @@
+"""Live feed cache used for the dashboard's first paint."""
+
+import asyncio
+
+from live import LiveFeed
+
+A = 'a' * 40
+
+def test_current_waits_for_first_sync_then_serves_cache():
+    calls = []
+
+    async def fetch(rid):
+        calls.append(rid)
+        return {'rid': rid + 1, 'full_update': rid == 0, 'torrents': {A: {'name': 'x'}}}
+
+    async def main():
+        feed = LiveFeed(fetch, interval=0.01)
+        torrents = await feed.current()
+        assert torrents[A]['name'] == 'x'
+        # No clients and no keep_alive: the poller stops after that one sync
+        await feed._task
+        feed.keep_alive()
+        await asyncio.sleep(0.05)
+        polled = len(calls)
+        assert (await feed.current())[A]['name'] == 'x'
+        assert len(calls) - polled <= 1
+        feed._always = False
+        await feed._task
+
+    asyncio.run(main())
+
+def test_current_times_out_when_upstream_is_down():
+    async def fetch(rid):
+        return None
+
+    async def main():
+        feed = LiveFeed(fetch, interval=0.01)
+        try:
+            await feed.current(timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("expected a timeout")
+        await feed._task
+
+    asyncio.run(main())
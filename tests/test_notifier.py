@@ -0,0 +1,43 @@
+"""Completion notifications keep their owner until the torrent really goes away."""
+
+import asyncio
+
+from notifier import CompletionNotifier
+from qb_sync import TorrentIndex
+
+H = 'a' * 40
+
+def make(tmp_path):
+    sent = []
+    async def notify(chat_id, hash_, torrent, milestone):
+        sent.append((chat_id, hash_, milestone))
+    return CompletionNotifier(tmp_path / 'notify.db', notify), sent
+
+def sync(notifier, index, data):
+    changed, removed = index.apply(data)
+    asyncio.run(notifier.on_change(changed, removed, index.torrents))
+
+def test_full_update_between_add_and_completion(tmp_path):
+    notifier, sent = make(tmp_path)
+    index = TorrentIndex(None)
+    index.note_added(H)
+    notifier.watch(H, 7)
+    # qBittorrent has not listed the new torrent yet when a full update arrives
+    sync(notifier, index, {'rid': 1, 'full_update': True, 'torrents': {'b' * 40: {'progress': 0.5}}})
+    assert notifier.owner(H) == 7
+    sync(notifier, index, {'rid': 2, 'torrents': {H: {'progress': 1, 'name': 'Show'}}})
+    assert sent == [(7, H, None)]
+    assert notifier.owner(H) is None
+
+def test_spurious_removal_keeps_unseen_owner(tmp_path):
+    notifier, sent = make(tmp_path)
+    notifier.watch(H, 7)
+    asyncio.run(notifier.on_change({}, [H], {}))
+    assert notifier.owner(H) == 7
+
+def test_seen_torrent_removal_forgets_owner(tmp_path):
+    notifier, sent = make(tmp_path)
+    notifier.watch(H, 7)
+    asyncio.run(notifier.on_change({H: {'progress': 0.2}}, [], {}))
+    asyncio.run(notifier.on_change({}, [H], {}))
+    assert notifier.owner(H) is None and sent == []
@@ -0,0 +1,33 @@
+"""Torrent index removal reporting."""
+
+import qb_sync
+from qb_sync import TorrentIndex
+
+A, B = 'a' * 40, 'b' * 40
+
+def test_placeholder_survives_full_update():
+    index = TorrentIndex(None)
+    index.note_added(A)
+    changed, removed = index.apply({'rid': 1, 'full_update': True, 'torrents': {B: {'progress': 0}}})
+    assert removed == []
+    assert A in index and B in index
+
+def test_listed_torrent_missing_from_full_update_is_removed():
+    index = TorrentIndex(None)
+    index.apply({'rid': 1, 'full_update': True, 'torrents': {A: {}, B: {}}})
+    changed, removed = index.apply({'rid': 2, 'full_update': True, 'torrents': {B: {}}})
+    assert removed == [A] and A not in index
+
+def test_placeholder_filled_in_then_removed_normally():
+    index = TorrentIndex(None)
+    index.note_added(A)
+    index.apply({'rid': 1, 'torrents': {A: {'name': 'x'}}})
+    assert index.get(A)['name'] == 'x'
+    assert index.apply({'rid': 2, 'torrents_removed': [A]}) == ({}, [A])
+
+def test_never_listed_placeholder_expires(monkeypatch):
+    index = TorrentIndex(None)
+    index.note_added(A)
+    monkeypatch.setattr(qb_sync, 'PLACEHOLDER_TTL', -1)
+    changed, removed = index.apply({'rid': 1, 'torrents': {}})
+    assert removed == [A] and A not in index
@@ -0,0 +1,24 @@
+"""/api/torrents paging parameters."""
+
+import pytest
+
+import qb_ui
+from qb_ui import select_torrents
+
+TORRENTS = [{'hash': str(i)} for i in range(5)]
+
+def test_offset_and_limit_page_the_list():
+    page, total = select_torrents(TORRENTS, {'offset': '1', 'limit': '2'})
+    assert [t['hash'] for t in page] == ['1', '2'] and total == 5
+
+def test_limit_is_capped(monkeypatch):
+    monkeypatch.setattr(qb_ui, 'MAX_LIMIT', 3)
+    page, _ = select_torrents(TORRENTS, {'limit': '100'})
+    assert len(page) == 3
+    page, _ = select_torrents(TORRENTS, {})
+    assert len(page) == 3
+
+@pytest.mark.parametrize('query', [{'limit': '-1'}, {'offset': '-5'}, {'limit': 'ten'}, {'offset': '1.5'}])
+def test_bad_paging_is_rejected(query):
+    with pytest.raises(ValueError):
+        select_torrents(TORRENTS, query)
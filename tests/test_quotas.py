@@ -0,0 +1,40 @@
+"""Fair-share download limits."""
+
+import asyncio
+
+from quotas import FairShare, max_min
+
+KB = 1024
+
+class Index:
+    def __init__(self, torrents, speed):
+        self.torrents = {t['hash']: t for t in torrents}
+        self.server_state = {'dl_info_speed': speed}
+
+def torrent(h, user, dlspeed):
+    return {'hash': h, 'tags': f'user:{user}', 'dlspeed': dlspeed, 'progress': 0.1, 'state': 'downloading'}
+
+def tick(torrents, speed, capacity=1000 * KB):
+    sent = {}
+    async def set_limit(hashes, limit):
+        for h in hashes:
+            sent[h] = limit
+    asyncio.run(FairShare(Index(torrents, speed), set_limit, capacity=capacity).tick())
+    return sent
+
+def test_max_min_gives_back_unused_share():
+    assert max_min({'a': 100, 'b': 900}, 600) == {'a': 100, 'b': 500}
+
+def test_single_user_never_throttled():
+    assert tick([torrent('a', 1, 600 * KB), torrent('b', 1, 400 * KB)], 1000 * KB) == {}
+
+def test_off_without_capacity():
+    assert tick([torrent('a', 1, 600 * KB), torrent('b', 2, 400 * KB)], 1000 * KB, capacity=0) == {}
+
+def test_user_share_split_by_torrent_demand():
+    # User 1 has one fast and one stalled torrent; the fast one keeps nearly all of the share
+    sent = tick([torrent('fast', 1, 700 * KB), torrent('stalled', 1, 0), torrent('other', 2, 300 * KB)],
+                1000 * KB)
+    assert sent['stalled'] == 1024
+    assert sent['fast'] > 450 * KB
+    assert sent['fast'] + sent['stalled'] + sent['other'] <= 1000 * KB + 1024
@@ -0,0 +1,83 @@
+"""Relevance scoring: precision/recall on a labelled corpus must not regress."""
+
+import pytest
+
+from relevance import DEFAULT_THRESHOLD, QueryProfile, parse_weights, score_title
+
+# Measured at DEFAULT_THRESHOLD: precision 16/17 (0.94), recall 16/18 (0.89)
+MIN_PRECISION = 0.94
+MIN_RECALL    = 0.88
+
+# (query, clean title as parsed from the release name, relevant?)
+CORPUS = [
+    ("Breaking Bad (2008)",        "Breaking Bad",                 True),
+    ("Breaking Bad (2008)",        "Breaking.Bad",                 True),
+    ("Breaking Bad (2008)",        "Breaking Bad Behavior",        False),
+    ("Breaking Bad (2008)",        "Bad Sisters",                  False),
+    ("Dark (2017)",                "Dark",                         True),
+    ("Dark (2017)",                "DARK",                         True),
+    ("Dark (2017)",                "Dark Matter",                  False),
+    ("Dark (2017)",                "Dark Winds",                   False),
+    ("Dark (2017)",                "Into the Dark",                False),
+    ("You (2018)",                 "You",                          True),
+    ("You (2018)",                 "You Me Her",                   False),
+    ("The Office (2005)",          "The Office US",                True),
+    ("The Office (2005)",          "The.Office",                   True),
+    ("The Office (2005)",          "The Good Place",               False),
+    ("House of the Dragon (2022)", "House.of.the.Dragon",          True),
+    ("House of the Dragon (2022)", "House of Cards",               False),
+    ("House of the Dragon (2022)", "House",                        False),
+    ("Mr. Robot (2015)",           "Mr Robot",                     True),
+    ("Mr. Robot (2015)",           "Mr. Bean",                     False),
+    ("Shogun (2024)",              "Shōgun",                       True),
+    ("Shogun (2024)",              "Shogun 2024",                  True),
+    ("Shogun (2024)",              "Shotgun Wedding",              False),
+    ("The Boys (2019)",            "The Boys",                     True),
+    ("The Boys (2019)",            "The Boys Presents Diabolical", False),
+    ("The Boys (2019)",            "Boys from County Hell",        False),
+    ("1917 (2019)",                "1917",                         True),
+    ("1917 (2019)",                "1922",                         False),
+    ("Severance (2022)",           "Severance",                    True),
+    ("Severance (2022)",           "Seven",                        False),
+    ("Frieren",                    "Sousou no Frieren",            True),
+    ("Frieren",                    "Frieren Beyond Journeys End",  True),
+    ("Frieren",                    "Fire Force",                   False),
+    ("Game of Thrones (2011)",     "Game.of.Thrones",              True),
+    ("Game of Thrones (2011)",     "Game of Thrones Conquest and Rebellion", False),
+    ("Game of Thrones (2011)",     "The Game",                     False),
+    ("Fallout (2024)",             "Fallout",                      True),
+    ("Fallout (2024)",             "Mission Impossible Fallout",   False),
+]
+
+def evaluate(threshold=DEFAULT_THRESHOLD, weights=None):
+    """(precision, recall, misses) of the threshold over CORPUS"""
+    tp = fp = fn = 0
+    misses = []
+    for query, title, relevant in CORPUS:
+        kept = score_title(QueryProfile(query), title, weights) >= threshold
+        if kept and relevant:
+            tp += 1
+        elif kept:
+            fp += 1
+            misses.append(('FP', query, title))
+        elif relevant:
+            fn += 1
+            misses.append(('FN', query, title))
+    return tp / (tp + fp) if tp + fp else 1.0, tp / (tp + fn) if tp + fn else 1.0, misses
+
+def test_precision_and_recall():
+    precision, recall, misses = evaluate()
+    assert precision >= MIN_PRECISION, misses
+    assert recall >= MIN_RECALL, misses
+
+@pytest.mark.parametrize('query, title', [
+    ("Dark (2017)", "Dark"),
+    ("Shogun (2024)", "Shōgun"),
+    ("Mr. Robot (2015)", "Mr Robot"),
+])
+def test_exact_titles_pass(query, title):
+    assert score_title(QueryProfile(query), title) >= DEFAULT_THRESHOLD
+
+def test_parse_weights_keeps_defaults():
+    weights = parse_weights('token=0.5,bogus')
+    assert weights['token'] == 0.5 and weights['ngram'] == 0.4
@@ -0,0 +1,51 @@
+"""Queue scheduler: qBittorrent's own queue settings survive a crash."""
+
+import asyncio
+
+from scheduler import QueueScheduler
+
+ORIGINAL = {'queueing_enabled': False, 'max_active_downloads': 5}
+
+class Client:
+    """qBittorrent preferences, shared across bot runs"""
+    def __init__(self):
+        self.prefs = dict(ORIGINAL, other=1)
+        self.fail = False
+    async def get_prefs(self):
+        return dict(self.prefs)
+    async def set_prefs(self, prefs):
+        if self.fail:
+            return False
+        self.prefs.update(prefs)
+        return True
+
+class Index:
+    synced_at = 1.0
+    torrents = {}
+
+async def noop(hashes):
+    pass
+
+def make(tmp_path, client):
+    return QueueScheduler(tmp_path / 'scheduler.db', Index(), client.get_prefs, client.set_prefs, noop, noop,
+                          max_active=2)
+
+def test_originals_restored_after_crash(tmp_path):
+    client = Client()
+    asyncio.run(make(tmp_path, client).tick())
+    assert client.prefs['max_active_downloads'] == 2
+    # Killed without restore(); the next run must not save the overrides as originals
+    second = make(tmp_path, client)
+    asyncio.run(second.tick())
+    asyncio.run(second.restore())
+    assert client.prefs == dict(ORIGINAL, other=1)
+
+def test_failed_restore_kept_for_next_run(tmp_path):
+    client = Client()
+    first = make(tmp_path, client)
+    asyncio.run(first.tick())
+    client.fail = True
+    asyncio.run(first.restore())
+    client.fail = False
+    asyncio.run(make(tmp_path, client).restore())
+    assert client.prefs == dict(ORIGINAL, other=1)
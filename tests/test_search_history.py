@@ -0,0 +1,42 @@
+"""Search history: per-user cap, original queries, batched writes."""
+
+import asyncio
+import sqlite3
+
+from search_history import SHARED_USER, SearchHistory
+
+def test_records_what_the_user_typed(tmp_path):
+    history = SearchHistory(tmp_path / 'history.db')
+    history.record(1, 'Dark (2017)', 'tt5753856')
+    assert history.complete(1, 'da') == [{'title': 'Dark (2017)', 'imdb_id': 'tt5753856', 'count': 1}]
+    assert history.complete(2, 'da') == []
+
+def test_cap_drops_least_recently_used(tmp_path):
+    history = SearchHistory(tmp_path / 'history.db', max_per_user=2)
+    for title in ('Alpha', 'Beta', 'Gamma'):
+        history.record(1, title)
+    asyncio.run(history.flush())
+    assert history.complete(1, 'alpha') == []
+    db = sqlite3.connect(tmp_path / 'history.db')
+    assert sorted(r[0] for r in db.execute("SELECT display FROM history WHERE user_id = 1")) == ['Beta', 'Gamma']
+
+def test_nothing_written_until_flush(tmp_path):
+    history = SearchHistory(tmp_path / 'history.db')
+    history.record(1, 'Severance')
+    assert SearchHistory(tmp_path / 'history.db').complete(1, 'sev') == []
+    asyncio.run(history.flush())
+    assert SearchHistory(tmp_path / 'history.db').complete(1, 'sev')[0]['title'] == 'Severance'
+
+def test_old_shared_history_migrated(tmp_path):
+    db = sqlite3.connect(tmp_path / 'history.db')
+    db.execute("CREATE TABLE history (norm TEXT PRIMARY KEY, display TEXT NOT NULL, count INTEGER NOT NULL,"
+               " last_used REAL NOT NULL, imdb_id TEXT)")
+    db.execute("INSERT INTO history VALUES ('the boys', 'The Boys', 3, 0, NULL)")
+    db.commit()
+    db.close()
+    history = SearchHistory(tmp_path / 'history.db')
+    assert history.complete(42, 'boys')[0]['title'] == 'The Boys'
+    history.record(42, 'The Boys')
+    asyncio.run(history.flush())
+    users = sqlite3.connect(tmp_path / 'history.db').execute("SELECT user_id FROM history ORDER BY user_id")
+    assert [r[0] for r in users] == [SHARED_USER, 42]
@@ -0,0 +1,43 @@
+"""Session store: what is restored has the shape that was saved."""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from result_sets import ResultSetStore
+from session_store import SessionStore, pack_results, pack_user_data, unpack_results, unpack_user_data
+
+def test_user_data_round_trip():
+    data = {'sessions': {'a1': {'rs': 'h', 'page': 2, 'selected': [1, 3], 'filter_indexer': None}}}
+    assert unpack_user_data(pack_user_data(data)) == data
+
+def test_result_dates_round_trip():
+    items = [{'Title': 'x', 'ParsedDate': datetime(2024, 5, 1, 12)}, {'Title': 'y', 'ParsedDate': datetime.min}]
+    assert unpack_results(pack_results(items)) == items
+
+@pytest.mark.parametrize('value', [(1, 2), {1, 2}, {1: 'int key'}, datetime(2024, 1, 1), object()])
+def test_unstorable_values_raise(value):
+    with pytest.raises(TypeError):
+        pack_user_data({'sessions': {}, 'bad': value})
+
+def test_restore_after_flush(tmp_path):
+    async def scenario():
+        sets = ResultSetStore()
+        rs = sets.add('fp', [{'Title': 'Dark.S01E01', 'ParsedDate': datetime(2024, 1, 2)}])
+        store = SessionStore(tmp_path / 'sessions.db', sets)
+        store.mark_dirty(1, {'sessions': {'a1': {'rs': rs.handle, 'page': 0}}})
+        # A user whose state cannot be stored is skipped, not silently reshaped
+        store.mark_dirty(2, {'sessions': {}, 'bad': (1, 2)})
+        await store.flush()
+
+        fresh_sets = ResultSetStore()
+        restored = SessionStore(tmp_path / 'sessions.db', fresh_sets)
+        good, bad = {}, {}
+        await asyncio.gather(restored.restore(1, good), restored.restore(2, bad))
+        return rs.handle, good, bad, fresh_sets
+
+    handle, good, bad, fresh_sets = asyncio.run(scenario())
+    assert good == {'sessions': {'a1': {'rs': handle, 'page': 0}}}
+    assert bad == {}
+    assert fresh_sets.get(handle).results[0]['ParsedDate'] == datetime(2024, 1, 2)
@@ -0,0 +1,25 @@
+"""Speed history series keys."""
+
+import pytest
+
+from speed_history import GLOBAL, SpeedHistory
+
+V1 = 'a' * 40
+V2 = 'b' * 64
+
+def test_full_length_keys_kept_apart(tmp_path):
+    history = SpeedHistory(str(tmp_path / 'history.bin'))
+    history.record(V2, 1000, (10, 1))
+    history.record(V2[:40], 1000, (20, 2))
+    history.record(GLOBAL, 1000, (30, 3))
+    history.close()
+    reopened = SpeedHistory(str(tmp_path / 'history.bin'))
+    assert reopened.series(V2, 1000, span=1)[1][-1][1:] == [10, 1]
+    assert reopened.series(V2[:40], 1000, span=1)[1][-1][1:] == [20, 2]
+    reopened.close()
+
+def test_too_long_key_refused(tmp_path):
+    history = SpeedHistory(str(tmp_path / 'history.bin'))
+    with pytest.raises(ValueError):
+        history.record(V1 + ':dl:extra:' + V1, 1000, (1, 1))
+    history.close()
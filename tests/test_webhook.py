@@ -0,0 +1,86 @@
+"""Webhook endpoint, end to end over HTTP, without touching Telegram."""
+
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from aiohttp.test_utils import unused_port
+from telegram import User
+from telegram.error import TelegramError
+from telegram.ext import ApplicationBuilder, ExtBot
+
+from webhook import SECRET_HEADER, build_webhook_app, fake_message_update, run_webhook
+
+SECRET = 's3cret'
+PATH = '/telegram'
+PORT = unused_port()
+
+def make_application():
+    # Never initialized, so no getMe / setWebhook call is made
+    return ApplicationBuilder().token('123456:TEST').build()
+
+async def post(application, body, headers):
+    async with TestClient(TestServer(build_webhook_app(application, PATH, SECRET))) as client:
+        resp = await client.post(PATH, data=body, headers=headers)
+        return resp.status
+
+def test_update_reaches_queue():
+    application = make_application()
+    update = fake_message_update('/search Dark', user_id=42)
+    status = asyncio.run(post(application, json.dumps(update), {SECRET_HEADER: SECRET}))
+    assert status == 200
+    queued = application.update_queue.get_nowait()
+    assert queued.message.text == '/search Dark'
+    assert queued.effective_user.id == 42
+
+@pytest.mark.parametrize('headers', [{}, {SECRET_HEADER: 'wrong'}])
+def test_forged_update_rejected(headers):
+    application = make_application()
+    status = asyncio.run(post(application, json.dumps(fake_message_update('/start')), headers))
+    assert status == 403
+    assert application.update_queue.empty()
+
+def test_bad_json_rejected():
+    application = make_application()
+    assert asyncio.run(post(application, 'not json', {SECRET_HEADER: SECRET})) == 400
+
+def test_secret_required():
+    with pytest.raises(ValueError):
+        build_webhook_app(make_application(), PATH, '')
+
+@pytest.mark.parametrize('body', ['[1, 2]', '"text"', '42'])
+def test_non_object_rejected(body):
+    application = make_application()
+    assert asyncio.run(post(application, body, {SECRET_HEADER: SECRET})) == 400
+    assert application.update_queue.empty()
+
+class OfflineBot(ExtBot):
+    """Never talks to Telegram; set_webhook fails like a bad public URL would"""
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(1, 'Test', True, username='test_bot')
+        return self._bot_user
+
+    async def set_webhook(self, *args, **kwargs):
+        raise TelegramError('bad webhook url')
+
+def test_failed_registration_cleans_up():
+    calls = []
+    async def post_init(app):
+        calls.append('post_init')
+    async def post_shutdown(app):
+        calls.append('post_shutdown')
+    application = (ApplicationBuilder().bot(OfflineBot('123456:TEST'))
+                   .post_init(post_init).post_shutdown(post_shutdown).build())
+
+    async def scenario():
+        with pytest.raises(TelegramError):
+            await run_webhook(application, 'https://example.invalid', '127.0.0.1', PORT, PATH, SECRET)
+        # The listener is gone, so the port can be bound again
+        server = await asyncio.start_server(lambda r, w: None, '127.0.0.1', PORT)
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
+    assert calls == ['post_init', 'post_shutdown']
+    assert not application.running
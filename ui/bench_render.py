@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the qB dashboard renderer against the old string-concatenation one
+over synthetic torrent lists: total render time, time to the first chunk and
+peak memory.
+
+    python3 ui/bench_render.py [SIZES...]     e.g. 100 1000 5000
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from qb_ui import format_size, get_status_emoji, render_page
+
+STATES = ['downloading', 'uploading', 'pausedDL', 'stalledDL', 'queuedDL', 'stoppedUP', 'error']
+
+def synthetic_torrents(n, seed=1):
+    rnd = random.Random(seed)
+    return [{
+        'hash': f"{i:040x}",
+        'name': f"Some.Show.S{rnd.randint(1, 9):02d}E{rnd.randint(1, 24):02d}.1080p.WEB-DL.<x265>&Co-{i}",
+        'state': rnd.choice(STATES),
+        'progress': rnd.random(),
+        'size': rnd.randint(10**8, 6 * 10**10),
+        'downloaded': rnd.randint(0, 10**10),
+        'dlspeed': rnd.randint(0, 10**7),
+        'upspeed': rnd.randint(0, 10**6),
+        'num_seeds': rnd.randint(0, 500),
+        'num_peers': rnd.randint(0, 500),
+        'category': rnd.choice(['', 'tv', 'private-tracker']),
+        'eta': rnd.randint(0, 10**5),
+    } for i in range(n)]
+
+def legacy_render(torrents):
+    """The previous index() row loop: one growing string, no escaping"""
+    html_rows = ""
+    for t in torrents:
+        state     = t.get('state', 'unknown')
+        progress  = t.get('progress', 0) * 100
+        size      = format_size(t.get('size', 0))
+        downloaded= format_size(t.get('downloaded', 0))
+        up_speed  = format_size(t.get('upspeed', 0))
+        down_speed= format_size(t.get('dlspeed', 0))
+        seeds     = t.get('num_seeds', 0)
+        peers     = t.get('num_peers', 0)
+        name      = t.get('name', 'Unknown')
+        category  = t.get('category', '')
+        status_class = 'downloading'
+        if state == 'uploading':
+            status_class = 'seeding'
+        elif state in ('paused', 'pausedDL', 'pausedUP'):
+            status_class = 'paused'
+        if state == 'downloading':
+            status_text = f"⬇️ {down_speed}/s"
+        elif state == 'uploading':
+            status_text = f"⬆️ {up_speed}/s • {seeds} seeds"
+        else:
+            status_text = state
+        eta = t.get('eta', 0)
+        eta_str = ""
+        if eta > 0 and eta < 8640000:
+            if eta >= 3600:
+                eta_str = f" • ETA: {eta//3600}h{(eta%3600)//60}m"
+            elif eta >= 60:
+                eta_str = f" • ETA: {eta//60}m{eta%60}s"
+            else:
+                eta_str = f" • ETA: {eta}s"
+        badge = f'<span class="badge badge-{"private" if "private" in category.lower() else "public"}">{category or "public"}</span>' if category else ''
+        html_rows += f"""
+        <div class="torrent {status_class}">
+            <div class="status-icon">{get_status_emoji(state)}</div>
+            <div class="info">
+                <div class="name" title="{name}">{name[:70]}{'...' if len(name)>70 else ''} {badge}</div>
+                <div class="meta">📦 {size} | 📥 {downloaded} | {status_text}{eta_str}</div>
+                <div class="progress-bar">
+                    <div class="progress {'done' if progress >= 100 else ''}" style="width:{min(100,progress):.1f}%"></div>
+                </div>
+                <div class="meta-small">{progress:.1f}% | 👥 {peers} peers</div>
+            </div>
+        </div>"""
+    # The old page was only sent once fully built
+    yield f"<html>{html_rows}</html>"
+
+def measure(render, torrents):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    total = 0
+    for chunk in render(torrents):
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(chunk.encode())
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, first, peak, total
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] or [100, 1000, 5000, 20000]
+    print(f"{'torrents':>9} {'renderer':>8} {'total ms':>9} {'first ms':>9} {'peak KB':>9} {'bytes':>10}")
+    for n in sizes:
+        torrents = synthetic_torrents(n)
+        for label, render in (('legacy', legacy_render), ('stream', render_page)):
+            elapsed, first, peak, total = measure(render, torrents)
+            print(f"{n:>9} {label:>8} {elapsed*1000:>9.1f} {first*1000:>9.2f} {peak/1024:>9.0f} {total:>10}")
@@ -0,0 +1,119 @@
+"""
+Night Leecher - Directory listing cache for the file server.
+
+Listings are read with one os.scandir pass in a worker thread (the DirEntry
+already knows file type and, on Linux, needs a single stat for size/mtime),
+so a huge folder never blocks the event loop. Each listing is cached per
+directory and reused while the directory's mtime is unchanged (entries added,
+removed or renamed bump it). Listings older than MAX_AGE are re-read anyway,
+because files still being downloaded grow without touching the directory.
+Sorted orders are computed once per listing and pages are sliced from them;
+folder sizes for sorting come from an optional `dir_size(path)` lookup (the
+tree index) since a directory entry's own size means nothing. Listeners
+registered with `on_change` hear about every directory re-read because its
+mtime moved, so other indexes can follow without waiting for a tree pass.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+MAX_DIRS = 512      # cached listings kept, least recently used dropped first
+MAX_AGE = 10.0      # seconds a listing is trusted without re-reading sizes
+RECHECK = 1.0       # seconds a listing is served without even a directory stat
+
+SORT_KEYS = {
+    'name':  lambda e: e.name.lower(),
+    'size':  lambda e: e.size,
+    'mtime': lambda e: e.mtime,
+}
+
+class Entry:
+    __slots__ = ('name', 'is_dir', 'size', 'mtime')
+
+    def __init__(self, name, is_dir, size, mtime):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+
+class Listing:
+    def __init__(self, path, dir_mtime, entries, dir_size=None):
+        self.path = path
+        self.dir_mtime = dir_mtime
+        self.entries = entries
+        self.dir_size = dir_size
+        self.read_at = time.monotonic()
+        self._sorted = {}
+
+    def sorted(self, sort='name', reverse=False):
+        """Entries in the given order, folders always first"""
+        key = (sort, reverse)
+        if key not in self._sorted:
+            by = SORT_KEYS.get(sort, SORT_KEYS['name'])
+            dir_by = by
+            if sort == 'size' and self.dir_size:
+                dir_by = lambda e: self.dir_size(os.path.join(self.path, e.name)) or 0
+            dirs = sorted((e for e in self.entries if e.is_dir), key=dir_by, reverse=reverse)
+            files = sorted((e for e in self.entries if not e.is_dir), key=by, reverse=reverse)
+            self._sorted[key] = dirs + files
+        return self._sorted[key]
+
+def scan(path):
+    """Read a directory in one scandir pass"""
+    entries = []
+    with os.scandir(path) as it:
+        for de in it:
+            try:
+                is_dir = de.is_dir()
+                st = de.stat()
+            except OSError:
+                continue    # vanished or broken symlink
+            entries.append(Entry(de.name, is_dir, 0 if is_dir else st.st_size, st.st_mtime))
+    return entries
+
+class DirCache:
+    def __init__(self, max_dirs=MAX_DIRS, max_age=MAX_AGE, dir_size=None):
+        self.max_dirs = max_dirs
+        self.dir_size = dir_size    # (real path) -> recursive size or None
+        self.max_age = max_age
+        self._listings = OrderedDict()  # real path -> Listing
+        self._listeners = []
+
+    def on_change(self, listener):
+        """Call `listener(path, entries)` whenever a directory is read fresh or its mtime changed"""
+        self._listeners.append(listener)
+
+    def _read(self, path, cached):
+        dir_mtime = os.stat(path).st_mtime_ns
+        if cached and cached.dir_mtime == dir_mtime and time.monotonic() - cached.read_at < self.max_age:
+            return cached
+        return Listing(path, dir_mtime, scan(path), self.dir_size)
+
+    async def listing(self, path):
+        """Cached Listing of `path`, re-read off the event loop when stale"""
+        cached = self._listings.get(path)
+        if cached and time.monotonic() - cached.read_at < RECHECK:
+            self._listings.move_to_end(path)
+            return cached
+        listing = await asyncio.to_thread(self._read, path, cached)
+        if cached is None or listing.dir_mtime != cached.dir_mtime:
+            for listener in self._listeners:
+                listener(path, listing.entries)
+        self._listings[path] = listing
+        self._listings.move_to_end(path)
+        while len(self._listings) > self.max_dirs:
+            self._listings.popitem(last=False)
+        return listing
+
+    def invalidate(self, path=None):
+        if path is None:
+            self._listings.clear()
+        else:
+            self._listings.pop(path, None)
+
+    async def page(self, path, sort='name', reverse=False, offset=0, limit=200):
+        """(entries on this page, total entries)"""
+        entries = (await self.listing(path)).sorted(sort, reverse)
+        return entries[offset:offset + limit], len(entries)
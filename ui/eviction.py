@@ -0,0 +1,155 @@
+"""
+Night Leecher - LRU eviction of completed downloads.
+
+The file server calls `touch(path)` for every download it serves; access
+times are buffered in memory and written to SQLite in batches. A background
+loop checks disk usage of the download volume and, once it is above the
+high watermark, deletes completed torrents (files included, through
+qBittorrent) in least-recently-fetched order until usage would drop below
+the low watermark.
+
+Only torrents the bot added are candidates: they must carry `tag` and/or
+be in `category` (with neither set nothing is evicted). A torrent is never
+evicted while it is tagged with the pin tag, or before it reached the
+minimum seed ratio or minimum seeding time. Torrents nobody ever fetched
+count as last accessed when they completed. At most `max_per_pass` torrents
+are deleted per check, so a volume filled by something else cannot wipe
+out every download in one go.
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+import time
+
+class Evictor:
+    def __init__(self, base_dir, db_path, fetch_torrents, delete_torrents,
+                 high=0.90, low=0.80, pin_tag='pinned', min_ratio=1.0, min_seed_hours=48,
+                 tag='', category='', max_per_pass=5):
+        self.base_dir = base_dir
+        self.db_path = db_path
+        self.fetch_torrents = fetch_torrents      # async () -> torrents/info list
+        self.delete_torrents = delete_torrents    # async (hashes list) -> bool
+        self.high = high
+        self.low = low
+        self.pin_tag = pin_tag
+        self.min_ratio = min_ratio
+        self.min_seed_time = min_seed_hours * 3600
+        self.tag = tag
+        self.category = category
+        self.max_per_pass = max_per_pass
+        self._db = None
+        self._access = None     # relative path -> last access time
+        self._dirty = {}
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS access (path TEXT PRIMARY KEY, last REAL NOT NULL)")
+        return self._db
+
+    def _load(self):
+        if self._access is None:
+            try:
+                self._access = dict(self._conn().execute("SELECT path, last FROM access"))
+            except Exception as e:
+                print(f"Error loading access times: {e}")
+                self._access = {}
+
+    def touch(self, path):
+        """Record that a file (path relative to base_dir) was fetched now"""
+        self._load()
+        now = time.time()
+        self._access[path] = now
+        self._dirty[path] = now
+
+    def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            db = self._conn()
+            with db:
+                db.executemany("INSERT OR REPLACE INTO access VALUES (?, ?)", list(dirty.items()))
+        except Exception as e:
+            print(f"Error saving access times: {e}")
+
+    def _last_access_by_path(self):
+        """Latest access of each path and every folder above it"""
+        latest = {}
+        for path, last in self._access.items():
+            while path:
+                if latest.get(path, 0) < last:
+                    latest[path] = last
+                path = os.path.dirname(path)
+        return latest
+
+    def _rel_content(self, t):
+        content = t.get('content_path', '')
+        real_base = os.path.realpath(self.base_dir)
+        if content and os.path.realpath(content).startswith(real_base + os.sep):
+            return os.path.relpath(os.path.realpath(content), real_base)
+        # qBittorrent may see the volume under another mount point
+        return os.path.relpath(content, t.get('save_path', '')) if content else t.get('name', '')
+
+    def _evictable(self, t):
+        if t.get('progress', 0) < 1:
+            return False
+        tags = [x.strip() for x in (t.get('tags') or '').split(',')]
+        if not (self.tag or self.category):
+            return False
+        if self.tag and self.tag not in tags:
+            return False
+        if self.category and t.get('category', '') != self.category:
+            return False
+        if self.pin_tag and self.pin_tag in tags:
+            return False
+        return t.get('ratio', 0) >= self.min_ratio or t.get('seeding_time', 0) >= self.min_seed_time
+
+    def plan(self, torrents, usage):
+        """Hashes to delete, least recently fetched first, to bring usage under the low watermark"""
+        self._load()
+        total, used = usage.total, usage.used
+        if not total or used < self.high * total:
+            return []
+        latest = self._last_access_by_path()
+        candidates = []
+        for t in torrents:
+            if self._evictable(t):
+                last = latest.get(self._rel_content(t)) or t.get('completion_on') or t.get('added_on', 0)
+                candidates.append((last, t))
+        candidates.sort(key=lambda c: c[0])
+
+        target = self.low * total
+        victims = []
+        for _, t in candidates:
+            if used <= target or len(victims) >= self.max_per_pass:
+                break
+            victims.append(t['hash'])
+            used -= t.get('size', 0)
+        return victims
+
+    async def check(self):
+        usage = await asyncio.to_thread(shutil.disk_usage, self.base_dir)
+        if usage.used < self.high * usage.total:
+            return []
+        torrents = await self.fetch_torrents()
+        victims = self.plan(torrents, usage)
+        if victims and await self.delete_torrents(victims):
+            for t in torrents:
+                if t['hash'] in victims:
+                    print(f"Evicted {t.get('name', t['hash'])}")
+        return victims
+
+    async def run(self, interval=300):
+        """Background loop: flush access times and evict when over the high watermark"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+                await self.check()
+            except Exception as e:
+                print(f"Eviction check failed: {e}")
@@ -6,11 +6,41 @@ import asyncio
 import aiohttp
 import subprocess
 import os
+import time
+from html import escape
 from aiohttp import web
 import urllib.parse
 
+from dir_index import DirCache, SORT_KEYS
+from eviction import Evictor
+from path_search import PathSearch
+from tree_index import TreeIndex
+import zip_stream
+
 PORT = 8086
 BASE_DIR = "/root/.openclaw/workspace/Night-Leech/downloads/qbittorrent/Downloads"
+QB_URL = "http://localhost:8083"
+QB_USER, QB_PASS = "admin", "adminadmin"
+
+# Eviction (off unless EVICTION_ENABLED=1): above HIGH_WATERMARK disk usage,
+# delete least recently downloaded completed torrents until under LOW_WATERMARK,
+# at most EVICT_MAX_PER_PASS per check. Only torrents the bot added (EVICT_TAG
+# and/or EVICT_CATEGORY) are candidates; ones tagged PIN_TAG, or below
+# MIN_SEED_RATIO and MIN_SEED_HOURS, are kept.
+EVICTION_ENABLED = os.environ.get('EVICTION_ENABLED', '0').lower() in ('1', 'true', 'yes')
+EVICT_TAG = os.environ.get('EVICT_TAG', 'night-leech')
+EVICT_CATEGORY = os.environ.get('EVICT_CATEGORY', '')
+EVICT_MAX_PER_PASS = int(os.environ.get('EVICT_MAX_PER_PASS', '5'))
+ACCESS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'access.db')
+HIGH_WATERMARK = 0.90
+LOW_WATERMARK = 0.80
+PIN_TAG = "pinned"
+MIN_SEED_RATIO = 1.0
+MIN_SEED_HOURS = 48
+
+PAGE_SIZE = 200
+SEARCH_LIMIT = 100
+TREE_INDEX_INTERVAL = 30
 
 def format_size(size):
     try:
@@ -37,37 +67,109 @@ def get_icon(filename):
 
 async def get_torrents():
     try:
-        username, password = "admin", "adminadmin"
         async with aiohttp.ClientSession() as session:
-            async with session.post("http://localhost:8083/api/v2/auth/login",
-                data={"username": username, "password": password}) as resp:
+            async with session.post(f"{QB_URL}/api/v2/auth/login",
+                data={"username": QB_USER, "password": QB_PASS}) as resp:
                 cookies = resp.cookies
-            async with session.get("http://localhost:8083/api/v2/torrents/info",
+            async with session.get(f"{QB_URL}/api/v2/torrents/info",
                 cookies=cookies) as resp:
                 return await resp.json()
     except:
         return []
 
-def list_dir(path):
+async def delete_torrents(hashes):
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{QB_URL}/api/v2/auth/login",
+                data={"username": QB_USER, "password": QB_PASS}) as resp:
+                cookies = resp.cookies
+            async with session.post(f"{QB_URL}/api/v2/torrents/delete",
+                data={"hashes": "|".join(hashes), "deleteFiles": "true"}, cookies=cookies) as resp:
+                return resp.status == 200
+    except:
+        return False
+
+evictor = Evictor(BASE_DIR, ACCESS_DB, get_torrents, delete_torrents,
+                  HIGH_WATERMARK, LOW_WATERMARK, PIN_TAG, MIN_SEED_RATIO, MIN_SEED_HOURS,
+                  EVICT_TAG, EVICT_CATEGORY, EVICT_MAX_PER_PASS)
+
+tree_index = TreeIndex(BASE_DIR)
+
+def dir_totals(real_path):
+    return tree_index.totals(os.path.relpath(real_path, os.path.realpath(BASE_DIR)))
+
+search_index = PathSearch()
+tree_index.on_change(search_index.update)
+
+dir_cache = DirCache(dir_size=lambda p: (dir_totals(p) or (0, 0))[0])
+
+def listing_changed(real_path, entries):
+    """Update filename search from a directory the listing cache just re-read"""
+    rel = os.path.relpath(real_path, os.path.realpath(BASE_DIR))
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return
+    rel = '' if rel == os.curdir else rel
+    node = tree_index.nodes.get(rel)
+    known = set(node.files) if node else set()
+    names = {e.name for e in entries}
+    join = lambda name: f"{rel}/{name}" if rel else name
+    # The tree index reports the same changes again on its next pass; both updates are idempotent
+    search_index.update([join(e.name) for e in entries if not e.is_dir and e.name not in known],
+                        [join(name) for name in known - names])
+
+dir_cache.on_change(listing_changed)
+
+async def list_dir(path, sort='name', reverse=False, page=1):
+    """One page of a directory listing and the total entry count"""
     items = []
+    total = 0
     try:
-        for item in os.listdir(path):
-            full = os.path.join(path, item)
-            is_dir = os.path.isdir(full)
-            stat = os.stat(full)
-            size = stat.st_size if not is_dir else 0
+        rel_dir = os.path.relpath(path, BASE_DIR)
+        entries, total = await dir_cache.page(os.path.realpath(path), sort, reverse,
+                                              (page - 1) * PAGE_SIZE, PAGE_SIZE)
+        for e in entries:
+            totals = dir_totals(os.path.join(os.path.realpath(path), e.name)) if e.is_dir else None
+            if e.is_dir:
+                size = f"{format_size(totals[0])} · {totals[1]} فایل" if totals else '📁'
+            else:
+                size = format_size(e.size)
             items.append({
-                'name': item,
-                'path': os.path.relpath(full, BASE_DIR),
-                'size': format_size(size),
-                'is_dir': is_dir,
-                'icon': '📁' if is_dir else get_icon(item)
+                'name': e.name,
+                'path': os.path.normpath(os.path.join(rel_dir, e.name)),
+                'size': size,
+                'mtime': time.strftime('%Y-%m-%d %H:%M', time.localtime(e.mtime)),
+                'is_dir': e.is_dir,
+                'icon': '📁' if e.is_dir else get_icon(e.name)
             })
-        items.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
     except Exception as e:
         print(f"Error listing {path}: {e}")
+    return items, total
+
+def search_items(query, limit=SEARCH_LIMIT):
+    """Indexed files matching `query`, as list_dir-style items"""
+    items = []
+    for rel in search_index.search(query, limit):
+        size, mtime = tree_index.file_info(rel) or (0, 0)
+        items.append({
+            'name': rel,
+            'path': rel,
+            'size': format_size(size),
+            'mtime': time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime)),
+            'is_dir': False,
+            'icon': get_icon(rel)
+        })
     return items
 
+def page_link(path, sort, order, page):
+    query = {'path': path}
+    if sort != 'name':
+        query['sort'] = sort
+    if order != 'asc':
+        query['order'] = order
+    if page > 1:
+        query['page'] = page
+    return '/?' + urllib.parse.urlencode(query)
+
 def get_breadcrumbs(path):
     parts = path.split('/')
     crumbs = []
@@ -93,7 +195,21 @@ async def index(request):
     except:
         return web.Response(text="Invalid path", status=403)
     
-    items = list_dir(full_path)
+    sort = request.query.get('sort', 'name')
+    if sort not in SORT_KEYS:
+        sort = 'name'
+    order = 'desc' if request.query.get('order') == 'desc' else 'asc'
+    try:
+        page = max(1, int(request.query.get('page', 1)))
+    except ValueError:
+        page = 1
+    query = request.query.get('q', '').strip()
+    if query:
+        items = search_items(query)
+        total = len(items)
+    else:
+        items, total = await list_dir(full_path, sort, order == 'desc', page)
+    pages = max(1, -(-total // PAGE_SIZE))
     torrents = await get_torrents()
     breadcrumbs = get_breadcrumbs(path)
     
@@ -132,6 +248,11 @@ a:hover { text-decoration: underline; }
 .breadcrumb { margin-bottom: 15px; opacity: 0.7; }
 .breadcrumb a { margin: 0 5px; }
 .breadcrumb span { margin: 0 5px; }
+.search { display: flex; gap: 10px; margin-bottom: 15px; }
+.search input { flex: 1; padding: 8px 12px; border-radius: 8px; border: 1px solid rgba(255,255,255,0.1); background: rgba(255,255,255,0.05); color: #fff; font-family: inherit; }
+.search button { border: none; cursor: pointer; font-family: inherit; }
+.pager { margin-top: 15px; text-align: center; }
+.pager a, .pager span { margin: 0 8px; }
 </style>
 </head>
 <body>
@@ -144,10 +265,14 @@ a:hover { text-decoration: underline; }
 <div class="stat"><div class="num">""", str(torrents_count), """</div><div>📥 Torrents</div></div>
 <div class="stat"><div class="num">""", str(seeding_count), """</div><div>⬆️ Seeding</div></div>
 <div class="stat"><div class="num">""", str(downloading_count), """</div><div>⬇️ Downloading</div></div>
-<div class="stat"><div class="num">""", str(len(items)), """</div><div>📁 Files</div></div>
+<div class="stat"><div class="num">""", str(total), """</div><div>📁 Files</div></div>
 </div>
 <div class="section">
 <h2>📁 Files</h2>
+<form class="search" action="/" method="get">
+<input type="search" name="q" placeholder="جستجوی فایل..." value=\"""", escape(query), """">
+<button class="btn" type="submit">🔍 جستجو</button>
+</form>
 <div class="breadcrumb">"""]
     
     # Breadcrumb
@@ -155,14 +280,22 @@ a:hover { text-decoration: underline; }
         html_parts.append('<a href="/">🏠 Home</a>')
         for i, crumb in enumerate(breadcrumbs):
             if i == len(breadcrumbs) - 1:
-                html_parts.append(f'<span>👉 {crumb["name"]}</span>')
+                html_parts.append(f'<span>👉 {escape(crumb["name"])}</span>')
             else:
-                html_parts.append(f'<span>›</span><a href="/?path={urllib.parse.quote(crumb["path"])}">{crumb["name"]}</a>')
+                html_parts.append(f'<span>›</span><a href="/?path={urllib.parse.quote(crumb["path"])}">{escape(crumb["name"])}</a>')
     
-    html_parts.append('</div><table><tr><th></th><th>نام</th><th>اندازه</th><th>عملیات</th></tr>')
+    def sort_header(key, label):
+        # Clicking the active column flips its order
+        new_order = 'desc' if key == sort and order == 'asc' else 'asc'
+        arrow = (' ▲' if order == 'asc' else ' ▼') if key == sort else ''
+        return f'<th><a href="{escape(page_link(path, key, new_order, 1))}">{label}{arrow}</a></th>'
+    
+    html_parts.append(f'</div><table><tr><th></th>{sort_header("name", "نام")}{sort_header("size", "اندازه")}'
+                      f'{sort_header("mtime", "تاریخ")}<th>عملیات</th></tr>')
     
     if not items:
-        html_parts.append('<tr><td colspan="4" style="text-align:center;opacity:0.5">📂 پوشه خالی است</td></tr>')
+        empty = '🔍 نتیجه‌ای پیدا نشد' if query else '📂 پوشه خالی است'
+        html_parts.append(f'<tr><td colspan="5" style="text-align:center;opacity:0.5">{empty}</td></tr>')
     else:
         for item in items:
             name = item['name']
@@ -173,23 +306,50 @@ a:hover { text-decoration: underline; }
             if item['is_dir']:
                 html_parts.append(f'''<tr>
 <td class="icon">{icon}</td>
-<td><a href="/?path={urllib.parse.quote(item_path)}">{name}</a></td>
-<td>📁</td>
-<td><a href="/?path={urllib.parse.quote(item_path)}" class="btn">📂 باز کردن</a></td>
+<td><a href="/?path={urllib.parse.quote(item_path)}">{escape(name)}</a></td>
+<td>{size}</td>
+<td>{item['mtime']}</td>
+<td><a href="/?path={urllib.parse.quote(item_path)}" class="btn">📂 باز کردن</a>
+<a href="/zip/{urllib.parse.quote(item_path)}" class="btn">📦 ZIP</a></td>
 </tr>''')
             else:
                 dl_url = f"/download/{urllib.parse.quote(item_path)}"
                 html_parts.append(f'''<tr>
 <td class="icon">{icon}</td>
-<td>{name}</td>
+<td>{escape(name)}</td>
 <td>{size}</td>
+<td>{item['mtime']}</td>
 <td><a href="{dl_url}" class="btn" target="_blank">⬇️ دانلود</a></td>
 </tr>''')
     
-    html_parts.append('</table></div></div></body></html>')
+    html_parts.append('</table>')
+    if pages > 1:
+        html_parts.append('<div class="pager">')
+        if page > 1:
+            html_parts.append(f'<a href="{escape(page_link(path, sort, order, page - 1))}">→ قبلی</a>')
+        html_parts.append(f'<span>{page} / {pages}</span>')
+        if page < pages:
+            html_parts.append(f'<a href="{escape(page_link(path, sort, order, page + 1))}">بعدی ←</a>')
+        html_parts.append('</div>')
+    html_parts.append('</div></div></body></html>')
     
     return web.Response(text=''.join(html_parts), content_type='text/html')
 
+async def api_search(request):
+    """?q=<text>&limit=<n>: matching files as JSON"""
+    query = request.query.get('q', '').strip()
+    try:
+        limit = min(1000, max(1, int(request.query.get('limit', SEARCH_LIMIT))))
+    except ValueError:
+        return web.json_response({"error": "invalid limit"}, status=400)
+    results = []
+    for rel in search_index.search(query, limit) if query else []:
+        size, mtime = tree_index.file_info(rel) or (0, 0)
+        results.append({'path': rel, 'name': os.path.basename(rel), 'size': size, 'mtime': mtime,
+                        'url': f"/download/{urllib.parse.quote(rel)}"})
+    return web.json_response({'query': query, 'indexed': len(search_index), 'ready': tree_index.ready,
+                              'results': results})
+
 async def download(request):
     path = request.match_info.get('path', '')
     if not path or path == '.':
@@ -209,6 +369,7 @@ async def download(request):
         return web.Response(text="File not found", status=404)
     
     filename = os.path.basename(full_path)
+    evictor.touch(os.path.relpath(os.path.realpath(full_path), real_base))
     
     # FIX: Use web.FileResponse for proper streaming and HTTP Range support
     return web.FileResponse(
@@ -218,9 +379,55 @@ async def download(request):
         }
     )
 
+async def download_zip(request):
+    """Whole folder as an uncompressed ZIP streamed on the fly"""
+    path = request.match_info.get('path', '')
+    full_path = os.path.join(BASE_DIR, path) if path and path != '.' else BASE_DIR
+    
+    real_base = os.path.realpath(BASE_DIR)
+    real_path = os.path.realpath(full_path)
+    if real_path != real_base and not real_path.startswith(real_base + os.sep):
+        return web.Response(text="Invalid path", status=403)
+    if not os.path.isdir(real_path):
+        return web.Response(text="Folder not found", status=404)
+    
+    entries = await asyncio.to_thread(zip_stream.plan, real_path)
+    name = (os.path.basename(real_path) if real_path != real_base else 'downloads') + '.zip'
+    resp = web.StreamResponse(headers={
+        'Content-Type': 'application/zip',
+        'Content-Disposition': f"attachment; filename*=UTF-8''{urllib.parse.quote(name)}",
+    })
+    resp.content_length = zip_stream.archive_size(entries)
+    await resp.prepare(request)
+    evictor.touch(os.path.relpath(real_path, real_base))
+    await zip_stream.stream(entries, resp.write)
+    await resp.write_eof()
+    return resp
+
+async def start_evictor(app):
+    if EVICTION_ENABLED:
+        app['evictor'] = asyncio.create_task(evictor.run())
+
+async def stop_evictor(app):
+    if 'evictor' in app:
+        app['evictor'].cancel()
+    evictor.flush()
+
+async def start_tree_index(app):
+    app['tree_index'] = asyncio.create_task(tree_index.run(TREE_INDEX_INTERVAL))
+
+async def stop_tree_index(app):
+    app['tree_index'].cancel()
+
 app = web.Application()
 app.router.add_get('/', index)
 app.router.add_get('/download/{path:.*}', download)
+app.router.add_get('/zip/{path:.*}', download_zip)
+app.router.add_get('/api/search', api_search)
+app.on_startup.append(start_evictor)
+app.on_cleanup.append(stop_evictor)
+app.on_startup.append(start_tree_index)
+app.on_cleanup.append(stop_tree_index)
 
 if __name__ == '__main__':
     print(f"🌊 Night Leecher UI starting on port {PORT}...")
@@ -0,0 +1,151 @@
+"""
+Night Leecher - Live torrent feed for the dashboard.
+
+One poller per process follows qBittorrent's /api/v2/sync/maindata (only
+changed fields come back for each rid) and fans the deltas out to every
+connected Server-Sent Events client. Upstream load is one request per
+interval no matter how many dashboards are open, and nothing is polled while
+none are unless `keep_alive()` was called (the speed history needs a sample
+every interval). Page renders read the same map through `current()`, which
+only waits when the poller has not synced yet.
+
+Events:
+    snapshot  {"torrents": {hash: fields}, "server_state": {...}}   on connect
+    delta     {"torrents": {hash: changed fields}, "removed": [hash], "server_state": {...}}
+"""
+
+import asyncio
+import json
+
+from aiohttp import web
+
+CLIENT_QUEUE = 64       # pending events per client before it is resynced
+KEEPALIVE = 15          # seconds between SSE comments on an idle stream
+
+class LiveFeed:
+    def __init__(self, fetch_maindata, interval=1.0):
+        self.fetch_maindata = fetch_maindata    # async (rid) -> maindata dict or None
+        self.interval = interval
+        self.torrents = {}
+        self.server_state = {}
+        self.rid = 0
+        self._clients = set()
+        self._task = None
+        self._always = False
+        self._waiters = 0
+        self._synced = asyncio.Event()
+        self._listeners = []
+
+    def on_delta(self, listener):
+        """Call `listener(changed, removed)` with every merged delta"""
+        self._listeners.append(listener)
+
+    def snapshot(self):
+        return json.dumps({'torrents': self.torrents, 'server_state': self.server_state})
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def keep_alive(self):
+        """Poll continuously, even with no SSE clients connected"""
+        self._always = True
+        self._ensure_running()
+
+    async def current(self, timeout=10.0):
+        """The shared torrent map, after the first sync if the poller just started"""
+        if not self.rid:
+            self._waiters += 1
+            try:
+                self._ensure_running()
+                await asyncio.wait_for(self._synced.wait(), timeout)
+            finally:
+                self._waiters -= 1
+        return self.torrents
+
+    def subscribe(self):
+        q = asyncio.Queue(CLIENT_QUEUE)
+        if self.rid:
+            q.put_nowait(('snapshot', self.snapshot()))
+        self._clients.add(q)
+        self._ensure_running()
+        return q
+
+    def unsubscribe(self, q):
+        self._clients.discard(q)
+
+    def _merge(self, data):
+        if data.get('full_update'):
+            removed = [h for h in self.torrents if h not in data.get('torrents', {})]
+            self.torrents = {}
+        else:
+            removed = [h for h in data.get('torrents_removed', []) if h in self.torrents]
+            for h in removed:
+                del self.torrents[h]
+        changed = data.get('torrents', {})
+        for h, fields in changed.items():
+            self.torrents.setdefault(h, {'hash': h}).update(fields)
+        state = data.get('server_state', {})
+        self.server_state.update(state)
+        self.rid = data.get('rid', self.rid)
+        return changed, removed, state, bool(data.get('full_update'))
+
+    def _broadcast(self, kind, payload):
+        for q in list(self._clients):
+            try:
+                q.put_nowait((kind, payload))
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and start it over from a snapshot
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(('snapshot', self.snapshot()))
+
+    async def poll(self):
+        data = await self.fetch_maindata(self.rid)
+        if not isinstance(data, dict):
+            self.rid = 0
+            self._synced.clear()
+            return
+        changed, removed, state, full = self._merge(data)
+        self._synced.set()
+        for listener in self._listeners:
+            listener(changed, removed)
+        if full:
+            self._broadcast('snapshot', self.snapshot())
+        elif changed or removed or state:
+            self._broadcast('delta', json.dumps({'torrents': changed, 'removed': removed, 'server_state': state}))
+
+    async def _run(self):
+        while self._clients or self._always or self._waiters:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Live feed poll failed: {e}")
+                self.rid = 0
+                self._synced.clear()
+            await asyncio.sleep(self.interval)
+        # Start from a full update when someone connects again
+        self.rid = 0
+        self._synced.clear()
+
+    async def handle_events(self, request):
+        """SSE endpoint"""
+        resp = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        await resp.prepare(request)
+        q = self.subscribe()
+        try:
+            while True:
+                try:
+                    kind, payload = await asyncio.wait_for(q.get(), KEEPALIVE)
+                    await resp.write(f"event: {kind}\ndata: {payload}\n\n".encode())
+                except asyncio.TimeoutError:
+                    await resp.write(b": keepalive\n\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            self.unsubscribe(q)
+        return resp
@@ -0,0 +1,111 @@
+"""
+Night Leecher - Filename search over the download tree.
+
+Every relative path is normalised (lowercase, '.', '_' and '-' read as
+spaces, so "some show s01" finds "Some.Show.S01E02") and split into
+trigrams. Each trigram maps to a compact array of path ids.
+
+A query term is answered from the posting list of its rarest trigram: only
+those candidates are checked with a plain substring test. That keeps
+substring queries over 100k paths in the millisecond range without walking
+the filesystem. If nothing matches exactly, paths are ranked by the share of
+query trigrams they contain, which tolerates typos.
+
+Removed paths leave a tombstone. The index is rebuilt once tombstones
+outnumber half of the live paths.
+"""
+
+import heapq
+import re
+from array import array
+from collections import Counter
+
+_SEPARATORS = re.compile(r'[._\-\s]+')
+FUZZY_MIN_SCORE = 0.5
+
+def normalize(text):
+    return _SEPARATORS.sub(' ', text.lower()).strip()
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class PathSearch:
+    def __init__(self):
+        self._paths = []        # id -> relative path, None once removed
+        self._texts = []        # id -> normalised path
+        self._ids = {}          # path -> id
+        self._postings = {}     # trigram -> array of ids
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, paths):
+        for path in paths:
+            if path in self._ids:
+                continue
+            pid = len(self._paths)
+            text = normalize(path)
+            self._paths.append(path)
+            self._texts.append(text)
+            self._ids[path] = pid
+            for tri in trigrams(text):
+                posting = self._postings.get(tri)
+                if posting is None:
+                    posting = self._postings[tri] = array('I')
+                posting.append(pid)
+
+    def remove(self, paths):
+        for path in paths:
+            pid = self._ids.pop(path, None)
+            if pid is not None:
+                self._paths[pid] = None
+                self._texts[pid] = None
+                self._dead += 1
+        if self._dead > len(self._ids) // 2 + 1000:
+            self._rebuild()
+
+    def update(self, added, removed):
+        """TreeIndex change listener; the file server also feeds it from re-read listings"""
+        self.remove(removed)
+        self.add(added)
+
+    def _rebuild(self):
+        live = [p for p in self._paths if p is not None]
+        self.__init__()
+        self.add(live)
+
+    def search(self, query, limit=50):
+        """Up to `limit` matching paths, best first"""
+        terms = normalize(query).split()
+        if not terms:
+            return []
+        grams = [(len(self._postings.get(t, ())), t) for term in terms for t in trigrams(term)]
+        if grams:
+            candidates = self._postings.get(min(grams)[1], ())
+        else:
+            candidates = range(len(self._paths))   # only 1-2 letter terms: scan everything
+        matches = []
+        for pid in candidates:
+            text = self._texts[pid]
+            if text is not None and all(term in text for term in terms):
+                matches.append(pid)
+        if matches:
+            # Hits in the file name beat hits in the folders above it, then shorter paths
+            last = terms[-1]
+            best = heapq.nsmallest(limit, matches, key=lambda pid: (
+                last not in self._texts[pid].rsplit('/', 1)[-1], len(self._texts[pid])))
+            return [self._paths[pid] for pid in best]
+        return self._fuzzy(terms, limit)
+
+    def _fuzzy(self, terms, limit):
+        wanted = set().union(*(trigrams(t) for t in terms))
+        if not wanted:
+            return []
+        scores = Counter()
+        for tri in wanted:
+            scores.update(self._postings.get(tri, ()))
+        need = FUZZY_MIN_SCORE * len(wanted)
+        ranked = heapq.nsmallest(limit, ((-n, len(self._texts[pid]), pid) for pid, n in scores.items()
+                                         if n >= need and self._paths[pid] is not None))
+        return [self._paths[pid] for _, _, pid in ranked]
@@ -3,11 +3,18 @@
 Night Leecher qBittorrent Web UI
 """
 import asyncio
+import hashlib
+from html import escape
+import json
 import os
+import time
 from pathlib import Path
 from aiohttp import web
 import aiohttp
 
+from live import LiveFeed
+from speed_history import GLOBAL, SpeedHistory
+
 QB_URL = os.environ.get('QBITTORRENT_URL', 'http://localhost:8083')
 
 def load_qb_creds():
@@ -65,140 +72,367 @@ async def get_qb_torrents():
         return {"error": str(e)}
     return []
 
+async def get_qb_maindata(rid=0):
+    """Incremental sync/maindata since `rid` (None on failure)"""
+    global _qb_cookies
+    if not _qb_cookies:
+        await qb_login()
+    for _ in range(2):
+        try:
+            async with aiohttp.ClientSession(cookies=_qb_cookies) as s:
+                async with s.get(
+                    f"{QB_URL}/api/v2/sync/maindata", params={"rid": rid},
+                    timeout=aiohttp.ClientTimeout(total=10)
+                ) as r:
+                    if r.status == 403:
+                        await qb_login()
+                        continue
+                    if r.status == 200:
+                        return await r.json()
+        except:
+            pass
+        break
+    return None
+
+live_feed = LiveFeed(get_qb_maindata)
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'speed_history.bin')
+HISTORY_MAX_POINTS = 1000
+speed_history = None    # opened in start_history, so importing this module creates no files
+
+def record_speeds(changed, removed):
+    if speed_history is not None:
+        speed_history.sample(time.time(), live_feed.torrents, live_feed.server_state)
+
+live_feed.on_delta(record_speeds)
+
+_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
 def format_size(bytes_val):
     try:
         b = int(bytes_val)
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if b < 1024:
-                return f"{b:.1f} {unit}"
-            b /= 1024
-        return f"{b:.1f} PB"
-    except:
+    except (TypeError, ValueError):
         return "?"
+    i = min(max(b.bit_length() - 1, 0) // 10, len(_UNITS) - 1)
+    return f"{b / (1 << (10 * i)):.1f} {_UNITS[i]}"
+
+# state -> (emoji, row class)
+STATE_STYLE = {
+    'downloading': ('⬇️', 'downloading'), 'uploading': ('⬆️', 'seeding'),
+    'paused':      ('⏸️', 'paused'),      'pausedDL':  ('⏸️', 'paused'), 'pausedUP':  ('⏸️', 'paused'),
+    'stoppedDL':   ('⏸️', 'paused'),      'stoppedUP': ('⏸️', 'paused'),
+    'checking':    ('🔍', 'downloading'), 'queued':    ('⏳', 'downloading'),
+    'error':       ('❌', 'downloading'), 'forced':    ('⚡', 'downloading'),
+    'stalledDL':   ('🔄', 'downloading'), 'stalledUP': ('🔄', 'downloading'),
+}
+DEFAULT_STYLE = ('❓', 'downloading')
 
 def get_status_emoji(state):
-    return {
-        'downloading': '⬇️', 'uploading': '⬆️', 'paused': '⏸️',
-        'pausedDL': '⏸️', 'pausedUP': '⏸️', 'checking': '🔍',
-        'queued': '⏳', 'error': '❌', 'forced': '⚡',
-        'stalledDL': '🔄', 'stalledUP': '🔄',
-    }.get(state, '❓')
+    return STATE_STYLE.get(state, DEFAULT_STYLE)[0]
 
-async def index(request):
-    torrents = await get_qb_torrents()
-    if isinstance(torrents, dict) and 'error' in torrents:
-        return web.Response(text=f"<h1>Error: {torrents['error']}</h1>", content_type='text/html')
+def format_eta(eta):
+    if not 0 < eta < 8640000:
+        return ""
+    if eta >= 3600:
+        return f" • ETA: {eta//3600}h{(eta%3600)//60}m"
+    if eta >= 60:
+        return f" • ETA: {eta//60}m{eta%60}s"
+    return f" • ETA: {eta}s"
 
-    active_dl = sum(1 for t in torrents if t.get('state') in ('downloading','stalledDL'))
-    active_ul = sum(1 for t in torrents if t.get('state') == 'uploading')
+def render_row(t):
+    state = t.get('state', 'unknown')
+    emoji, status_class = STATE_STYLE.get(state, DEFAULT_STYLE)
+    progress = t.get('progress', 0) * 100
+    name = t.get('name', 'Unknown')
+    category = t.get('category', '')
 
-    html_rows = ""
-    for t in torrents:
-        state     = t.get('state', 'unknown')
-        progress  = t.get('progress', 0) * 100
-        size      = format_size(t.get('size', 0))
-        downloaded= format_size(t.get('downloaded', 0))
-        up_speed  = format_size(t.get('upspeed', 0))
-        down_speed= format_size(t.get('dlspeed', 0))
-        seeds     = t.get('num_seeds', 0)
-        peers     = t.get('num_peers', 0)
-        name      = t.get('name', 'Unknown')
-        category  = t.get('category', '')
-
-        status_class = 'downloading'
-        if state == 'uploading':
-            status_class = 'seeding'
-        elif state in ('paused', 'pausedDL', 'pausedUP'):
-            status_class = 'paused'
-
-        if state == 'downloading':
-            status_text = f"⬇️ {down_speed}/s"
-        elif state == 'uploading':
-            status_text = f"⬆️ {up_speed}/s • {seeds} seeds"
-        else:
-            status_text = state
-
-        eta = t.get('eta', 0)
-        eta_str = ""
-        if eta > 0 and eta < 8640000:
-            if eta >= 3600:
-                eta_str = f" • ETA: {eta//3600}h{(eta%3600)//60}m"
-            elif eta >= 60:
-                eta_str = f" • ETA: {eta//60}m{eta%60}s"
-            else:
-                eta_str = f" • ETA: {eta}s"
-
-        badge = f'<span class="badge badge-{"private" if "private" in category.lower() else "public"}">{category or "public"}</span>' if category else ''
-
-        html_rows += f"""
-        <div class="torrent {status_class}">
-            <div class="status-icon">{get_status_emoji(state)}</div>
+    if state == 'downloading':
+        status_text = f"⬇️ {format_size(t.get('dlspeed', 0))}/s"
+    elif state == 'uploading':
+        status_text = f"⬆️ {format_size(t.get('upspeed', 0))}/s • {t.get('num_seeds', 0)} seeds"
+    else:
+        status_text = escape(state)
+
+    badge = ''
+    if category:
+        kind = "private" if "private" in category.lower() else "public"
+        badge = f'<span class="badge badge-{kind}">{escape(category)}</span>'
+
+    return f"""
+        <div class="torrent {status_class}" id="t-{escape(t.get('hash', ''))}">
+            <div class="status-icon">{emoji}</div>
             <div class="info">
-                <div class="name" title="{name}">{name[:70]}{'...' if len(name)>70 else ''} {badge}</div>
-                <div class="meta">📦 {size} | 📥 {downloaded} | {status_text}{eta_str}</div>
+                <div class="name" title="{escape(name)}">{escape(name[:70])}{'...' if len(name) > 70 else ''} {badge}</div>
+                <div class="meta">📦 {format_size(t.get('size', 0))} | 📥 {format_size(t.get('downloaded', 0))} | {status_text}{format_eta(t.get('eta', 0))}</div>
                 <div class="progress-bar">
-                    <div class="progress {'done' if progress >= 100 else ''}" style="width:{min(100,progress):.1f}%"></div>
+                    <div class="progress {'done' if progress >= 100 else ''}" style="width:{min(100, progress):.1f}%"></div>
                 </div>
-                <div class="meta-small">{progress:.1f}% | 👥 {peers} peers</div>
+                <div class="meta-small">{progress:.1f}% | 👥 {t.get('num_peers', 0)} peers</div>
             </div>
         </div>"""
 
-    html = f"""<!DOCTYPE html>
+PAGE_HEAD = """<!DOCTYPE html>
 <html dir="rtl" lang="fa">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <meta http-equiv="refresh" content="30">
     <title>🦞 Night Leecher</title>
     <style>
-        * {{ box-sizing: border-box; margin: 0; padding: 0; }}
-        body {{ font-family: 'Tahoma', sans-serif; background: #0f0f1a; color: #e0e0e0; padding: 15px; }}
-        .header {{ text-align: center; padding: 20px; margin-bottom: 20px; }}
-        .header h1 {{ font-size: 1.8em; color: #00d4ff; }}
-        .stats {{ display: flex; justify-content: center; gap: 15px; flex-wrap: wrap; margin-bottom: 20px; }}
-        .stat {{ background: rgba(0,212,255,0.1); border: 1px solid rgba(0,212,255,0.3); padding: 12px 20px; border-radius: 10px; text-align: center; }}
-        .stat .num {{ font-size: 1.6em; color: #00d4ff; font-weight: bold; }}
-        .stat .lbl {{ font-size: 0.8em; opacity: 0.7; margin-top: 3px; }}
-        .torrents {{ max-width: 900px; margin: 0 auto; }}
-        .torrent {{ background: rgba(255,255,255,0.04); border-radius: 10px; padding: 14px 16px; margin-bottom: 12px; display: flex; gap: 14px; align-items: flex-start; border-right: 4px solid #666; }}
-        .torrent.downloading {{ border-right-color: #00d4ff; }}
-        .torrent.seeding {{ border-right-color: #00ff88; }}
-        .torrent.paused {{ border-right-color: #ffaa00; }}
-        .status-icon {{ font-size: 1.4em; min-width: 30px; }}
-        .info {{ flex: 1; }}
-        .name {{ font-weight: bold; margin-bottom: 6px; word-break: break-all; }}
-        .meta {{ font-size: 0.82em; opacity: 0.7; margin-bottom: 6px; }}
-        .meta-small {{ font-size: 0.75em; opacity: 0.5; margin-top: 4px; }}
-        .progress-bar {{ width: 100%; height: 6px; background: rgba(255,255,255,0.1); border-radius: 3px; overflow: hidden; }}
-        .progress {{ height: 100%; background: linear-gradient(90deg, #00d4ff, #00ff88); border-radius: 3px; }}
-        .progress.done {{ background: #00ff88; }}
-        .badge {{ padding: 2px 7px; border-radius: 4px; font-size: 0.72em; font-weight: bold; margin-right: 5px; }}
-        .badge-private {{ background: #9b59b6; color: #fff; }}
-        .badge-public {{ background: #2980b9; color: #fff; }}
-        .empty {{ text-align: center; padding: 60px; opacity: 0.4; font-size: 1.2em; }}
+        * { box-sizing: border-box; margin: 0; padding: 0; }
+        body { font-family: 'Tahoma', sans-serif; background: #0f0f1a; color: #e0e0e0; padding: 15px; }
+        .header { text-align: center; padding: 20px; margin-bottom: 20px; }
+        .header h1 { font-size: 1.8em; color: #00d4ff; }
+        .stats { display: flex; justify-content: center; gap: 15px; flex-wrap: wrap; margin-bottom: 20px; }
+        .stat { background: rgba(0,212,255,0.1); border: 1px solid rgba(0,212,255,0.3); padding: 12px 20px; border-radius: 10px; text-align: center; }
+        .stat .num { font-size: 1.6em; color: #00d4ff; font-weight: bold; }
+        .stat .lbl { font-size: 0.8em; opacity: 0.7; margin-top: 3px; }
+        .torrents { max-width: 900px; margin: 0 auto; }
+        .torrent { background: rgba(255,255,255,0.04); border-radius: 10px; padding: 14px 16px; margin-bottom: 12px; display: flex; gap: 14px; align-items: flex-start; border-right: 4px solid #666; }
+        .torrent.downloading { border-right-color: #00d4ff; }
+        .torrent.seeding { border-right-color: #00ff88; }
+        .torrent.paused { border-right-color: #ffaa00; }
+        .status-icon { font-size: 1.4em; min-width: 30px; }
+        .info { flex: 1; }
+        .name { font-weight: bold; margin-bottom: 6px; word-break: break-all; }
+        .meta { font-size: 0.82em; opacity: 0.7; margin-bottom: 6px; }
+        .meta-small { font-size: 0.75em; opacity: 0.5; margin-top: 4px; }
+        .progress-bar { width: 100%; height: 6px; background: rgba(255,255,255,0.1); border-radius: 3px; overflow: hidden; }
+        .progress { height: 100%; background: linear-gradient(90deg, #00d4ff, #00ff88); border-radius: 3px; }
+        .progress.done { background: #00ff88; }
+        .badge { padding: 2px 7px; border-radius: 4px; font-size: 0.72em; font-weight: bold; margin-right: 5px; }
+        .badge-private { background: #9b59b6; color: #fff; }
+        .badge-public { background: #2980b9; color: #fff; }
+        .empty { text-align: center; padding: 60px; opacity: 0.4; font-size: 1.2em; }
     </style>
 </head>
 <body>
     <div class="header"><h1>🦞 Night Leecher</h1><p>qBittorrent Monitor</p></div>
-    <div class="stats">
-        <div class="stat"><div class="num">{len(torrents)}</div><div class="lbl">📥 کل</div></div>
-        <div class="stat"><div class="num">{active_dl}</div><div class="lbl">⬇️ دانلود</div></div>
-        <div class="stat"><div class="num">{active_ul}</div><div class="lbl">⬆️ سیدینگ</div></div>
+"""
+
+def render_page(torrents, chunk_rows=200):
+    """Dashboard HTML as a sequence of chunks: header and stats, rows in batches, footer"""
+    active_dl = active_ul = 0
+    for t in torrents:
+        state = t.get('state')
+        if state == 'downloading' or state == 'stalledDL':
+            active_dl += 1
+        elif state == 'uploading':
+            active_ul += 1
+
+    yield PAGE_HEAD + f"""    <div class="stats">
+        <div class="stat"><div class="num" id="n-all">{len(torrents)}</div><div class="lbl">📥 کل</div></div>
+        <div class="stat"><div class="num" id="n-dl">{active_dl}</div><div class="lbl">⬇️ دانلود</div></div>
+        <div class="stat"><div class="num" id="n-ul">{active_ul}</div><div class="lbl">⬆️ سیدینگ</div></div>
     </div>
-    <div class="torrents">
-        {"<div class='empty'>هیچ دانلودی وجود ندارد 🦞</div>" if not torrents else html_rows}
+    <div class="torrents" id="torrents">"""
+    if not torrents:
+        yield "<div class='empty'>هیچ دانلودی وجود ندارد 🦞</div>"
+    for i in range(0, len(torrents), chunk_rows):
+        yield ''.join(map(render_row, torrents[i:i + chunk_rows]))
+    yield f"""
     </div>
+    <script>{LIVE_SCRIPT}</script>
 </body>
 </html>"""
 
-    return web.Response(text=html, content_type='text/html')
+async def index(request):
+    # First paint comes from the live feed's map; /events keeps it current afterwards
+    try:
+        torrents = list((await live_feed.current()).values())
+    except asyncio.TimeoutError:
+        return web.Response(text="<h1>Error: qBittorrent did not respond</h1>", content_type='text/html')
+
+    resp = web.StreamResponse(headers={'Content-Type': 'text/html; charset=utf-8'})
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    for chunk in render_page(torrents):
+        await resp.write(chunk.encode())
+    await resp.write_eof()
+    return resp
+
+# Client side of /events: keeps a hash -> torrent map and re-renders only changed rows
+LIVE_SCRIPT = r"""
+const T = {};
+const EMOJI = {downloading:'⬇️', uploading:'⬆️', paused:'⏸️', pausedDL:'⏸️', pausedUP:'⏸️', stoppedDL:'⏸️', stoppedUP:'⏸️',
+  checking:'🔍', queued:'⏳', error:'❌', forced:'⚡', stalledDL:'🔄', stalledUP:'🔄'};
+const box = document.getElementById('torrents');
+function size(b) { const u = ['B','KB','MB','GB','TB']; let i = 0; b = +b || 0;
+  while (b >= 1024 && i < u.length - 1) { b /= 1024; i++; } return b.toFixed(1) + ' ' + u[i]; }
+function esc(s) { return String(s).replace(/[&<>"']/g, c => '&#' + c.charCodeAt(0) + ';'); }
+function eta(e) { if (!(e > 0 && e < 8640000)) return '';
+  return ' • ETA: ' + (e >= 3600 ? Math.floor(e/3600) + 'h' + Math.floor(e%3600/60) + 'm'
+    : e >= 60 ? Math.floor(e/60) + 'm' + e%60 + 's' : e + 's'); }
+function cls(s) { return s === 'uploading' ? 'seeding' : /^(paused|stopped)/.test(s) ? 'paused' : 'downloading'; }
+function row(t) {
+  const p = (t.progress || 0) * 100, name = t.name || 'Unknown', cat = t.category || '';
+  const st = t.state === 'downloading' ? '⬇️ ' + size(t.dlspeed) + '/s'
+    : t.state === 'uploading' ? '⬆️ ' + size(t.upspeed) + '/s • ' + (t.num_seeds || 0) + ' seeds' : esc(t.state);
+  const badge = cat ? '<span class="badge badge-' + (cat.toLowerCase().includes('private') ? 'private' : 'public') + '">' + esc(cat) + '</span>' : '';
+  return '<div class="status-icon">' + (EMOJI[t.state] || '❓') + '</div><div class="info">'
+    + '<div class="name" title="' + esc(name) + '">' + esc(name.slice(0, 70)) + (name.length > 70 ? '...' : '') + ' ' + badge + '</div>'
+    + '<div class="meta">📦 ' + size(t.size) + ' | 📥 ' + size(t.downloaded) + ' | ' + st + eta(t.eta) + '</div>'
+    + '<div class="progress-bar"><div class="progress ' + (p >= 100 ? 'done' : '') + '" style="width:' + Math.min(100, p).toFixed(1) + '%"></div></div>'
+    + '<div class="meta-small">' + p.toFixed(1) + '% | 👥 ' + (t.num_peers || 0) + ' peers</div></div>';
+}
+function paint(h) {
+  let el = document.getElementById('t-' + h);
+  if (!el) { el = document.createElement('div'); el.id = 't-' + h; box.appendChild(el); }
+  el.className = 'torrent ' + cls(T[h].state);
+  el.innerHTML = row(T[h]);
+}
+function counts() {
+  const all = Object.values(T);
+  document.getElementById('n-all').textContent = all.length;
+  document.getElementById('n-dl').textContent = all.filter(t => t.state === 'downloading' || t.state === 'stalledDL').length;
+  document.getElementById('n-ul').textContent = all.filter(t => t.state === 'uploading').length;
+  const empty = box.querySelector('.empty'); if (empty && all.length) empty.remove();
+}
+const es = new EventSource('/events');
+es.addEventListener('snapshot', e => {
+  const d = JSON.parse(e.data);
+  for (const h in T) delete T[h];
+  box.innerHTML = '';
+  for (const h in d.torrents) { T[h] = d.torrents[h]; paint(h); }
+  counts();
+});
+es.addEventListener('delta', e => {
+  const d = JSON.parse(e.data);
+  for (const h of d.removed) { delete T[h]; const el = document.getElementById('t-' + h); if (el) el.remove(); }
+  for (const h in d.torrents) { T[h] = Object.assign(T[h] || {hash: h}, d.torrents[h]); paint(h); }
+  counts();
+});
+"""
+
+# ─── /api/torrents ──────────────────────────────────────────────────────────
+
+CACHE_TTL = 2.0   # seconds one upstream torrent list answers all callers
+MAX_LIMIT = 1000  # rows per /api/torrents page
+MAX_OFFSET = 1_000_000
+_torrents_cache = (0.0, [])
+_torrents_inflight = None
+
+STATE_GROUPS = {
+    'downloading': {'downloading', 'metaDL', 'forcedDL', 'stalledDL', 'queuedDL', 'checkingDL', 'allocating'},
+    'seeding':     {'uploading', 'forcedUP', 'stalledUP', 'queuedUP', 'checkingUP'},
+    'completed':   {'uploading', 'forcedUP', 'stalledUP', 'queuedUP', 'checkingUP', 'pausedUP', 'stoppedUP'},
+    'paused':      {'pausedDL', 'pausedUP', 'stoppedDL', 'stoppedUP'},
+    'stalled':     {'stalledDL', 'stalledUP'},
+    'errored':     {'error', 'missingFiles'},
+}
+
+async def cached_torrents():
+    """Torrent list shared by concurrent callers: one upstream fetch per CACHE_TTL"""
+    global _torrents_cache, _torrents_inflight
+    fetched_at, torrents = _torrents_cache
+    if time.time() - fetched_at < CACHE_TTL:
+        return torrents
+    if _torrents_inflight is None:
+        async def fetch():
+            global _torrents_cache, _torrents_inflight
+            try:
+                result = await get_qb_torrents()
+                if isinstance(result, list):
+                    _torrents_cache = (time.time(), result)
+                return result
+            finally:
+                _torrents_inflight = None
+        _torrents_inflight = asyncio.ensure_future(fetch())
+    return await asyncio.shield(_torrents_inflight)
+
+def _csv(value):
+    return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+def _count(query, name, default, maximum):
+    """Non-negative integer query parameter, capped at `maximum`; ValueError on bad input"""
+    raw = query.get(name)
+    if raw is None or raw == '':
+        return default
+    if not raw.isdigit():
+        raise ValueError(f"{name} must be a non-negative integer")
+    return min(int(raw), maximum)
+
+def select_torrents(torrents, query):
+    """Apply state/category filters, sort, limit/offset and field projection"""
+    states = set()
+    for st in _csv(query.get('state')):
+        states |= STATE_GROUPS.get(st, {st})
+    categories = set(_csv(query.get('category')))
+    if states:
+        torrents = [t for t in torrents if t.get('state') in states]
+    if categories:
+        torrents = [t for t in torrents if t.get('category', '') in categories]
+
+    sort = query.get('sort')
+    if sort:
+        reverse = query.get('reverse', 'false').lower() in ('1', 'true', 'yes')
+        torrents = sorted(torrents, key=lambda t: (t.get(sort) is None, t.get(sort, 0)), reverse=reverse)
+
+    total = len(torrents)
+    offset = _count(query, 'offset', 0, MAX_OFFSET)
+    limit = _count(query, 'limit', MAX_LIMIT, MAX_LIMIT)
+    torrents = torrents[offset:offset + limit]
+
+    fields = _csv(query.get('fields'))
+    if fields:
+        torrents = [{f: t.get(f) for f in fields} for t in torrents]
+    return torrents, total
 
 async def api_torrents(request):
-    return web.json_response(await get_qb_torrents())
+    torrents = await cached_torrents()
+    if isinstance(torrents, dict):
+        return web.json_response(torrents, status=502)
+    try:
+        torrents, total = select_torrents(torrents, request.query)
+    except (ValueError, TypeError) as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    body = json.dumps(torrents, separators=(',', ':'), ensure_ascii=False).encode()
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'X-Total-Count': str(total)}
+    client_tags = [t.strip().removeprefix('W/') for t in request.headers.get('If-None-Match', '').split(',')]
+    if etag in client_tags or '*' in client_tags:
+        return web.Response(status=304, headers=headers)
+    resp = web.Response(body=body, content_type='application/json', headers=headers)
+    resp.enable_compression()
+    return resp
+
+# ─── /api/history ───────────────────────────────────────────────────────────
+
+async def api_history(request):
+    """Speed series: ?torrent=<hash>|global&span=<seconds>&points=<max rows>"""
+    key = request.query.get('torrent', GLOBAL)
+    try:
+        span = max(1, int(request.query.get('span', 300)))
+        points = min(HISTORY_MAX_POINTS, max(1, int(request.query.get('points', 300))))
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    if speed_history is None:
+        return web.json_response({"error": "history not started"}, status=503)
+    step, rows = speed_history.series(key, time.time(), span, points)
+    resp = web.json_response({'torrent': key, 'step': step, 'fields': ['ts', 'dl', 'ul'], 'rows': rows},
+                             headers={'Cache-Control': 'no-cache'})
+    resp.enable_compression()
+    return resp
+
+async def start_history(app):
+    global speed_history
+    speed_history = SpeedHistory(HISTORY_PATH)
+    live_feed.keep_alive()
+
+async def stop_history(app):
+    global speed_history
+    if speed_history is not None:
+        speed_history.flush()
+        speed_history.close()
+        speed_history = None
 
 app = web.Application()
+app.on_startup.append(start_history)
+app.on_cleanup.append(stop_history)
 app.router.add_get('/', index)
 app.router.add_get('/api/torrents', api_torrents)
+app.router.add_get('/api/history', api_history)
+app.router.add_get('/events', live_feed.handle_events)
 
 if __name__ == '__main__':
     print("Starting Night Leecher qB UI on port 8085...")
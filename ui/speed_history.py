@@ -0,0 +1,195 @@
+"""
+Night Leecher - Speed history.
+
+Download/upload speed series for the whole client ("global") and for each
+torrent, kept in fixed-size ring buffers inside one memory-mapped file, so
+memory and disk use are bounded no matter how long the UI runs and history
+survives restarts.
+
+Every series has three tiers:
+    1s buckets for 5 minutes, 1m buckets for 24 hours, 1h buckets for 30 days.
+Each sample is written to its 1s bucket and folded into the running average
+of the current minute and hour bucket, so rollups cost O(1) per sample.
+Buckets nobody wrote are NaN and come back as null.
+
+File layout: a header, then MAX_SERIES fixed-size slots. A slot holds the
+series key (at most _KEY_LEN bytes; longer keys are refused, never cut),
+per-tier last bucket numbers and running sums, then the float32 rings.
+Slots are reused least-recently-updated first.
+"""
+
+import math
+import mmap
+import os
+import struct
+
+TIERS = ((1, 300), (60, 1440), (3600, 720))     # (bucket seconds, buckets kept)
+METRICS = ('dl', 'ul')
+MAX_SERIES = 256
+GLOBAL = 'global'
+
+MAGIC = b'NLSH0002'
+_HEADER = struct.Struct('<8sII')                # magic, tiers signature, max series
+_KEY_LEN = 64                                   # 'global' or an infohash (64 hex for v2)
+_SLOT_META = struct.Struct(f'<{_KEY_LEN}s3q' + 'd' * (len(TIERS) * (len(METRICS) + 1)))
+_RING_FLOATS = sum(n for _, n in TIERS) * len(METRICS)
+SLOT_SIZE = _SLOT_META.size + (-_SLOT_META.size % 4) + _RING_FLOATS * 4
+_NAN = float('nan')
+
+def _signature():
+    """Changes whenever the tier layout does, so an old file is reset instead of misread"""
+    return sum((i + 1) * s * n for i, (s, n) in enumerate(TIERS)) & 0xffffffff
+
+class SpeedHistory:
+    def __init__(self, path):
+        self.path = path
+        size = _HEADER.size + MAX_SERIES * SLOT_SIZE
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fresh = not os.path.exists(path) or os.path.getsize(path) != size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fresh:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, sig, slots = _HEADER.unpack_from(self._mm, 0)
+        if fresh or magic != MAGIC or sig != _signature() or slots != MAX_SERIES:
+            self._mm[:] = bytes(size)
+            _HEADER.pack_into(self._mm, 0, MAGIC, _signature(), MAX_SERIES)
+        self._meta = []     # per slot: [key, lasts[3], sums...] mirrored in memory
+        self._views = []
+        self._rings = []    # per slot: list of (tier, metric) float32 memoryviews
+        self._slots = {}    # key -> slot
+        for i in range(MAX_SERIES):
+            base = _HEADER.size + i * SLOT_SIZE
+            meta = list(_SLOT_META.unpack_from(self._mm, base))
+            key = meta[0].rstrip(b'\0').decode()
+            self._meta.append(meta)
+            raw = memoryview(self._mm)[base + SLOT_SIZE - _RING_FLOATS * 4: base + SLOT_SIZE]
+            data = raw.cast('f')
+            self._views += [raw, data]
+            rings, off = [], 0
+            for _, n in TIERS:
+                rings.append([data[off + m * n: off + (m + 1) * n] for m in range(len(METRICS))])
+                off += n * len(METRICS)
+            self._rings.append(rings)
+            if key:
+                self._slots[key] = i
+
+    # ── Writing ──────────────────────────────────────────────────
+
+    def _slot(self, key):
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+        raw = key.encode()
+        if not raw or len(raw) > _KEY_LEN:
+            raise ValueError(f"series key must be 1-{_KEY_LEN} bytes: {key!r}")
+        free = [i for i in range(MAX_SERIES) if not self._meta[i][0].rstrip(b'\0')]
+        if free:
+            slot = free[0]
+        else:
+            # Reuse the series updated longest ago (never the global one)
+            slot = min((i for i in range(MAX_SERIES) if self._slots.get(GLOBAL) != i),
+                       key=lambda i: self._meta[i][1])
+            del self._slots[self._meta[slot][0].rstrip(b'\0').decode()]
+        meta = [raw.ljust(_KEY_LEN, b'\0')] + [-1] * len(TIERS) + \
+               [0.0] * (len(TIERS) * (len(METRICS) + 1))
+        self._meta[slot] = meta
+        for rings in self._rings[slot]:
+            for ring in rings:
+                for j in range(len(ring)):
+                    ring[j] = _NAN
+        self._slots[key] = slot
+        return slot
+
+    def record(self, key, ts, values):
+        """Add one sample (tuple in METRICS order) for series `key` at unix time `ts`"""
+        slot = self._slot(key)
+        meta = self._meta[slot]
+        nm = len(METRICS)
+        for t, (step, n) in enumerate(TIERS):
+            bucket = int(ts) // step
+            last = meta[1 + t]
+            rings = self._rings[slot][t]
+            acc = 1 + len(TIERS) + t * (nm + 1)     # running sums then count for this tier
+            if bucket != last:
+                if bucket < last:
+                    continue    # clock went back; ignore
+                # Blank the buckets skipped since the last sample
+                for b in range(max(last + 1, bucket - n + 1) if last >= 0 else bucket, bucket):
+                    for ring in rings:
+                        ring[b % n] = _NAN
+                meta[1 + t] = bucket
+                for k in range(nm + 1):
+                    meta[acc + k] = 0.0
+            meta[acc + nm] += 1
+            for m, v in enumerate(values):
+                meta[acc + m] += v
+                rings[m][bucket % n] = meta[acc + m] / meta[acc + nm]
+        _SLOT_META.pack_into(self._mm, _HEADER.size + slot * SLOT_SIZE, *meta)
+
+    def sample(self, ts, torrents, server_state):
+        """Record the global rate and every torrent currently moving data"""
+        self.record(GLOBAL, ts, (server_state.get('dl_info_speed', 0), server_state.get('up_info_speed', 0)))
+        for h, t in torrents.items():
+            dl, ul = t.get('dlspeed', 0), t.get('upspeed', 0)
+            if dl or ul or h in self._slots:
+                self.record(h, ts, (dl, ul))
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        for rings in self._rings:
+            for tier in rings:
+                for ring in tier:
+                    ring.release()
+        for view in reversed(self._views):
+            view.release()
+        self._rings, self._views = [], []
+        self._mm.close()
+
+    # ── Reading ──────────────────────────────────────────────────
+
+    def series(self, key, now, span=300, points=0):
+        """
+        [[bucket start, dl, ul], ...] covering the last `span` seconds from the
+        finest tier that reaches that far back, averaged down to at most
+        `points` rows if given.
+        """
+        slot = self._slots.get(key)
+        tier = next((t for t, (step, n) in enumerate(TIERS) if step * n >= span), len(TIERS) - 1)
+        step, n = TIERS[tier]
+        if slot is None:
+            return step, []
+        last = self._meta[slot][1 + tier]
+        end = int(now) // step
+        count = min(n, max(1, math.ceil(span / step)))
+        rows = []
+        for b in range(end - count + 1, end + 1):
+            if last < 0 or b > last or b <= last - n:
+                rows.append([b * step, None, None])
+            else:
+                rows.append([b * step] + [_num(ring[b % n]) for ring in self._rings[slot][tier]])
+        if points and len(rows) > points:
+            rows, step = _downsample(rows, points), step * math.ceil(len(rows) / points)
+        return step, rows
+
+def _num(v):
+    return None if v != v else round(v, 1)
+
+def _downsample(rows, points):
+    """Average consecutive rows into at most `points` rows, ignoring nulls"""
+    per = math.ceil(len(rows) / points)
+    out = []
+    for i in range(0, len(rows), per):
+        chunk = rows[i:i + per]
+        row = [chunk[0][0]]
+        for m in range(1, len(chunk[0])):
+            vals = [r[m] for r in chunk if r[m] is not None]
+            row.append(round(sum(vals) / len(vals), 1) if vals else None)
+        out.append(row)
+    return out
@@ -0,0 +1,178 @@
+"""
+Night Leecher - Recursive size index of the download tree.
+
+A background loop keeps, for every directory under the base dir, its files
+(size, mtime), its subdirectories and the aggregate size and file count of
+everything below it, so listings can show real folder sizes without walking
+the filesystem per request.
+
+The first pass walks the whole tree; later passes stat each known directory
+and re-read only those whose mtime changed, plus "hot" ones holding a file
+modified in the last HOT_SECONDS (a file being downloaded grows without
+touching its directory). Filesystem work runs in a worker thread one tree
+level at a time; the results are applied on the event loop, where aggregate
+deltas are pushed up to the ancestors and listeners hear about added and
+removed files.
+"""
+
+import asyncio
+import os
+import time
+
+HOT_SECONDS = 600
+
+class DirNode:
+    __slots__ = ('mtime', 'files', 'subdirs', 'size', 'count', 'hot_until')
+
+    def __init__(self):
+        self.mtime = None
+        self.files = {}         # name -> (size, mtime)
+        self.subdirs = set()
+        self.size = 0           # everything below, recursively
+        self.count = 0
+        self.hot_until = 0.0
+
+def _parent(rel):
+    return os.path.dirname(rel) if rel else None
+
+def _join(rel, name):
+    return f"{rel}/{name}" if rel else name
+
+def read_dir(full, known_mtime, hot):
+    """(mtime, files, subdirs) of a directory, None if gone, 'same' if unchanged"""
+    try:
+        mtime = os.stat(full).st_mtime_ns
+    except OSError:
+        return None
+    if mtime == known_mtime and not hot:
+        return 'same'
+    files, subdirs = {}, set()
+    try:
+        with os.scandir(full) as it:
+            for de in it:
+                try:
+                    if de.is_dir(follow_symlinks=False):
+                        subdirs.add(de.name)
+                    else:
+                        st = de.stat()
+                        files[de.name] = (st.st_size, st.st_mtime)
+                except OSError:
+                    continue
+    except OSError:
+        return None
+    return mtime, files, subdirs
+
+class TreeIndex:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.nodes = {}         # relative dir path ('' is the base) -> DirNode
+        self.ready = False
+        self._listeners = []
+
+    def on_change(self, listener):
+        """Call `listener(added, removed)` with relative file paths after every pass"""
+        self._listeners.append(listener)
+
+    def totals(self, rel):
+        """(size, file count) below a relative directory path, None if not indexed yet"""
+        node = self.nodes.get('' if rel in ('', '.') else rel)
+        return (node.size, node.count) if node else None
+
+    def file_info(self, rel):
+        """(size, mtime) of an indexed file, None if unknown"""
+        node = self.nodes.get(_parent(rel) or '')
+        return node.files.get(os.path.basename(rel)) if node else None
+
+    def files(self):
+        """Every indexed file as a relative path"""
+        for rel, node in self.nodes.items():
+            for name in node.files:
+                yield _join(rel, name)
+
+    # ── Applying scan results ────────────────────────────────────
+
+    def _bubble(self, rel, dsize, dcount):
+        while rel is not None:
+            node = self.nodes.get(rel)
+            if node is None:
+                break
+            node.size += dsize
+            node.count += dcount
+            rel = _parent(rel)
+
+    def _drop(self, rel, removed):
+        """Forget a directory and everything below it"""
+        node = self.nodes.get(rel)
+        if node is None:
+            return
+        for sub in list(node.subdirs):
+            self._drop(_join(rel, sub), removed)
+        removed.extend(_join(rel, name) for name in node.files)
+        self._bubble(rel, -sum(s for s, _ in node.files.values()), -len(node.files))
+        del self.nodes[rel]
+        parent = self.nodes.get(_parent(rel)) if rel else None
+        if parent:
+            parent.subdirs.discard(os.path.basename(rel))
+
+    def _apply(self, rel, result, added, removed):
+        """Merge one read_dir result; returns subdirectories that need reading"""
+        if result is None:
+            self._drop(rel, removed)
+            return []
+        node = self.nodes.get(rel)
+        if result == 'same':
+            return [_join(rel, s) for s in node.subdirs]
+        if node is None:
+            node = self.nodes[rel] = DirNode()
+        mtime, files, subdirs = result
+        old_files = node.files
+        dsize = sum(s for s, _ in files.values()) - sum(s for s, _ in old_files.values())
+        added.extend(_join(rel, n) for n in files.keys() - old_files.keys())
+        removed.extend(_join(rel, n) for n in old_files.keys() - files.keys())
+        for sub in node.subdirs - subdirs:
+            self._drop(_join(rel, sub), removed)
+        node.mtime = mtime
+        node.files = files
+        node.subdirs = subdirs
+        node.hot_until = max((m for _, m in files.values()), default=0) + HOT_SECONDS
+        self._bubble(rel, dsize, len(files) - len(old_files))
+        return [_join(rel, s) for s in subdirs]
+
+    # ── Scanning ─────────────────────────────────────────────────
+
+    def _read_level(self, rels, now):
+        out = {}
+        for rel in rels:
+            node = self.nodes.get(rel)
+            known = node.mtime if node else None
+            hot = node is not None and node.hot_until > now
+            out[rel] = read_dir(os.path.join(self.base_dir, rel), known, hot)
+        return out
+
+    async def refresh(self):
+        """One pass over the tree, level by level; returns (added, removed) file paths"""
+        added, removed = [], []
+        level = ['']
+        while level:
+            now = time.time()
+            results = await asyncio.to_thread(self._read_level, level, now)
+            level = []
+            for rel, result in results.items():
+                level += self._apply(rel, result, added, removed)
+        self.ready = True
+        if added or removed:
+            for listener in self._listeners:
+                listener(added, removed)
+        return added, removed
+
+    async def run(self, interval=30):
+        """Background loop: full walk first, incremental passes after"""
+        while True:
+            try:
+                start = time.monotonic()
+                added, removed = await self.refresh()
+                if added or removed:
+                    print(f"Tree index: +{len(added)} -{len(removed)} files in {time.monotonic() - start:.1f}s")
+            except Exception as e:
+                print(f"Tree index pass failed: {e}")
+            await asyncio.sleep(interval)
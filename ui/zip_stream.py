@@ -0,0 +1,134 @@
+"""
+Night Leecher - Streaming ZIP archives of folders.
+
+Builds an uncompressed (STORE) ZIP on the fly: each file is read in
+CHUNK-sized blocks in a worker thread and written straight to the response,
+with its CRC-32 sent afterwards in a data descriptor. Nothing is staged on
+disk and memory use does not grow with the folder size. Video is already
+compressed, so deflating it would only burn CPU.
+
+Every entry uses ZIP64 fields, so the archive layout depends only on names
+and sizes and its exact length is known before the first byte is sent
+(clients get a real progress bar). Sizes are taken when the plan is made.
+A file that grows afterwards is cut at its planned size, and one that shrinks
+is padded with zeros, so the archive always matches the announced length.
+"""
+
+import asyncio
+import os
+import struct
+import time
+import zlib
+
+CHUNK = 1 << 20
+
+_LOCAL = struct.Struct('<IHHHHHIIIHH')
+_ZIP64_LOCAL_EXTRA = struct.Struct('<HHQQ')
+_DESCRIPTOR = struct.Struct('<IIQQ')
+_CENTRAL = struct.Struct('<IHHHHHHIIIHHHHHII')
+_ZIP64_CENTRAL_EXTRA = struct.Struct('<HHQQQ')
+_ZIP64_END = struct.Struct('<IQHHIIQQQQ')
+_ZIP64_LOCATOR = struct.Struct('<IIQI')
+_END = struct.Struct('<IHHHHIIH')
+
+_VERSION = 45                   # 4.5: ZIP64
+_MADE_BY = (3 << 8) | _VERSION  # unix
+_FLAGS = 0x0808                 # data descriptor follows, UTF-8 names
+_MAX32 = 0xFFFFFFFF
+
+class ZipEntry:
+    __slots__ = ('path', 'name', 'size', 'mtime', 'mode')
+
+    def __init__(self, path, name, size, mtime, mode):
+        self.path = path        # file on disk
+        self.name = name        # name inside the archive, '/'-separated
+        self.size = size
+        self.mtime = mtime
+        self.mode = mode
+
+def plan(folder, prefix=None):
+    """ZipEntry for every regular file below `folder` (symlinks skipped)"""
+    prefix = os.path.basename(os.path.normpath(folder)) if prefix is None else prefix
+    entries = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            try:
+                st = os.lstat(full)
+            except OSError:
+                continue
+            if not os.path.isfile(full) or os.path.islink(full):
+                continue
+            rel = os.path.relpath(full, folder).replace(os.sep, '/')
+            entries.append(ZipEntry(full, f"{prefix}/{rel}" if prefix else rel, st.st_size, st.st_mtime, st.st_mode))
+    return entries
+
+def _dos_time(ts):
+    t = time.localtime(max(ts, 315532800))     # DOS dates start in 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), \
+           ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+def _local_header(e, name):
+    dtime, ddate = _dos_time(e.mtime)
+    return _LOCAL.pack(0x04034b50, _VERSION, _FLAGS, 0, dtime, ddate, 0, _MAX32, _MAX32,
+                       len(name), _ZIP64_LOCAL_EXTRA.size) + name + _ZIP64_LOCAL_EXTRA.pack(1, 16, 0, 0)
+
+def _central_header(e, name, crc, offset):
+    dtime, ddate = _dos_time(e.mtime)
+    return _CENTRAL.pack(0x02014b50, _MADE_BY, _VERSION, _FLAGS, 0, dtime, ddate, crc, _MAX32, _MAX32,
+                         len(name), _ZIP64_CENTRAL_EXTRA.size, 0, 0, 0, (e.mode & 0xFFFF) << 16, _MAX32) + \
+           name + _ZIP64_CENTRAL_EXTRA.pack(1, 24, e.size, e.size, offset)
+
+def _end_records(count, cd_offset, cd_size):
+    zip64_end_offset = cd_offset + cd_size
+    return _ZIP64_END.pack(0x06064b50, _ZIP64_END.size - 12, _MADE_BY, _VERSION, 0, 0,
+                           count, count, cd_size, cd_offset) + \
+           _ZIP64_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1) + \
+           _END.pack(0x06054b50, 0, 0, 0xFFFF, 0xFFFF, _MAX32, _MAX32, 0)
+
+def archive_size(entries):
+    """Exact byte length of the archive stream() will produce"""
+    total = 0
+    for e in entries:
+        n = len(e.name.encode())
+        total += _LOCAL.size + _ZIP64_LOCAL_EXTRA.size + n + e.size + _DESCRIPTOR.size
+        total += _CENTRAL.size + _ZIP64_CENTRAL_EXTRA.size + n
+    return total + _ZIP64_END.size + _ZIP64_LOCATOR.size + _END.size
+
+async def _copy(e, write):
+    """Send exactly e.size bytes of a file; returns their CRC-32"""
+    crc, left = 0, e.size
+    try:
+        f = await asyncio.to_thread(open, e.path, 'rb')
+    except OSError as err:
+        print(f"ZIP: cannot read {e.path}: {err}")
+        f = None
+    try:
+        while left:
+            data = await asyncio.to_thread(f.read, min(CHUNK, left)) if f else b''
+            if not data:
+                print(f"ZIP: {e.path} shrank, padding {left} bytes")
+                data = bytes(min(CHUNK, left))
+            crc = zlib.crc32(data, crc)
+            left -= len(data)
+            await write(data)
+    finally:
+        if f:
+            f.close()
+    return crc
+
+async def stream(entries, write):
+    """Write the whole archive through `write(bytes)` (awaitable)"""
+    offset, central = 0, []
+    for e in entries:
+        name = e.name.encode()
+        header = _local_header(e, name)
+        await write(header)
+        crc = await _copy(e, write)
+        await write(_DESCRIPTOR.pack(0x08074b50, crc, e.size, e.size))
+        central.append(_central_header(e, name, crc, offset))
+        offset += len(header) + e.size + _DESCRIPTOR.size
+    cd = b''.join(central)
+    await write(cd)
+    await write(_end_records(len(entries), offset, len(cd)))